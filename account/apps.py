@@ -1,6 +1,13 @@
 from django.apps import AppConfig
+from django.db.models.signals import post_delete, post_save
 
 
 class AccountConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'account'
+
+    def ready(self):
+        from .authentication import user_deleted, user_saved
+        from .models import CustomUser
+        post_save.connect(user_saved, sender=CustomUser)
+        post_delete.connect(user_deleted, sender=CustomUser)
@@ -0,0 +1,142 @@
+import time
+
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.utils.translation import gettext_lazy as _
+from rest_framework_simplejwt.authentication import JWTAuthentication
+from rest_framework_simplejwt.exceptions import AuthenticationFailed, InvalidToken
+from rest_framework_simplejwt.settings import api_settings
+from rest_framework_simplejwt.utils import get_md5_hash_password
+
+from .models import CustomUser
+from .tokens import USER_CLAIMS
+
+def user_changed_key(user_id):
+    return f'account:user:{user_id}:changed'
+
+
+def user_revoked_key(user_id):
+    return f'account:user:{user_id}:revoked'
+
+
+def user_changed(user_id, is_active=True):
+    """
+    Record that `user_id` was changed or deleted, once the transaction commits.
+
+    Tokens issued up to that second no longer describe the user, so they are
+    resolved from the database until they expire; if the user is no longer
+    active they are rejected outright. Code that deactivates users without
+    saving them (queryset.update(), raw SQL) must call this itself.
+    """
+    def mark():
+        timeout = int(api_settings.ACCESS_TOKEN_LIFETIME.total_seconds())
+        cache.set(user_changed_key(user_id), int(time.time()), timeout)
+        if is_active:
+            cache.delete(user_revoked_key(user_id))
+        else:
+            cache.set(user_revoked_key(user_id), True, timeout)
+
+    transaction.on_commit(mark)
+
+
+def user_saved(sender, instance, created, update_fields=None, **kwargs):
+    # A new user has no tokens yet, and saves that touch no claim (e.g. a
+    # password rehash on login) leave the existing ones accurate
+    if created or (update_fields is not None and not set(update_fields) & set(USER_CLAIMS)):
+        return
+    user_changed(instance.pk, instance.is_active)
+
+
+def user_deleted(sender, instance, **kwargs):
+    user_changed(instance.pk)
+
+
+class JWTClaimsAuthentication(JWTAuthentication):
+    """
+    JWTAuthentication that builds request.user from the token's signed claims
+    (see account.tokens) instead of loading it on every request.
+
+    The user is a CustomUser with only the claimed fields loaded; anything
+    else (e.g. password) is fetched on first access, like a `.only()` row.
+    Per-user "revoked" and "changed" markers (see user_changed) keep
+    deactivation, deletion and profile changes effective before the token
+    expires: affected tokens are rejected or resolved from the database.
+    Tokens without the claims are resolved from the database as before.
+    """
+
+    def get_user(self, validated_token):
+        if not self.has_user_claims(validated_token):
+            return super().get_user(validated_token)
+
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+        state = cache.get_many([user_revoked_key(user_id), user_changed_key(user_id)])
+        user = self.resolve_user(
+            validated_token, state.get(user_revoked_key(user_id), False), state.get(user_changed_key(user_id))
+        )
+        return user if user is not None else super().get_user(validated_token)
+
+    async def aauthenticate(self, request):
+        header = self.get_header(request)
+        if header is None:
+            return None
+
+        raw_token = self.get_raw_token(header)
+        if raw_token is None:
+            return None
+
+        validated_token = self.get_validated_token(raw_token)
+        return await self.aget_user(validated_token), validated_token
+
+    async def aget_user(self, validated_token):
+        if not self.has_user_claims(validated_token):
+            return await self.aget_user_from_db(validated_token)
+
+        user_id = validated_token[api_settings.USER_ID_CLAIM]
+        state = await cache.aget_many([user_revoked_key(user_id), user_changed_key(user_id)])
+        user = self.resolve_user(
+            validated_token, state.get(user_revoked_key(user_id), False), state.get(user_changed_key(user_id))
+        )
+        return user if user is not None else await self.aget_user_from_db(validated_token)
+
+    def has_user_claims(self, validated_token):
+        # Revocation checks need the password hash, which is not in the token
+        if api_settings.CHECK_REVOKE_TOKEN:
+            return False
+        return api_settings.USER_ID_CLAIM in validated_token and all(
+            claim in validated_token for claim in USER_CLAIMS
+        )
+
+    def resolve_user(self, validated_token, revoked, changed_at):
+        """The user built from the token's claims, or None to load it from the database."""
+        # The id claim is a string, the model wants the field's type
+        user_id = self.user_model._meta.get_field(api_settings.USER_ID_FIELD).to_python(
+            validated_token[api_settings.USER_ID_CLAIM]
+        )
+        if api_settings.CHECK_USER_IS_ACTIVE and (revoked or not validated_token['is_active']):
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+        if changed_at is not None and validated_token['iat'] <= changed_at:
+            return None
+
+        claims = {api_settings.USER_ID_FIELD: user_id, **{claim: validated_token[claim] for claim in USER_CLAIMS}}
+        field_names = [f.attname for f in self.user_model._meta.concrete_fields if f.attname in claims]
+        return self.user_model.from_db(DEFAULT_DB_ALIAS, field_names, [claims[name] for name in field_names])
+
+    async def aget_user_from_db(self, validated_token):
+        try:
+            user_id = validated_token[api_settings.USER_ID_CLAIM]
+        except KeyError as e:
+            raise InvalidToken(_("Token contained no recognizable user identification")) from e
+
+        try:
+            user = await self.user_model.objects.aget(**{api_settings.USER_ID_FIELD: user_id})
+        except self.user_model.DoesNotExist as e:
+            raise AuthenticationFailed(_("User not found"), code="user_not_found") from e
+
+        if api_settings.CHECK_USER_IS_ACTIVE and not user.is_active:
+            raise AuthenticationFailed(_("User is inactive"), code="user_inactive")
+
+        if api_settings.CHECK_REVOKE_TOKEN:
+            if validated_token.get(api_settings.REVOKE_TOKEN_CLAIM) != get_md5_hash_password(user.password):
+                raise AuthenticationFailed(_("The user's password has been changed."), code="password_changed")
+
+        return user
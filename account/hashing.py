@@ -0,0 +1,114 @@
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import make_password, verify_password
+
+from backend import metrics
+
+# Hashes run at most this many at a time, with at most QUEUE_SIZE more
+# waiting; beyond that logins are turned away instead of piling up. PBKDF2
+# releases the GIL, so one worker per core keeps every core busy.
+PASSWORD_HASHING_WORKERS = getattr(settings, 'PASSWORD_HASHING_WORKERS', None) or os.cpu_count() or 1
+PASSWORD_HASHING_QUEUE_SIZE = getattr(settings, 'PASSWORD_HASHING_QUEUE_SIZE', 64)
+
+
+class HashingBusy(Exception):
+    """The hashing queue is full."""
+
+
+class HashingExecutor:
+    """
+    Bounded thread pool for password hashing, with queue-depth metrics
+    (`stats()`, and the Prometheus metrics in backend.metrics).
+
+    `run()` blocks the caller until the hash is done; it raises HashingBusy
+    when `workers + queue_size` hashes are already in flight.
+    """
+
+    def __init__(self, workers, queue_size):
+        self.workers = workers
+        self.queue_size = queue_size
+        self.pool = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hashing')
+        self.lock = threading.Lock()
+        self.in_flight = 0
+        self.counters = {
+            'submitted': 0,
+            'completed': 0,
+            'rejected': 0,
+            'max_queue_depth': 0,
+            'wait_seconds': 0.0,
+            'hash_seconds': 0.0,
+        }
+
+    def submit(self, fn, *args):
+        with self.lock:
+            if self.in_flight >= self.workers + self.queue_size:
+                self.counters['rejected'] += 1
+                if metrics.prometheus_client is not None:
+                    metrics.HASHING_REJECTED.inc()
+                raise HashingBusy()
+            self.in_flight += 1
+            self.counters['submitted'] += 1
+            depth = self.export_queue_depth()
+            self.counters['max_queue_depth'] = max(self.counters['max_queue_depth'], depth)
+
+        queued_at = time.perf_counter()
+
+        def job():
+            started = time.perf_counter()
+            if metrics.prometheus_client is not None:
+                metrics.HASHING_WAIT.observe(started - queued_at)
+            try:
+                return fn(*args)
+            finally:
+                finished = time.perf_counter()
+                with self.lock:
+                    self.in_flight -= 1
+                    self.export_queue_depth()
+                    self.counters['completed'] += 1
+                    self.counters['wait_seconds'] += started - queued_at
+                    self.counters['hash_seconds'] += finished - started
+
+        return self.pool.submit(job)
+
+    def run(self, fn, *args):
+        return self.submit(fn, *args).result()
+
+    def export_queue_depth(self):
+        # Called with the lock held
+        depth = max(self.in_flight - self.workers, 0)
+        if metrics.prometheus_client is not None:
+            metrics.HASHING_QUEUE_DEPTH.set(depth)
+        return depth
+
+    def stats(self):
+        with self.lock:
+            return {
+                **self.counters,
+                'workers': self.workers,
+                'in_flight': self.in_flight,
+                'queue_depth': max(self.in_flight - self.workers, 0),
+            }
+
+
+executor = HashingExecutor(PASSWORD_HASHING_WORKERS, PASSWORD_HASHING_QUEUE_SIZE)
+
+
+def check_password_upgrade(raw_password, encoded):
+    """
+    Return (is_correct, new_encoded). `new_encoded` is the password rehashed
+    with the preferred hasher (the first of PASSWORD_HASHERS) when `encoded`
+    uses another hasher or weaker parameters, otherwise None.
+
+    An `encoded` of None (no such user) or an unusable password still costs
+    one hash, so those cases take as long as a wrong password.
+    """
+    if encoded is None:
+        encoded = make_password(None)
+    is_correct, must_update = verify_password(raw_password, encoded)
+    if is_correct and must_update:
+        return True, make_password(raw_password)
+    return is_correct, None
@@ -1,3 +1,232 @@
-from django.test import TestCase
+import threading
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.contrib.auth.hashers import make_password
+from django.core.cache import cache
+from django.test import override_settings
+from django.urls import reverse
+from prometheus_client import REGISTRY
+from rest_framework import status
+from rest_framework.test import APITestCase
+from rest_framework_simplejwt.tokens import AccessToken
+
+from blog.deletion import process_due_jobs
+from blog.models import Post, Comment
+from .authentication import user_changed
+from .hashing import HashingExecutor, executor as password_hashing
+from .models import CustomUser
+from .tokens import UserAccessToken
+
+
+class AccountTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = CustomUser.objects.create_user(
+            email='user@example.com', password='password123', first_name='Test', last_name='User'
+        )
+
+    def login(self, user):
+        # Use a real token so the budgets include JWT authentication
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {UserAccessToken.for_user(user)}')
+
+
+class AccountQueryBudgetTests(AccountTestCase):
+    def test_register(self):
+        data = {'email': 'new@example.com', 'password': 'password123', 'first_name': 'New', 'last_name': 'User'}
+        # unique email check + insert
+        with self.assertNumQueries(2):
+            response = self.client.post(reverse('register'), data)
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_login(self):
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse('login'), {'email': 'user@example.com', 'password': 'password123'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertIn('access_token', response.data['data'])
+
+    def test_login_wrong_password(self):
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse('login'), {'email': 'user@example.com', 'password': 'wrong'})
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_profile(self):
+        self.login(self.user)
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('profile'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['data']['email'], 'user@example.com')
+
+    def test_update_profile(self):
+        self.login(self.user)
+        # fresh row + update
+        with self.assertNumQueries(2):
+            response = self.client.put(reverse('update_profile'), {'first_name': 'Changed'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_change_password(self):
+        self.login(self.user)
+        data = {'current_password': 'password123', 'new_password': 'password456', 'confirm_password': 'password456'}
+        # fresh row + update
+        with self.assertNumQueries(2):
+            response = self.client.put(reverse('change_password'), data)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('password456'))
+
+    def test_delete_account(self):
+        other = CustomUser.objects.create_user(
+            email='other@example.com', password='password123', first_name='Other', last_name='User'
+        )
+        posts = Post.objects.bulk_create([
+            Post(user=self.user, title=f'Post {i}', content='Body') for i in range(10)
+        ])
+        Comment.objects.bulk_create([
+            Comment(user=other, post=post, content='Hi') for post in posts
+        ])
+        self.login(self.user)
+        # post ids for cache invalidation, commented post ids for the cached
+        # comment counts + savepoint, deactivate, queue the job, release; the
+        # rows go in the background
+        with self.assertNumQueries(6):
+            response = self.client.delete(reverse('delete_account'))
+        self.assertEqual(response.status_code, status.HTTP_204_NO_CONTENT)
+        self.assertFalse(Post.objects.exists())
+        process_due_jobs()
+        self.assertFalse(Post.all_objects.exists())
+        self.assertFalse(Comment.all_objects.exists())
+        self.assertFalse(CustomUser.objects.filter(pk=self.user.pk).exists())
+
+
+class LoginHashingTests(AccountTestCase):
+    credentials = {'email': 'user@example.com', 'password': 'password123'}
+
+    def test_legacy_hash_is_upgraded_on_login(self):
+        self.user.password = make_password('password123', hasher='pbkdf2_sha1')
+        self.user.save()
+        # fetch + rehashed password
+        with self.assertNumQueries(2):
+            response = self.client.post(reverse('login'), self.credentials)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.password.startswith('pbkdf2_sha256$'))
+        self.assertTrue(self.user.check_password('password123'))
+        with self.assertNumQueries(1):
+            self.client.post(reverse('login'), self.credentials)
+
+    def test_missing_user_still_hashes(self):
+        completed = password_hashing.stats()['completed']
+        waits = REGISTRY.get_sample_value('blog_api_password_hashing_wait_seconds_count')
+        response = self.client.post(reverse('login'), {'email': 'nobody@example.com', 'password': 'password123'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(password_hashing.stats()['completed'], completed + 1)
+        self.assertEqual(REGISTRY.get_sample_value('blog_api_password_hashing_wait_seconds_count'), waits + 1)
+
+    def test_full_queue_turns_logins_away(self):
+        rejected = REGISTRY.get_sample_value('blog_api_password_hashing_rejected_total')
+        busy = HashingExecutor(workers=1, queue_size=0)
+        release = threading.Event()
+        busy.submit(release.wait)
+        try:
+            with mock.patch('account.views.password_hashing', busy):
+                response = self.client.post(reverse('login'), self.credentials)
+        finally:
+            release.set()
+        self.assertEqual(response.status_code, status.HTTP_503_SERVICE_UNAVAILABLE)
+        self.assertEqual(busy.stats()['rejected'], 1)
+        self.assertEqual(REGISTRY.get_sample_value('blog_api_password_hashing_rejected_total'), rejected + 1)
+
+    def test_change_password_checks_current_password(self):
+        self.login(self.user)
+        data = {'current_password': 'wrong', 'new_password': 'password456', 'confirm_password': 'password456'}
+        response = self.client.put(reverse('change_password'), data)
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.user.refresh_from_db()
+        self.assertTrue(self.user.check_password('password123'))
+
+
+class LoginThrottleTests(AccountTestCase):
+    @override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {'login': '2/min'}})
+    def test_logins_are_limited_per_ip(self):
+        credentials = {'email': 'user@example.com', 'password': 'wrong'}
+        for _ in range(2):
+            response = self.client.post(reverse('login'), credentials)
+            self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        response = self.client.post(reverse('login'), credentials)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertIn('Retry-After', response)
+        response = self.client.post(reverse('login'), credentials, REMOTE_ADDR='10.0.0.2')
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class ClaimsAuthenticationTests(AccountTestCase):
+    def test_login_token_needs_no_user_query(self):
+        response = self.client.post(reverse('login'), {'email': 'user@example.com', 'password': 'password123'})
+        self.client.credentials(HTTP_AUTHORIZATION=f"Bearer {response.data['data']['access_token']}")
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('profile'))
+        self.assertEqual(response.data['data']['first_name'], 'Test')
+
+    def test_token_without_claims_loads_user(self):
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {AccessToken.for_user(self.user)}')
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('profile'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_profile_change_reaches_existing_tokens(self):
+        self.login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(reverse('update_profile'), {'first_name': 'Changed'})
+        # The token's claims are stale: the user is loaded
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('profile'))
+        self.assertEqual(response.data['data']['first_name'], 'Changed')
+
+    def test_deactivated_user_is_rejected(self):
+        self.login(self.user)
+        self.user.is_active = False
+        with self.captureOnCommitCallbacks(execute=True):
+            self.user.save()
+        response = self.client.get(reverse('profile'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_deactivation_without_save_applies_once_reported(self):
+        self.login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            CustomUser.objects.filter(pk=self.user.pk).update(is_active=False)
+            user_changed(self.user.pk, is_active=False)
+        # rejected from the cache, without loading the user
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('profile'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_reactivated_user_is_accepted(self):
+        self.login(self.user)
+        for is_active in (False, True):
+            self.user.is_active = is_active
+            with self.captureOnCommitCallbacks(execute=True):
+                self.user.save()
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {UserAccessToken.for_user(self.user)}')
+        response = self.client.get(reverse('profile'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    @override_settings(DELETION_IN_PROCESS=False)
+    def test_deleted_user_is_rejected(self):
+        self.login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse('delete_account'))
+        response = self.client.get(reverse('profile'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+
+
+class AsyncProfileTests(AccountTestCase):
+    def test_matches_sync_view(self):
+        self.login(self.user)
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('profile_async'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), self.client.get(reverse('profile')).json())
+
+    def test_requires_authentication(self):
+        response = self.client.get(reverse('profile_async'))
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
@@ -0,0 +1,23 @@
+from rest_framework_simplejwt.tokens import AccessToken, RefreshToken
+
+# Profile fields signed into every token, so authentication can build the
+# user from the token instead of loading it (see account.authentication).
+USER_CLAIMS = ('email', 'first_name', 'last_name', 'is_active', 'is_staff', 'is_superuser')
+
+
+class UserClaimsMixin:
+    @classmethod
+    def for_user(cls, user):
+        token = super().for_user(user)
+        for claim in USER_CLAIMS:
+            token[claim] = getattr(user, claim)
+        return token
+
+
+class UserAccessToken(UserClaimsMixin, AccessToken):
+    pass
+
+
+class UserRefreshToken(UserClaimsMixin, RefreshToken):
+    # The claims are copied over to the access token
+    access_token_class = UserAccessToken
@@ -1,12 +1,14 @@
 from django.urls import path
-from .views import CustomUserLoginView, CustomUserRegisterView, CustomUserProfileView, UpdateCustomUserProfileView, ChangePasswordView, DeleteAccountView
+from backend.throttling import scoped_throttles
+from .views import CustomUserLoginView, CustomUserRegisterView, CustomUserProfileView, UpdateCustomUserProfileView, ChangePasswordView, DeleteAccountView, AsyncCustomUserProfileView
 
 urlpatterns = [
-    path('login/', CustomUserLoginView.as_view(), name='login'),
-    path('register/', CustomUserRegisterView.as_view(), name='register'),
+    path('login/', CustomUserLoginView.as_view(throttle_classes=scoped_throttles('login')), name='login'),
+    path('register/', CustomUserRegisterView.as_view(throttle_classes=scoped_throttles('register')), name='register'),
     path('profile/', CustomUserProfileView.as_view(), name='profile'),
     path('profile/update/', UpdateCustomUserProfileView.as_view(), name='update_profile'),
-    path('profile/change-password/', ChangePasswordView.as_view(), name='change_password'),
+    path('profile/change-password/', ChangePasswordView.as_view(throttle_classes=scoped_throttles('password')), name='change_password'),
     path('profile/delete-account/', DeleteAccountView.as_view(), name='delete_account'),
+    path('async/profile/', AsyncCustomUserProfileView.as_view(), name='profile_async'),
     
 ]
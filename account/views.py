@@ -5,8 +5,11 @@ from django.contrib.auth import authenticate
 from .serializers import CustomUserLoginSerializer, CustomUserRegisterSerializer, CustomUserProfileSerializer
 from rest_framework.permissions import IsAuthenticated
 from .models import CustomUser 
-from django.contrib.auth.hashers import check_password
-from rest_framework_simplejwt.tokens import RefreshToken, AccessToken
+from blog.deletion import schedule_account_deletion
+from backend.async_api import AsyncAPIView
+from django.contrib.auth.hashers import make_password
+from .hashing import HashingBusy, check_password_upgrade, executor as password_hashing
+from .tokens import UserRefreshToken
 from rest_framework_simplejwt.exceptions import TokenError
 
 
@@ -39,18 +42,37 @@ class CustomUserLoginView(GenericAPIView):
         try:
             user = CustomUser.objects.get(email=data.get("email"))
         except CustomUser.DoesNotExist:
+            user = None
+
+        # Hash on the bounded hashing pool; a missing user costs a hash too, so
+        # that branch takes as long as a wrong password
+        try:
+            check, upgraded = password_hashing.run(
+                check_password_upgrade, data["password"], user.password if user else None
+            )
+        except HashingBusy:
+            return Response(
+                {
+                    "message": "Too many login attempts in progress, try again shortly",
+                },
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": "1"},
+            )
+        if user is None:
             return Response(
                 {
                     "message": "User does not exist",
                 },
                 status=status.HTTP_404_NOT_FOUND,
             )
-        
-        password = user.password
-        check = check_password(data["password"], password)
+
+        if upgraded:
+            # Rehash with the preferred hasher now that the password is known
+            user.password = upgraded
+            user.save(update_fields=["password"])
         if check and user.is_active:
             try:
-                refresh = RefreshToken.for_user(user)
+                refresh = UserRefreshToken.for_user(user)
                 access_token = str(refresh.access_token)
                 refresh_token = str(refresh)
             except TokenError:
@@ -100,12 +122,24 @@ class CustomUserProfileView(GenericAPIView):
             status=status.HTTP_200_OK,
         )
 
+class AsyncCustomUserProfileView(AsyncAPIView):
+    # Async counterpart of CustomUserProfileView, mounted under async/
+    require_authentication = True
+
+    async def get(self, request):
+        serializer = CustomUserProfileSerializer(request.user)
+        return {
+            "message": "User profile retrieved successfully",
+            "data": serializer.data,
+        }
+
 class UpdateCustomUserProfileView(GenericAPIView):
     serializer_class = CustomUserProfileSerializer
     permission_classes = [IsAuthenticated]
 
     def put(self, request):
-        user = request.user
+        # request.user only carries the token's claims; save a full, current row
+        user = CustomUser.objects.get(pk=request.user.pk)
         serializer = self.serializer_class(user, data=request.data, partial=True)
         if serializer.is_valid(raise_exception=True):
             serializer.save()
@@ -122,7 +156,8 @@ class ChangePasswordView(GenericAPIView):
     permission_classes = [IsAuthenticated]
 
     def put(self, request):
-        user = request.user
+        # request.user only carries the token's claims; save a full, current row
+        user = CustomUser.objects.get(pk=request.user.pk)
         current_password = request.data.get("current_password")
         new_password = request.data.get("new_password")
         confirm_password = request.data.get("confirm_password")
@@ -133,10 +168,18 @@ class ChangePasswordView(GenericAPIView):
         if new_password != confirm_password:
             return Response({"message": "New password and confirm password do not match"}, status=status.HTTP_400_BAD_REQUEST)
 
-        if not check_password(current_password, user.password):
-            return Response({"message": "Current password is incorrect"}, status=status.HTTP_400_BAD_REQUEST)
-
-        user.set_password(new_password)
+        # Both hashes run on the bounded hashing pool, like login
+        try:
+            check, _ = password_hashing.run(check_password_upgrade, current_password, user.password)
+            if not check:
+                return Response({"message": "Current password is incorrect"}, status=status.HTTP_400_BAD_REQUEST)
+            user.password = password_hashing.run(make_password, new_password)
+        except HashingBusy:
+            return Response(
+                {"message": "Too many password changes in progress, try again shortly"},
+                status=status.HTTP_503_SERVICE_UNAVAILABLE,
+                headers={"Retry-After": "1"},
+            )
         user.save()
 
         return Response({"message": "Password updated successfully"}, status=status.HTTP_200_OK)
@@ -151,7 +194,9 @@ class DeleteAccountView(GenericAPIView):
             return Response({"message": "Authentication credentials were not provided."}, status=status.HTTP_401_UNAUTHORIZED)
         # Delete the user account
         try:
-            user.delete()
+            # Deactivated and hidden now; posts and comments are removed in
+            # the background, keeping other posts' comment counts in step
+            schedule_account_deletion(user)
             return Response({"message": f"Account associated with {user.email} deleted successfully"}, status=status.HTTP_204_NO_CONTENT)
         except Exception as e:
             return Response({"message": f"An error occurred while deleting the account: {str(e)}"}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
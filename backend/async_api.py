@@ -0,0 +1,77 @@
+from django.contrib.auth.models import AnonymousUser
+from django.http import Http404, HttpResponse
+from django.views import View
+from rest_framework import exceptions, status
+from rest_framework.request import Request
+from rest_framework.settings import api_settings
+
+from account.authentication import JWTClaimsAuthentication
+from .renderers import FastJSONRenderer
+
+
+class AsyncAPIView(View):
+    """
+    Minimal async counterpart of DRF's APIView for the read endpoints.
+
+    DRF views are synchronous, so under ASGI each request holds a thread.
+    Subclasses define `async def get(self, request, ...)` and return plain
+    data (or an HttpResponse); authentication, error responses and JSON
+    rendering match what the DRF views produce.
+    """
+    authentication_class = JWTClaimsAuthentication
+    require_authentication = False
+    throttle_classes = api_settings.DEFAULT_THROTTLE_CLASSES
+    renderer_class = FastJSONRenderer
+
+    async def dispatch(self, request, *args, **kwargs):
+        handler = getattr(self, request.method.lower(), None)
+        if request.method.lower() not in self.http_method_names or handler is None:
+            # Returns a coroutine on async views
+            return await self.http_method_not_allowed(request, *args, **kwargs)
+
+        # Wrap the request so paginators and filter backends can be reused
+        request = Request(request)
+        try:
+            await self.authenticate(request)
+            await self.check_throttles(request)
+            response = await handler(request, *args, **kwargs)
+        except (exceptions.APIException, Http404) as exc:
+            response = self.handle_exception(exc)
+        if not isinstance(response, HttpResponse):
+            response = self.render(response)
+        return response
+
+    async def authenticate(self, request):
+        authenticator = self.authentication_class()
+        result = await authenticator.aauthenticate(request)
+        if result is None:
+            request.user, request.auth = AnonymousUser(), None
+        else:
+            request.user, request.auth = result
+        if self.require_authentication and not request.user.is_authenticated:
+            raise exceptions.NotAuthenticated()
+
+    async def check_throttles(self, request):
+        for throttle_class in self.throttle_classes:
+            throttle = throttle_class()
+            if not await throttle.aallow_request(request, self):
+                raise exceptions.Throttled(throttle.wait())
+
+    def handle_exception(self, exc):
+        # Same body and headers as rest_framework.views.exception_handler
+        if isinstance(exc, Http404):
+            exc = exceptions.NotFound(*exc.args)
+        if isinstance(exc, (exceptions.NotAuthenticated, exceptions.AuthenticationFailed)):
+            exc.status_code = status.HTTP_401_UNAUTHORIZED
+        data = exc.detail if isinstance(exc.detail, (list, dict)) else {'detail': exc.detail}
+        response = self.render(data, exc.status_code)
+        if exc.status_code == status.HTTP_401_UNAUTHORIZED:
+            response['WWW-Authenticate'] = self.authentication_class().authenticate_header(None)
+        if getattr(exc, 'wait', None):
+            response['Retry-After'] = '%d' % exc.wait
+        return response
+
+    def render(self, data, status_code=status.HTTP_200_OK):
+        renderer = self.renderer_class()
+        content = renderer.render(data, renderer.media_type, {})
+        return HttpResponse(content, content_type=renderer.media_type, status=status_code)
@@ -0,0 +1,118 @@
+import os
+import time
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+
+from .profiling import RequestTimings, recording
+
+try:
+    import prometheus_client
+    from prometheus_client import multiprocess
+except ImportError:
+    prometheus_client = None
+
+# Requests whose URL did not resolve share one label, so scanners probing
+# random paths cannot blow up the number of series
+UNRESOLVED = '<unresolved>'
+METHODS = {'GET', 'HEAD', 'POST', 'PUT', 'PATCH', 'DELETE', 'OPTIONS'}
+
+if prometheus_client is not None:
+    REQUESTS = prometheus_client.Counter(
+        'blog_api_requests', "Requests handled, by URL name, method and status.", ['view', 'method', 'status'],
+    )
+    LATENCY = prometheus_client.Histogram(
+        'blog_api_request_duration_seconds', "Request latency, by URL name and method.", ['view', 'method'],
+    )
+    QUERIES = prometheus_client.Histogram(
+        'blog_api_request_queries', "Database queries per request, by URL name.", ['view'],
+        buckets=(0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89),
+    )
+    # 'livesum': summed over the worker processes still alive
+    IN_FLIGHT = prometheus_client.Gauge(
+        'blog_api_requests_in_flight', "Requests being handled.", multiprocess_mode='livesum',
+    )
+    # Fed by account.hashing.HashingExecutor
+    HASHING_QUEUE_DEPTH = prometheus_client.Gauge(
+        'blog_api_password_hashing_queue_depth', "Password hashes waiting for a hashing worker.",
+        multiprocess_mode='livesum',
+    )
+    HASHING_WAIT = prometheus_client.Histogram(
+        'blog_api_password_hashing_wait_seconds', "Time password hashes waited for a hashing worker.",
+    )
+    HASHING_REJECTED = prometheus_client.Counter(
+        'blog_api_password_hashing_rejected', "Password hashes turned away because the queue was full.",
+    )
+
+
+def multiprocess_enabled():
+    # prometheus_client writes every process' samples to mmap-backed files in
+    # this directory; it must be set (and emptied) before the workers start
+    return 'PROMETHEUS_MULTIPROC_DIR' in os.environ
+
+
+def collect():
+    """The metrics in the Prometheus text format, and its content type."""
+    if multiprocess_enabled():
+        registry = prometheus_client.CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = prometheus_client.REGISTRY
+    return prometheus_client.generate_latest(registry), prometheus_client.CONTENT_TYPE_LATEST
+
+
+def child_exit(server, worker):
+    """
+    Gunicorn hook (`child_exit = backend.metrics.child_exit` in the config),
+    so a dead worker's requests stop counting as in flight.
+    """
+    if prometheus_client is not None and multiprocess_enabled():
+        multiprocess.mark_process_dead(worker.pid)
+
+
+class MetricsMiddleware:
+    """
+    Request count, latency and query count histograms per URL name (see
+    blog/urls.py and account/urls.py), and requests in flight, exported by
+    backend.views.metrics. With several worker processes, set
+    PROMETHEUS_MULTIPROC_DIR so the endpoint aggregates all of them.
+
+    Disabled by METRICS_ENABLED = False, or without prometheus_client.
+    Streaming responses are timed until their first byte. Async-capable, so
+    under ASGI it does not put the async views back on a worker thread.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if prometheus_client is None or not getattr(settings, 'METRICS_ENABLED', True):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        started = time.perf_counter()
+        with IN_FLIGHT.track_inprogress(), recording(RequestTimings()) as counter:
+            response = self.get_response(request)
+        self.observe(request, response, counter, time.perf_counter() - started)
+        return response
+
+    async def __acall__(self, request):
+        started = time.perf_counter()
+        with IN_FLIGHT.track_inprogress(), recording(RequestTimings()) as counter:
+            response = await self.get_response(request)
+        self.observe(request, response, counter, time.perf_counter() - started)
+        return response
+
+    def observe(self, request, response, counter, elapsed):
+        match = request.resolver_match
+        view = (match.url_name or match.view_name) if match else UNRESOLVED
+        method = request.method if request.method in METHODS else 'OTHER'
+        REQUESTS.labels(view, method, str(response.status_code)).inc()
+        LATENCY.labels(view, method).observe(elapsed)
+        QUERIES.labels(view).observe(counter.queries)
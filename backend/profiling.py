@@ -0,0 +1,233 @@
+import cProfile
+import functools
+import json
+import random
+import re
+import time
+import uuid
+from contextlib import contextmanager
+from contextvars import ContextVar
+from pathlib import Path
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.db.backends.signals import connection_created
+from django.utils import timezone
+from rest_framework import serializers
+
+# Timings of the request being profiled, None when profiling is off
+_current = ContextVar('request_timings', default=None)
+
+# What records the current request's queries (RequestTimings). A context
+# variable, so the queries an async view runs in sync_to_async() threads,
+# on those threads' own connections, are recorded too.
+_recorders = ContextVar('query_recorders', default=())
+
+# Names of the dumps written by ProfilingMiddleware
+DUMP_NAME = re.compile(r'^\d{8}T\d{12}-[0-9a-f]{8}$')
+
+
+class RequestTimings:
+    """
+    What one request spent, in seconds. Passed the request's queries by
+    recording(), so it also counts them.
+    """
+
+    def __init__(self):
+        self.queries = 0
+        self.db = 0.0
+        self.serialize = 0.0
+        self.measuring = set()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.db += time.perf_counter() - started
+            self.queries += 1
+
+
+def record_query(execute, sql, params, many, context):
+    for recorder in _recorders.get():
+        execute = functools.partial(recorder, execute)
+    return execute(sql, params, many, context)
+
+
+def install_recorder(connection, **kwargs):
+    # First, since execute_wrapper() pops the last wrapper when it exits
+    if record_query not in connection.execute_wrappers:
+        connection.execute_wrappers.insert(0, record_query)
+
+
+# Connections are per thread and opened lazily, so each one is hooked as it
+# connects, whichever thread runs the query
+connection_created.connect(install_recorder)
+
+
+@contextmanager
+def recording(recorder):
+    """Pass the queries run in this context, in any thread, to `recorder`."""
+    for connection in connections.all(initialized_only=True):
+        install_recorder(connection)
+    token = _recorders.set(_recorders.get() + (recorder,))
+    try:
+        yield recorder
+    finally:
+        _recorders.reset(token)
+
+
+def measure(metric):
+    """
+    Add the time spent in the decorated function to `metric` of the request
+    being profiled. Nested and recursive calls are counted once; with
+    profiling off the cost is one context variable lookup.
+    """
+    def decorator(func):
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            timings = _current.get()
+            if timings is None or metric in timings.measuring:
+                return func(*args, **kwargs)
+            timings.measuring.add(metric)
+            started = time.perf_counter()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                setattr(timings, metric, getattr(timings, metric) + time.perf_counter() - started)
+                timings.measuring.discard(metric)
+        wrapper.measured = metric
+        return wrapper
+    return decorator
+
+
+def instrument_serializers():
+    # DRF's serializers do their work when `.data` is first read
+    for cls in (serializers.BaseSerializer, serializers.Serializer, serializers.ListSerializer):
+        prop = cls.__dict__['data']
+        if not hasattr(prop.fget, 'measured'):
+            cls.data = property(measure('serialize')(prop.fget), prop.fset, prop.fdel, prop.__doc__)
+
+
+def profile_dir():
+    return Path(getattr(settings, 'PROFILING_DIR', settings.BASE_DIR / 'profiles'))
+
+
+def list_dumps():
+    """Metadata of the saved profiles, newest first."""
+    dumps = []
+    for path in sorted(profile_dir().glob('*.json'), reverse=True):
+        try:
+            dumps.append(json.loads(path.read_text()))
+        except (OSError, ValueError):
+            continue
+    return dumps
+
+
+class ProfilingMiddleware:
+    """
+    Opt-in request profiling, enabled with PROFILING_ENABLED.
+
+    Every request gets a Server-Timing header with its wall time, database
+    time and query count (from connection.execute_wrapper) and serializer
+    time. PROFILING_SAMPLE_RATE of the requests also run under cProfile,
+    dumped into PROFILING_DIR and listed by backend.views.ProfileListView;
+    only the newest PROFILING_MAX_DUMPS are kept.
+
+    Disabled, Django drops the middleware when it loads, so it costs nothing.
+    Queries run while a streaming response is consumed are not counted.
+    Async-capable, so under ASGI the async views keep running async.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not getattr(settings, 'PROFILING_ENABLED', False):
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+        self.sample_rate = getattr(settings, 'PROFILING_SAMPLE_RATE', 0.0)
+        self.max_dumps = getattr(settings, 'PROFILING_MAX_DUMPS', 100)
+        instrument_serializers()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        timings = RequestTimings()
+        token = _current.set(timings)
+        profile = self.start_profile()
+        started = time.perf_counter()
+        try:
+            with recording(timings):
+                response = self.get_response(request)
+        finally:
+            _current.reset(token)
+            if profile is not None:
+                profile.disable()
+        return self.finish(request, response, timings, profile, time.perf_counter() - started)
+
+    async def __acall__(self, request):
+        # A sampled request profiles the event loop's thread: its own
+        # coroutines, and whatever else ran there meanwhile
+        timings = RequestTimings()
+        token = _current.set(timings)
+        profile = self.start_profile()
+        started = time.perf_counter()
+        try:
+            with recording(timings):
+                response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+            if profile is not None:
+                profile.disable()
+        return self.finish(request, response, timings, profile, time.perf_counter() - started)
+
+    def start_profile(self):
+        if random.random() >= self.sample_rate:
+            return None
+        profile = cProfile.Profile()
+        try:
+            profile.enable()
+        except ValueError:
+            # Another profiler is active on this thread
+            return None
+        return profile
+
+    def finish(self, request, response, timings, profile, total):
+        metrics = [
+            f'total;dur={total * 1000:.2f}',
+            f'db;dur={timings.db * 1000:.2f};desc="{timings.queries} queries"',
+            f'serialize;dur={timings.serialize * 1000:.2f}',
+        ]
+        if profile is not None:
+            name = self.dump(profile, request, response, total, timings)
+            metrics.append(f'profile;desc="{name}"')
+        response['Server-Timing'] = ', '.join(metrics)
+        return response
+
+    def dump(self, profile, request, response, total, timings):
+        directory = profile_dir()
+        directory.mkdir(parents=True, exist_ok=True)
+        now = timezone.now()
+        name = f'{now:%Y%m%dT%H%M%S%f}-{uuid.uuid4().hex[:8]}'
+        profile.dump_stats(directory / f'{name}.prof')
+        (directory / f'{name}.json').write_text(json.dumps({
+            'name': name,
+            'created_at': now.isoformat(),
+            'method': request.method,
+            'path': request.get_full_path(),
+            'status': response.status_code,
+            'total_ms': round(total * 1000, 2),
+            'db_ms': round(timings.db * 1000, 2),
+            'queries': timings.queries,
+            'serialize_ms': round(timings.serialize * 1000, 2),
+        }))
+        # Names sort by time; drop the oldest past the limit
+        for path in sorted(directory.glob('*.json'), reverse=True)[self.max_dumps:]:
+            path.unlink(missing_ok=True)
+            path.with_suffix('.prof').unlink(missing_ok=True)
+        return name
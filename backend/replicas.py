@@ -0,0 +1,211 @@
+import hashlib
+import random
+import threading
+import time
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import DEFAULT_DB_ALIAS, DatabaseError, connections
+
+SAFE_METHODS = ('GET', 'HEAD', 'OPTIONS')
+
+# Routing state of the current request; None outside requests (management
+# commands, the shell), which always use the primary
+_state = ContextVar('replica_state', default=None)
+
+# alias -> (monotonic time of the last check, healthy), per process
+_health = {}
+_health_lock = threading.Lock()
+
+# Seconds the replica is behind, 0 when it has replayed everything it
+# received (an idle primary must not look like a lagging replica)
+POSTGRES_LAG = (
+    "SELECT CASE WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0 "
+    "ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()) END"
+)
+
+
+def replica_aliases():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+def check_replica(alias):
+    """Whether `alias` answers, and on PostgreSQL is within REPLICA_MAX_LAG."""
+    connection = connections[alias]
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute(POSTGRES_LAG)
+                lag = cursor.fetchone()[0]
+                return lag is None or lag <= getattr(settings, 'REPLICA_MAX_LAG', 5)
+            cursor.execute('SELECT 1')
+            return True
+    except DatabaseError:
+        # Reconnect on the next check rather than reuse a broken connection
+        try:
+            connection.close()
+        except DatabaseError:
+            pass
+        return False
+
+
+def healthy_replicas():
+    """Replicas that passed their last check, rechecked every REPLICA_HEALTH_INTERVAL seconds."""
+    interval = getattr(settings, 'REPLICA_HEALTH_INTERVAL', 10)
+    now = time.monotonic()
+    healthy = []
+    for alias in replica_aliases():
+        with _health_lock:
+            checked_at, ok = _health.get(alias, (None, False))
+        if checked_at is None or now - checked_at >= interval:
+            ok = check_replica(alias)
+            with _health_lock:
+                _health[alias] = (now, ok)
+        if ok:
+            healthy.append(alias)
+    return healthy
+
+
+def sticky_seconds():
+    return getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+
+
+def reset_health():
+    with _health_lock:
+        _health.clear()
+
+
+class RequestState:
+    def __init__(self, use_replicas):
+        self.use_replicas = use_replicas
+        self.wrote = False
+        self.alias = None
+
+    def read_alias(self):
+        if not self.use_replicas or self.wrote:
+            return DEFAULT_DB_ALIAS
+        if self.alias is None:
+            # One replica for the whole request, so its reads are consistent
+            healthy = healthy_replicas()
+            self.alias = random.choice(healthy) if healthy else DEFAULT_DB_ALIAS
+        return self.alias
+
+
+class ReplicaRouter:
+    """
+    Sends the reads of requests ReplicaMiddleware marked as safe to one of
+    DATABASE_REPLICAS, and everything else to the primary.
+
+    Reads go to the primary when they happen outside a request, after the
+    request wrote, or when no replica is healthy; select_for_update() is
+    routed as a write. Replicas are never migrated, they follow the primary.
+    """
+
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        if state is None:
+            return None
+        instance = hints.get('instance')
+        if instance is not None and instance._state.db:
+            # Related objects come from where the instance came from
+            return instance._state.db
+        return state.read_alias()
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        aliases = {DEFAULT_DB_ALIAS, *replica_aliases()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        if db in replica_aliases():
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    """
+    Lets the reads of GET, HEAD and OPTIONS requests go to replicas (see
+    ReplicaRouter), with read-your-writes: once a request writes, the same
+    client reads from the primary for REPLICA_STICKY_SECONDS, long enough
+    for the replicas to catch up. Clients are told apart by their
+    Authorization header, else their session cookie, else their address;
+    the pins live in the default cache so every worker sees them. Shared
+    caches (posts, the feed, counts) are filled from the
+    primary, so a lagging replica cannot put old rows in front of everyone.
+
+    Not used when DATABASE_REPLICAS is empty.
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        if not replica_aliases():
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        key = self.pin_key(request)
+        state = RequestState(request.method in SAFE_METHODS and not cache.get(key))
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+        self.wrap_stream(response, state)
+        if state.wrote:
+            cache.set(key, True, sticky_seconds())
+        return response
+
+    async def __acall__(self, request):
+        key = self.pin_key(request)
+        state = RequestState(request.method in SAFE_METHODS and not await cache.aget(key))
+        # Copied into the threads the async views query from
+        token = _state.set(state)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _state.reset(token)
+        self.wrap_stream(response, state)
+        if state.wrote:
+            await cache.aset(key, True, sticky_seconds())
+        return response
+
+    def wrap_stream(self, response, state):
+        if response.streaming and not response.is_async:
+            # Streamed bodies (the export) query while they are sent
+            response.streaming_content = self.stream(response.streaming_content, state)
+
+    def pin_key(self, request):
+        client = (
+            request.META.get('HTTP_AUTHORIZATION')
+            or request.COOKIES.get(settings.SESSION_COOKIE_NAME)
+            or request.META.get('REMOTE_ADDR', '')
+        )
+        return f"replica:pin:{hashlib.sha256(client.encode()).hexdigest()}"
+
+    def stream(self, content, state):
+        iterator = iter(content)
+        while True:
+            token = _state.set(state)
+            try:
+                chunk = next(iterator)
+            except StopIteration:
+                return
+            finally:
+                _state.reset(token)
+            yield chunk
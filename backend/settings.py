@@ -47,6 +47,11 @@ INSTALLED_APPS = [
 AUTH_USER_MODEL = 'account.CustomUser'
 
 MIDDLEWARE = [
+    # First, so its timings cover the rest; a no-op unless PROFILING_ENABLED
+    'backend.profiling.ProfilingMiddleware',
+    'backend.metrics.MetricsMiddleware',
+    # Sends safe requests' reads to DATABASE_REPLICAS, when there are any
+    'backend.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -58,11 +63,37 @@ MIDDLEWARE = [
 
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': (
-        'rest_framework_simplejwt.authentication.JWTAuthentication',
+        'account.authentication.JWTClaimsAuthentication',
     ),
     'DEFAULT_PAGINATION_CLASS': 'blog.paginator.CustomPagination',
     'DEFAULT_FILTER_BACKENDS': ['django_filters.rest_framework.DjangoFilterBackend'],
     'PAGE_SIZE': 5,  # You can change this to any number
+    # orjson-backed JSON, falling back to the stdlib when it is not installed
+    # (see backend/renderers.py and backend/parsers.py)
+    'DEFAULT_RENDERER_CLASSES': [
+        'backend.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
+    'DEFAULT_PARSER_CLASSES': [
+        'backend.parsers.FastJSONParser',
+        'rest_framework.parsers.FormParser',
+        'rest_framework.parsers.MultiPartParser',
+    ],
+    # Token buckets per user (or per IP when anonymous), see backend/throttling.py.
+    # Views add a scope in blog/urls.py and account/urls.py; a scope without
+    # a rate here is not limited.
+    'DEFAULT_THROTTLE_CLASSES': ['backend.throttling.TokenBucketThrottle'],
+    'DEFAULT_THROTTLE_RATES': {
+        'user': '600/min',
+        'anon': '120/min',
+        'login': '10/min',
+        'register': '10/hour',
+        'password': '5/min',
+        'post': '60/min',
+        'comment': '30/min',
+        'search': '60/min',
+        'export': '10/hour',
+    },
 }
 
 ROOT_URLCONF = 'backend.urls'
@@ -100,9 +131,54 @@ DATABASES = {
         'PASSWORD': 'blog_password',
         'HOST': 'localhost',
         'PORT': '5432',
-    }
+    },
+    # A streaming replica of `default`; list it in DATABASE_REPLICAS too.
+    # 'replica': {
+    #     'ENGINE': 'django.db.backends.postgresql',
+    #     'NAME': 'blog_db',
+    #     'USER': 'blog_user',
+    #     'PASSWORD': 'blog_password',
+    #     'HOST': 'replica.localhost',
+    #     'PORT': '5432',
+    #     'TEST': {'MIRROR': 'default'},
+    # },
 }
 
+# Safe requests read from these aliases (see backend/replicas.py). A client
+# that wrote reads from the primary for REPLICA_STICKY_SECONDS afterwards;
+# replicas are checked every REPLICA_HEALTH_INTERVAL seconds and skipped
+# while they are down or more than REPLICA_MAX_LAG seconds behind.
+DATABASE_ROUTERS = ['backend.replicas.ReplicaRouter']
+DATABASE_REPLICAS = []
+REPLICA_STICKY_SECONDS = 10
+REPLICA_HEALTH_INTERVAL = 10
+REPLICA_MAX_LAG = 5
+
+
+# Cache
+# https://docs.djangoproject.com/en/5.2/topics/cache/
+# LocMemCache evicts least-recently-used entries past MAX_ENTRIES; in
+# production point this at a shared backend (Redis configured with an LRU
+# maxmemory-policy) so every worker sees the same entries and invalidations.
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'blog-api',
+        'TIMEOUT': 300,
+        'OPTIONS': {'MAX_ENTRIES': 10000},
+    },
+    # 'default': {
+    #     'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+    #     'LOCATION': 'redis://localhost:6379/0',
+    #     'TIMEOUT': 300,
+    # },
+}
+
+# Seconds a serialized post stays in the cache (see blog/cache.py)
+POST_CACHE_TIMEOUT = 300
+POST_CACHE_LOCK_TIMEOUT = 5
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
@@ -122,6 +198,23 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# The first hasher hashes new passwords; passwords stored with any of the
+# others (or with fewer iterations) are rehashed with it on the next login.
+# Argon2 needs `argon2-cffi`, bcrypt needs `bcrypt`.
+PASSWORD_HASHERS = [
+    'django.contrib.auth.hashers.PBKDF2PasswordHasher',
+    'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    'django.contrib.auth.hashers.Argon2PasswordHasher',
+    'django.contrib.auth.hashers.BCryptSHA256PasswordHasher',
+    'django.contrib.auth.hashers.ScryptPasswordHasher',
+]
+
+# Password hashes run on a bounded pool (see account/hashing.py): at most
+# this many at once (default: one per CPU), with this many more queued
+# before logins get a 503
+PASSWORD_HASHING_WORKERS = None
+PASSWORD_HASHING_QUEUE_SIZE = 64
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/5.2/topics/i18n/
@@ -163,3 +256,57 @@ SWAGGER_SETTINGS = {
         "Bearer": {"type": "apiKey", "name": "Authorization", "in": "header"},
     },
 }
+
+# Largest number of posts accepted by one request to the batch create endpoint
+POST_BATCH_MAX_SIZE = 1000
+
+# Largest number of ids accepted by one request to the batch view endpoint
+POST_VIEW_MAX_IDS = 100
+
+# Rows fetched per round trip by the streaming export's server-side cursors
+EXPORT_CHUNK_SIZE = 2000
+
+# Request profiling (see backend/profiling.py): Server-Timing headers on
+# every response, and this fraction of requests dumped under cProfile into
+# PROFILING_DIR, newest PROFILING_MAX_DUMPS kept, listed at /api/profiles/
+PROFILING_ENABLED = False
+PROFILING_SAMPLE_RATE = 0.01
+PROFILING_DIR = BASE_DIR / 'profiles'
+PROFILING_MAX_DUMPS = 100
+
+# Prometheus metrics per URL name at /metrics/ (see backend/metrics.py).
+# With several worker processes, point PROMETHEUS_MULTIPROC_DIR (an
+# environment variable) at an empty directory before starting them.
+METRICS_ENABLED = True
+
+# Deleted posts and accounts are hidden at once and their rows removed in
+# the background (see blog/deletion.py), DELETION_BATCH_SIZE rows per
+# transaction. Failed jobs are retried DELETION_MAX_ATTEMPTS times, waiting
+# DELETION_RETRY_DELAY seconds, doubled on each attempt; a job left running
+# for DELETION_STALE_AFTER seconds is taken over. With DELETION_IN_PROCESS
+# off, run `manage.py process_deletions --loop` instead.
+DELETION_BATCH_SIZE = 500
+DELETION_MAX_ATTEMPTS = 5
+DELETION_RETRY_DELAY = 60
+DELETION_STALE_AFTER = 600
+DELETION_IN_PROCESS = True
+
+# The public feed's newest FEED_SIZE post ids are kept in the cache for
+# FEED_CACHE_TIMEOUT seconds, updated in place by the post write views (see
+# blog/feed.py)
+FEED_SIZE = 1000
+FEED_CACHE_TIMEOUT = 3600
+
+# Deepest reply allowed in a comment thread, roots being depth 0; at most
+# 24, the longest path that fits Comment.path (checked at startup, see
+# blog/threads.py)
+COMMENT_MAX_DEPTH = 8
+
+# Page-number pagination counts up to PAGINATION_EXACT_COUNT_LIMIT rows
+# exactly. Past it, a post's comments are counted once and cached for
+# PAGINATION_COUNT_CACHE_TIMEOUT seconds (the comment write views and
+# deletions drop the count; comments bulk-loaded around them show up when
+# it expires), and other lists use PostgreSQL's estimate, returned with
+# "count_exact": false (see blog/counting.py)
+PAGINATION_EXACT_COUNT_LIMIT = 1000
+PAGINATION_COUNT_CACHE_TIMEOUT = 300
@@ -0,0 +1,192 @@
+import math
+import re
+import threading
+import time
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.cache.backends.redis import RedisCache, RedisCacheClient
+from django.core.exceptions import ImproperlyConfigured
+from rest_framework.settings import api_settings
+from rest_framework.throttling import BaseThrottle
+
+# Cache holding the buckets: a Redis cache, shared by every process and
+# updated with one round trip per request, or a LocMemCache (development
+# and tests), process-local. Other shared caches cannot update a bucket
+# atomically and are refused.
+THROTTLE_CACHE = getattr(settings, 'THROTTLE_CACHE', 'default')
+
+DURATIONS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+
+def parse_rate(rate):
+    """'30/min' -> (30, 0.5): bucket capacity and tokens refilled per second."""
+    num, period = rate.split('/')
+    capacity = int(num)
+    return capacity, capacity / DURATIONS[period[0]]
+
+
+class LocalBucketStore:
+    """
+    Token buckets kept in a LocMemCache, local to the process. The lock
+    makes the read-modify-write atomic within the process, which is all a
+    local cache can offer anyway.
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        self.lock = threading.Lock()
+
+    def consume(self, buckets):
+        """
+        Take one token from each of `buckets` ((key, capacity, rate) tuples),
+        all or none. Return 0 if taken, else the seconds until they would be.
+        """
+        now = time.time()
+        with self.lock:
+            stored = self.cache.get_many([key for key, _, _ in buckets])
+            levels, wait = {}, 0.0
+            for key, capacity, rate in buckets:
+                tokens, updated_at = stored.get(key, (capacity, now))
+                tokens = min(capacity, tokens + (now - updated_at) * rate)
+                if tokens < 1:
+                    wait = max(wait, (1 - tokens) / rate)
+                levels[key] = (tokens - 1, now)
+            if wait:
+                return wait
+            # A bucket left alone this long is full again, it can expire
+            timeout = max(math.ceil(capacity / rate) for _, capacity, rate in buckets)
+            self.cache.set_many(levels, timeout)
+        return 0.0
+
+    async def aconsume(self, buckets):
+        return self.consume(buckets)
+
+
+class RedisBucketStore:
+    """
+    Token buckets in Redis, updated atomically by a Lua script: one round
+    trip per request however many buckets it checks.
+    """
+
+    # KEYS: bucket keys. ARGV: capacity and rate for each key, in order.
+    # Returns "0" if a token was taken from every bucket, else the seconds
+    # to wait (as a string, Lua numbers are truncated to integers).
+    script = """
+    local now = redis.call('TIME')
+    now = tonumber(now[1]) + tonumber(now[2]) / 1000000
+    local levels, wait, ttl = {}, 0, 0
+    for i, key in ipairs(KEYS) do
+        local capacity, rate = tonumber(ARGV[2 * i - 1]), tonumber(ARGV[2 * i])
+        local bucket = redis.call('HMGET', key, 'tokens', 'ts')
+        local tokens = tonumber(bucket[1]) or capacity
+        local updated_at = tonumber(bucket[2]) or now
+        tokens = math.min(capacity, tokens + math.max(0, now - updated_at) * rate)
+        if tokens < 1 then
+            wait = math.max(wait, (1 - tokens) / rate)
+        end
+        levels[i] = tokens - 1
+        ttl = math.max(ttl, math.ceil(capacity / rate))
+    end
+    if wait > 0 then
+        return tostring(wait)
+    end
+    for i, key in ipairs(KEYS) do
+        redis.call('HSET', key, 'tokens', levels[i], 'ts', now)
+        redis.call('EXPIRE', key, ttl)
+    end
+    return '0'
+    """
+
+    def __init__(self, cache):
+        self.cache = cache
+        # RedisCache has no public client, so the script gets one of its own,
+        # built from the same servers and OPTIONS (pool and parser classes,
+        # credentials, timeouts...). The script writes, so it runs on the
+        # first server like the cache's writes; the others are read replicas.
+        params = settings.CACHES[THROTTLE_CACHE]
+        location = params['LOCATION']
+        servers = re.split('[;,]', location) if isinstance(location, str) else location
+        self.client = RedisCacheClient(servers, **params.get('OPTIONS', {})).get_client(write=True)
+        self.lua = self.client.register_script(self.script)
+
+    def consume(self, buckets):
+        keys = [self.cache.make_and_validate_key(key) for key, _, _ in buckets]
+        args = [value for _, capacity, rate in buckets for value in (capacity, rate)]
+        # Runs as EVALSHA, falling back to EVAL the first time the server sees it
+        return float(self.lua(keys=keys, args=args))
+
+    async def aconsume(self, buckets):
+        return await sync_to_async(self.consume, thread_sensitive=False)(buckets)
+
+
+stores = {}
+
+
+def get_store():
+    store = stores.get(THROTTLE_CACHE)
+    if store is None:
+        cache = caches[THROTTLE_CACHE]
+        if isinstance(cache, RedisCache):
+            store_class = RedisBucketStore
+        elif isinstance(cache, LocMemCache):
+            store_class = LocalBucketStore
+        else:
+            raise ImproperlyConfigured(
+                f"THROTTLE_CACHE '{THROTTLE_CACHE}' must be a RedisCache, or a LocMemCache for a single "
+                f"process; {type(cache).__name__} cannot update the buckets atomically"
+            )
+        store = stores[THROTTLE_CACHE] = store_class(cache)
+    return store
+
+
+class TokenBucketThrottle(BaseThrottle):
+    """
+    Token bucket throttle, per user for authenticated requests and per IP
+    otherwise.
+
+    Every request draws from the 'user' or 'anon' rate in
+    DEFAULT_THROTTLE_RATES and, if the throttle has a `scope` (see
+    scoped_throttles()), from that scope's rate as well. A rate of 'N/period'
+    allows bursts of N and refills N per period; a scope without a rate is
+    not limited. All buckets are checked with one call to the store.
+    """
+    scope = None
+
+    def get_buckets(self, request):
+        user = getattr(request, 'user', None)
+        if user is not None and user.is_authenticated:
+            ident, default_scope = f'user:{user.pk}', 'user'
+        else:
+            ident, default_scope = f'ip:{self.get_ident(request)}', 'anon'
+
+        rates = api_settings.DEFAULT_THROTTLE_RATES
+        buckets = []
+        for scope in (default_scope, self.scope):
+            rate = rates.get(scope) if scope else None
+            if rate:
+                buckets.append((f'throttle:{scope}:{ident}', *parse_rate(rate)))
+        return buckets
+
+    def allow_request(self, request, view):
+        buckets = self.get_buckets(request)
+        self.wait_time = get_store().consume(buckets) if buckets else 0.0
+        return not self.wait_time
+
+    async def aallow_request(self, request, view):
+        buckets = self.get_buckets(request)
+        self.wait_time = await get_store().aconsume(buckets) if buckets else 0.0
+        return not self.wait_time
+
+    def wait(self):
+        return self.wait_time
+
+
+def scoped_throttles(scope):
+    """
+    throttle_classes for a view limited by `scope` on top of the user/anon
+    rate, e.g. `CreateCommentView.as_view(throttle_classes=scoped_throttles('comment'))`.
+    """
+    return [type(f'{scope.title()}TokenBucketThrottle', (TokenBucketThrottle,), {'scope': scope})]
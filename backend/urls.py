@@ -20,6 +20,7 @@ from rest_framework import permissions
 from drf_yasg.views import get_schema_view
 from drf_yasg import openapi
 from django.shortcuts import redirect
+from .views import ProfileListView, ProfileDownloadView, metrics
 
 def home(request):
     """Handle default request."""
@@ -43,6 +44,10 @@ urlpatterns = [
     path("", home, name="redirect_to_docs"),
     path('api/auth/', include('account.urls')),
     path('api/blog/', include('blog.urls')),
+    path('metrics/', metrics, name='metrics'),
+    # Dumps written by backend.profiling.ProfilingMiddleware, staff only
+    path('api/profiles/', ProfileListView.as_view(), name='profiles'),
+    path('api/profiles/<str:name>/', ProfileDownloadView.as_view(), name='profile_dump'),
     path('docs/', schema_view.with_ui('swagger', cache_timeout=0), name='schema-swagger-ui'),
     path('redoc/', schema_view.with_ui('redoc', cache_timeout=0), name='schema-redoc'),
 ]
@@ -0,0 +1,35 @@
+from django.http import FileResponse, Http404, HttpResponse
+from rest_framework import status
+from rest_framework.generics import GenericAPIView
+from rest_framework.permissions import IsAdminUser
+from rest_framework.response import Response
+
+from . import metrics as request_metrics
+from .profiling import DUMP_NAME, list_dumps, profile_dir
+
+
+def metrics(request):
+    """Prometheus scrape target, see backend.metrics. Restrict it at the proxy."""
+    if request_metrics.prometheus_client is None:
+        raise Http404
+    content, content_type = request_metrics.collect()
+    return HttpResponse(content, content_type=content_type)
+
+
+class ProfileListView(GenericAPIView):
+    """Requests sampled by ProfilingMiddleware, newest first."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request):
+        return Response({"profiles": list_dumps()}, status=status.HTTP_200_OK)
+
+
+class ProfileDownloadView(GenericAPIView):
+    """One cProfile dump, for pstats, snakeviz and the like."""
+    permission_classes = [IsAdminUser]
+
+    def get(self, request, name):
+        path = profile_dir() / f'{name}.prof'
+        if not DUMP_NAME.match(name) or not path.is_file():
+            raise Http404
+        return FileResponse(path.open('rb'), as_attachment=True, filename=path.name)
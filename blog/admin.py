@@ -1,3 +1,10 @@
 from django.contrib import admin
 
+from .models import DeletionJob
+
 # Register your models here.
+@admin.register(DeletionJob)
+class DeletionJobAdmin(admin.ModelAdmin):
+    list_display = ['id', 'kind', 'object_id', 'status', 'rows_deleted', 'attempts', 'run_after', 'finished_at']
+    list_filter = ['status', 'kind']
+    readonly_fields = ['created_at', 'updated_at']
@@ -1,6 +1,14 @@
 from django.apps import AppConfig
+from django.core import checks
+from django.db.models.signals import post_migrate
 
 
 class BlogConfig(AppConfig):
     default_auto_field = 'django.db.models.BigAutoField'
     name = 'blog'
+
+    def ready(self):
+        from .search import install_search_after_migrate
+        from .threads import check_max_depth
+        post_migrate.connect(install_search_after_migrate, sender=self)
+        checks.register(check_max_depth)
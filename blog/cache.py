@@ -0,0 +1,117 @@
+import asyncio
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import transaction
+
+# How long a serialized post stays cached, and how long a filler may hold the
+# fill lock before other readers stop waiting for it.
+POST_CACHE_TIMEOUT = getattr(settings, 'POST_CACHE_TIMEOUT', 300)
+POST_CACHE_LOCK_TIMEOUT = getattr(settings, 'POST_CACHE_LOCK_TIMEOUT', 5)
+POST_CACHE_POLL_INTERVAL = 0.01
+
+
+def post_cache_key(pk):
+    return f'blog:post:{pk}'
+
+
+def peek_cached_post(pk):
+    return cache.get(post_cache_key(pk))
+
+
+def get_cached_post(pk, fill):
+    """
+    Return the cached payload for post `pk`, calling `fill()` on a miss.
+
+    Concurrent misses on the same post are collapsed: only the reader that
+    takes the fill lock calls `fill()`, the others wait for its result.
+    Exceptions raised by `fill()` (e.g. Post.DoesNotExist) propagate.
+    """
+    key = post_cache_key(pk)
+    lock_key = f'{key}:lock'
+
+    data = cache.get(key)
+    if data is not None:
+        return data
+
+    if cache.add(lock_key, 1, POST_CACHE_LOCK_TIMEOUT):
+        try:
+            data = fill()
+            cache.set(key, data, POST_CACHE_TIMEOUT)
+        finally:
+            cache.delete(lock_key)
+        return data
+
+    # Somebody else is filling: wait for the entry or for the lock to go away.
+    deadline = time.monotonic() + POST_CACHE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        time.sleep(POST_CACHE_POLL_INTERVAL)
+        found = cache.get_many([key, lock_key])
+        if key in found:
+            return found[key]
+        if lock_key not in found:
+            break
+    # The filler failed (or the post does not exist): fill without caching.
+    return fill()
+
+
+async def apeek_cached_post(pk):
+    return await cache.aget(post_cache_key(pk))
+
+
+async def aget_cached_post(pk, fill):
+    """Async get_cached_post(); `fill` is a coroutine function."""
+    key = post_cache_key(pk)
+    lock_key = f'{key}:lock'
+
+    data = await cache.aget(key)
+    if data is not None:
+        return data
+
+    if await cache.aadd(lock_key, 1, POST_CACHE_LOCK_TIMEOUT):
+        try:
+            data = await fill()
+            await cache.aset(key, data, POST_CACHE_TIMEOUT)
+        finally:
+            await cache.adelete(lock_key)
+        return data
+
+    deadline = time.monotonic() + POST_CACHE_LOCK_TIMEOUT
+    while time.monotonic() < deadline:
+        await asyncio.sleep(POST_CACHE_POLL_INTERVAL)
+        found = await cache.aget_many([key, lock_key])
+        if key in found:
+            return found[key]
+        if lock_key not in found:
+            break
+    return await fill()
+
+
+def get_cached_posts(pks, fill_many):
+    """
+    Map each of `pks` to its cached payload, calling `fill_many(missing)`
+    once for all the misses; it returns {pk: payload} and may leave out
+    posts that do not exist. Misses are not collapsed like get_cached_post().
+    """
+    keys = {pk: post_cache_key(pk) for pk in pks}
+    found = cache.get_many(keys.values())
+    entries = {pk: found[key] for pk, key in keys.items() if key in found}
+    missing = [pk for pk in keys if pk not in entries]
+    if missing:
+        filled = fill_many(missing)
+        cache.set_many({keys[pk]: data for pk, data in filled.items()}, POST_CACHE_TIMEOUT)
+        entries.update(filled)
+    return entries
+
+
+def invalidate_posts(pks):
+    keys = [post_cache_key(pk) for pk in pks]
+    if keys:
+        # Drop the entries only once the write is committed; deleting earlier
+        # would let a concurrent reader re-cache the old row.
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def invalidate_post(pk):
+    invalidate_posts([pk])
@@ -0,0 +1,30 @@
+from collections import defaultdict
+
+from django.db.models import Count, F, OuterRef, Subquery
+from django.db.models.functions import Coalesce, Greatest
+
+from .models import Post, Comment
+
+
+# Counters include comments hidden while their account is pending deletion;
+# blog.deletion releases them as it removes the rows
+
+def actual_comment_count():
+    """Expression counting a post's comments, for annotate()/update() on Post."""
+    counts = Comment.all_objects.filter(post=OuterRef('pk')).order_by().values('post').annotate(n=Count('id')).values('n')
+    return Coalesce(Subquery(counts), 0)
+
+
+def adjust_comment_count(post_id, delta):
+    # A single atomic UPDATE, safe against concurrent comment writes; clamped
+    # at zero so a drifted counter cannot violate the unsigned column
+    Post.all_objects.filter(id=post_id).update(comment_count=Greatest(F('comment_count') + delta, 0))
+
+
+def release_comment_counts(counts):
+    # One UPDATE per distinct decrement rather than one per post
+    by_amount = defaultdict(list)
+    for post_id, n in counts.items():
+        by_amount[n].append(post_id)
+    for n, post_ids in by_amount.items():
+        Post.all_objects.filter(id__in=post_ids).update(comment_count=Greatest(F('comment_count') - n, 0))
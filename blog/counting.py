@@ -0,0 +1,102 @@
+import json
+from dataclasses import dataclass
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, connections, transaction
+
+# Counts up to this many rows are exact, and cost at most that many rows
+# read; past it, see count_rows()
+EXACT_COUNT_LIMIT = getattr(settings, 'PAGINATION_EXACT_COUNT_LIMIT', 1000)
+COUNT_CACHE_TIMEOUT = getattr(settings, 'PAGINATION_COUNT_CACHE_TIMEOUT', 300)
+
+
+@dataclass
+class RowCount:
+    value: int
+    exact: bool
+
+
+def comment_count_key(post_id):
+    """Cache key of the count of a post's comments, unfiltered."""
+    return f'blog:comments:count:{post_id}'
+
+
+def invalidate_counts(keys):
+    keys = list(keys)
+    if keys:
+        # Like invalidate_posts(): once the write is visible to the recount
+        transaction.on_commit(lambda: cache.delete_many(keys))
+
+
+def planner_estimate(queryset):
+    """
+    PostgreSQL's estimate of the rows `queryset` matches: the table's
+    reltuples when it is unfiltered, else the planner's row estimate from
+    EXPLAIN. None on other databases.
+    """
+    connection = connections[queryset.db]
+    if connection.vendor != 'postgresql':
+        return None
+    queryset = queryset.order_by().values('pk')
+    with connection.cursor() as cursor:
+        if not queryset.query.where:
+            cursor.execute('SELECT reltuples FROM pg_class WHERE oid = %s::regclass', [queryset.model._meta.db_table])
+            row = cursor.fetchone()
+            # -1 when the table was never analyzed
+            return int(row[0]) if row and row[0] >= 0 else None
+        sql, params = queryset.query.sql_with_params()
+        cursor.execute(f'EXPLAIN (FORMAT JSON) {sql}', params)
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return int(plan[0]['Plan']['Plan Rows'])
+
+
+def count_rows(queryset, key=None):
+    """
+    Count `queryset` for pagination, as a RowCount.
+
+    Up to EXACT_COUNT_LIMIT rows, an exact count that stops there. Past it,
+    querysets with a cache `key` are counted once and cached until a write
+    invalidates the key; others get the planner's estimate where there is
+    one (PostgreSQL), an exact count elsewhere.
+
+    Cached counts are reported exact: every path that adds or hides comments
+    (the comment views, blog.deletion) drops the key on commit, and the
+    count is refilled from the primary. Only comments written around them
+    (bulk loads, the shell) leave it off, for up to COUNT_CACHE_TIMEOUT.
+    """
+    bounded = queryset[:EXACT_COUNT_LIMIT + 1].count()
+    if bounded <= EXACT_COUNT_LIMIT:
+        return RowCount(bounded, True)
+    if key is not None:
+        value = cache.get(key)
+        if value is None:
+            # Shared by every client: counted on the primary, not a replica
+            value = queryset.using(DEFAULT_DB_ALIAS).count()
+            cache.set(key, value, COUNT_CACHE_TIMEOUT)
+        return RowCount(value, True)
+    estimate = planner_estimate(queryset)
+    if estimate is not None:
+        # Past the exact rows, however low the planner guesses
+        return RowCount(max(estimate, bounded), False)
+    return RowCount(queryset.count(), True)
+
+
+async def acount_rows(queryset, key=None):
+    """Async count_rows()."""
+    bounded = await queryset[:EXACT_COUNT_LIMIT + 1].acount()
+    if bounded <= EXACT_COUNT_LIMIT:
+        return RowCount(bounded, True)
+    if key is not None:
+        value = await cache.aget(key)
+        if value is None:
+            value = await queryset.using(DEFAULT_DB_ALIAS).acount()
+            await cache.aset(key, value, COUNT_CACHE_TIMEOUT)
+        return RowCount(value, True)
+    estimate = await sync_to_async(planner_estimate)(queryset)
+    if estimate is not None:
+        return RowCount(max(estimate, bounded), False)
+    return RowCount(await queryset.acount(), True)
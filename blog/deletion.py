@@ -0,0 +1,189 @@
+import logging
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connections, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from account.authentication import user_changed
+from account.models import CustomUser
+
+from .cache import invalidate_posts
+from .counters import release_comment_counts
+from .counting import comment_count_key, invalidate_counts
+from .feed import feed_removed
+from .models import Post, Comment, DeletionJob
+from .threads import subtrees
+
+logger = logging.getLogger(__name__)
+
+# One background thread per process runs the queue after a deletion commits;
+# more would only contend for the same rows
+executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='deletion')
+
+
+def batch_size():
+    return getattr(settings, 'DELETION_BATCH_SIZE', 500)
+
+
+def schedule_post_deletion(post):
+    """
+    Hide `post` at once and queue its rows for removal. Comments go in
+    batches of DELETION_BATCH_SIZE, so a busy thread never holds locks for
+    long.
+    """
+    with transaction.atomic():
+        Post.all_objects.filter(pk=post.pk).update(deleted_at=timezone.now())
+        job = DeletionJob.objects.create(kind=DeletionJob.POST, object_id=post.pk)
+        invalidate_posts([post.pk])
+        invalidate_counts([comment_count_key(post.pk)])
+        feed_removed([post.pk])
+        transaction.on_commit(start_worker)
+    return job
+
+
+def schedule_account_deletion(user):
+    """
+    Deactivate `user`, hide their posts and comments at once, and queue
+    the rows for removal. The account's tokens stop working on commit.
+    """
+    post_ids = list(Post.all_objects.filter(user_id=user.pk).values_list('id', flat=True))
+    # Hiding their comments changes the comment counts of these posts
+    commented = list(Comment.all_objects.filter(user_id=user.pk).values_list('post_id', flat=True).distinct())
+    with transaction.atomic():
+        CustomUser.objects.filter(pk=user.pk).update(deleted_at=timezone.now(), is_active=False)
+        job = DeletionJob.objects.create(kind=DeletionJob.ACCOUNT, object_id=user.pk)
+        user_changed(user.pk, is_active=False)
+        invalidate_posts(post_ids)
+        invalidate_counts(comment_count_key(post_id) for post_id in {*commented, *post_ids})
+        feed_removed(post_ids)
+        transaction.on_commit(start_worker)
+    return job
+
+
+def start_worker():
+    if getattr(settings, 'DELETION_IN_PROCESS', True):
+        executor.submit(run_worker)
+
+
+def run_worker():
+    try:
+        process_due_jobs()
+    except Exception:
+        logger.exception("Deletion worker failed")
+    finally:
+        # This thread's connections would otherwise stay open until it exits
+        connections.close_all()
+
+
+def claim_next_job():
+    """
+    The oldest job due, marked running, or None. Jobs running for longer
+    than DELETION_STALE_AFTER belong to a dead worker and are taken over.
+    """
+    now = timezone.now()
+    stale = now - timedelta(seconds=getattr(settings, 'DELETION_STALE_AFTER', 600))
+    due = DeletionJob.objects.filter(
+        Q(status=DeletionJob.PENDING, run_after__lte=now) | Q(status=DeletionJob.RUNNING, updated_at__lt=stale)
+    ).order_by('run_after', 'id')
+    for job in due[:10]:
+        # Only one worker's UPDATE matches the row it read
+        claimed = DeletionJob.objects.filter(pk=job.pk, status=job.status, updated_at=job.updated_at).update(
+            status=DeletionJob.RUNNING, attempts=F('attempts') + 1, updated_at=now,
+        )
+        if claimed:
+            job.refresh_from_db()
+            return job
+    return None
+
+
+def process_due_jobs(limit=None, size=None):
+    """Run due jobs until none is left, or `limit` ran. Returns how many ran."""
+    ran = 0
+    while limit is None or ran < limit:
+        job = claim_next_job()
+        if job is None:
+            break
+        run_job(job, size or batch_size())
+        ran += 1
+    return ran
+
+
+def run_job(job, size):
+    """
+    Delete the job's rows one batch per transaction, recording progress with
+    each, until nothing is left. On an error the job is retried later, with
+    exponential backoff, up to DELETION_MAX_ATTEMPTS times.
+    """
+    step = purge_post if job.kind == DeletionJob.POST else purge_account
+    try:
+        while True:
+            with transaction.atomic():
+                deleted, finished = step(job.object_id, size)
+                values = {'rows_deleted': F('rows_deleted') + deleted, 'updated_at': timezone.now()}
+                if finished:
+                    values.update(status=DeletionJob.DONE, finished_at=timezone.now(), last_error='')
+                DeletionJob.objects.filter(pk=job.pk).update(**values)
+            if finished:
+                return
+    except Exception as e:
+        logger.exception("Deleting %s %s failed", job.kind, job.object_id)
+        if job.attempts >= getattr(settings, 'DELETION_MAX_ATTEMPTS', 5):
+            values = {'status': DeletionJob.FAILED}
+        else:
+            delay = getattr(settings, 'DELETION_RETRY_DELAY', 60) * 2 ** (job.attempts - 1)
+            values = {'status': DeletionJob.PENDING, 'run_after': timezone.now() + timedelta(seconds=delay)}
+        DeletionJob.objects.filter(pk=job.pk).update(last_error=repr(e), updated_at=timezone.now(), **values)
+
+
+def delete_ids(queryset, size):
+    # The rows have no dependents left, so this is a single DELETE ... WHERE id IN
+    ids = list(queryset.values_list('id', flat=True)[:size])
+    if not ids:
+        return 0
+    return queryset.model.all_objects.filter(id__in=ids).delete()[0]
+
+
+def purge_post(post_id, size):
+    """One batch of the post's comments, then the post. Returns (rows deleted, finished)."""
+    # Deepest first, so no batch leaves a reply without its parent
+    deleted = delete_ids(Comment.all_objects.filter(post_id=post_id).order_by('-depth'), size)
+    if deleted:
+        return deleted, False
+    invalidate_counts([comment_count_key(post_id)])
+    return Post.all_objects.filter(pk=post_id).delete()[0], True
+
+
+def purge_account(user_id, size):
+    """
+    One batch of the account's rows: its comments on other people's posts
+    (with their replies, like DeleteCommentView), then the comments on its
+    posts, then its posts, then the account. Returns (rows deleted, finished).
+    """
+    threads = list(
+        Comment.all_objects.filter(user_id=user_id).exclude(post__user_id=user_id).values_list('post_id', 'path')[:size]
+    )
+    if threads:
+        # At most `size` rows of those threads, deepest first like purge_post();
+        # the account's own comments go last, so the next batch finds the rest
+        rows = list(
+            Comment.all_objects.filter(subtrees(threads)).order_by('-depth').values_list('id', 'post_id')[:size]
+        )
+        deleted = Comment.all_objects.filter(id__in=[pk for pk, _ in rows]).delete()[0]
+        # Those posts stay, so their counters drop with the comments
+        counts = Counter(post_id for _, post_id in rows)
+        release_comment_counts(counts)
+        invalidate_posts(list(counts))
+        # Replies by others were still counted until now
+        invalidate_counts(comment_count_key(post_id) for post_id in counts)
+        return deleted, False
+    deleted = delete_ids(Comment.all_objects.filter(post__user_id=user_id).order_by('-depth'), size)
+    if deleted:
+        return deleted, False
+    deleted = delete_ids(Post.all_objects.filter(user_id=user_id), size)
+    if deleted:
+        return deleted, False
+    return CustomUser.objects.filter(pk=user_id).delete()[0], True
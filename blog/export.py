@@ -0,0 +1,93 @@
+import csv
+import json
+
+from django.utils import timezone
+
+from .models import Post, Comment
+
+# Matches the DateTimeField format used by PostSerializer/CommentSerializer
+DATETIME_FORMAT = "%Y-%m-%d %H:%M:%S"
+
+POST_FIELDS = ['id', 'title', 'content', 'is_published', 'comment_count', 'created_at', 'updated_at']
+COMMENT_FIELDS = ['id', 'post_id', 'user__email', 'content', 'created_at', 'updated_at']
+CSV_HEADER = ['type', 'id', 'post_id', 'user', 'title', 'content', 'is_published', 'comment_count', 'created_at', 'updated_at']
+
+
+def format_row(row):
+    for field in ('created_at', 'updated_at'):
+        row[field] = timezone.localtime(row[field]).strftime(DATETIME_FORMAT)
+    if 'user__email' in row:
+        row['user'] = row.pop('user__email')
+    return row
+
+
+def iter_export(user, with_comments, chunk_size):
+    """
+    Yield (post, comments) for every post of `user`, in id order.
+
+    Posts and comments are each read through one server-side cursor and
+    merged on post id, so memory does not grow with the number of rows;
+    `comments` is a lazy iterator over that post's comments (empty if
+    `with_comments` is false) and must be consumed before the next post.
+    """
+    posts = Post.objects.filter(user=user).order_by('id').values(*POST_FIELDS).iterator(chunk_size=chunk_size)
+    if not with_comments:
+        for post in posts:
+            yield format_row(post), iter(())
+        return
+
+    comments = (
+        Comment.objects.filter(post__user=user)
+        .order_by('post_id', 'id')
+        .values(*COMMENT_FIELDS)
+        .iterator(chunk_size=chunk_size)
+    )
+    pending = [next(comments, None)]
+
+    def comments_of(post_id):
+        while pending[0] is not None and pending[0]['post_id'] == post_id:
+            comment = pending[0]
+            pending[0] = next(comments, None)
+            yield format_row(comment)
+
+    for post in posts:
+        # Skip comments on posts created after the posts cursor was opened
+        while pending[0] is not None and pending[0]['post_id'] < post['id']:
+            pending[0] = next(comments, None)
+        yield format_row(post), comments_of(post['id'])
+
+
+def ndjson_lines(rows):
+    for post, comments in rows:
+        line = json.dumps(post)
+        comment = next(comments, None)
+        if comment is None:
+            yield line + '\n'
+            continue
+        # Stream the comments array piece by piece rather than building it
+        yield line[:-1] + ', "comments": [' + json.dumps(comment)
+        for comment in comments:
+            yield ', ' + json.dumps(comment)
+        yield ']}\n'
+
+
+class Echo:
+    """File-like object whose write() just returns the line, for csv.writer."""
+
+    def write(self, value):
+        return value
+
+
+def csv_lines(rows):
+    writer = csv.writer(Echo())
+    yield writer.writerow(CSV_HEADER)
+    for post, comments in rows:
+        yield writer.writerow(
+            ['post', post['id'], '', '', post['title'], post['content'], post['is_published'],
+             post['comment_count'], post['created_at'], post['updated_at']]
+        )
+        for comment in comments:
+            yield writer.writerow(
+                ['comment', comment['id'], comment['post_id'], comment['user'], '', comment['content'], '', '',
+                 comment['created_at'], comment['updated_at']]
+            )
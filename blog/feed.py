@@ -0,0 +1,165 @@
+import bisect
+import time
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Q
+
+from .models import Post
+
+# The newest FEED_SIZE published posts are kept in the cache as
+# (created_at in microseconds, id) pairs, newest first. Pages past them are
+# read from the database. The writers keep the timeline in step, so it only
+# has to be rebuilt when it expires or is evicted.
+FEED_KEY = 'blog:feed'
+FEED_SIZE = getattr(settings, 'FEED_SIZE', 1000)
+FEED_CACHE_TIMEOUT = getattr(settings, 'FEED_CACHE_TIMEOUT', 3600)
+FEED_LOCK_TIMEOUT = getattr(settings, 'FEED_LOCK_TIMEOUT', 5)
+FEED_POLL_INTERVAL = 0.01
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def position(created_at, pk):
+    # Integer microseconds, so positions convert back to datetimes exactly
+    return [(created_at - EPOCH) // timedelta(microseconds=1), pk]
+
+
+def position_datetime(micros):
+    return EPOCH + timedelta(microseconds=micros)
+
+
+def newest_first(entry):
+    return (-entry[0], -entry[1])
+
+
+class Timeline:
+    """
+    The cached entries, and whether they are all the published posts
+    (`complete`) or only the newest ones.
+    """
+
+    def __init__(self, entries, complete):
+        self.entries = entries
+        self.complete = complete
+
+    def add(self, entry):
+        self.remove([entry[1]])
+        # Older than everything kept, when more exist: outside the timeline
+        if not self.complete and (not self.entries or newest_first(entry) > newest_first(self.entries[-1])):
+            return
+        bisect.insort(self.entries, entry, key=newest_first)
+        if len(self.entries) > FEED_SIZE:
+            del self.entries[FEED_SIZE:]
+            self.complete = False
+
+    def remove(self, pks):
+        pks = set(pks)
+        self.entries = [entry for entry in self.entries if entry[1] not in pks]
+
+    def dump(self):
+        return {'entries': self.entries, 'complete': self.complete}
+
+
+def published_positions(limit, before=None, using=None):
+    posts = Post.objects.using(using).filter(is_published=True)
+    if before is not None:
+        micros, pk = before
+        created_at = position_datetime(micros)
+        posts = posts.filter(Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk))
+    rows = posts.order_by('-created_at', '-id').values_list('created_at', 'id')[:limit]
+    return [position(created_at, pk) for created_at, pk in rows]
+
+
+def acquire_lock():
+    """Take the timeline lock, waiting up to FEED_LOCK_TIMEOUT; False if it stayed taken."""
+    lock_key = f'{FEED_KEY}:lock'
+    deadline = time.monotonic() + FEED_LOCK_TIMEOUT
+    while not cache.add(lock_key, 1, FEED_LOCK_TIMEOUT):
+        if time.monotonic() >= deadline:
+            return False
+        time.sleep(FEED_POLL_INTERVAL)
+    return True
+
+
+def release_lock():
+    cache.delete(f'{FEED_KEY}:lock')
+
+
+def get_timeline():
+    data = cache.get(FEED_KEY)
+    if data is not None:
+        return Timeline(data['entries'], data['complete'])
+    # Rebuilt under the lock, so an edit committed meanwhile waits and is
+    # applied on top instead of being overwritten by an older read
+    locked = cache.add(f'{FEED_KEY}:lock', 1, FEED_LOCK_TIMEOUT)
+    try:
+        # From the primary, like the post cache (see blog.views.cache_entry)
+        entries = published_positions(FEED_SIZE + 1, using=DEFAULT_DB_ALIAS)
+        timeline = Timeline(entries[:FEED_SIZE], len(entries) <= FEED_SIZE)
+        if locked:
+            cache.set(FEED_KEY, timeline.dump(), FEED_CACHE_TIMEOUT)
+    finally:
+        if locked:
+            release_lock()
+    return timeline
+
+
+def edit_timeline(edit):
+    def apply():
+        if not acquire_lock():
+            # Cannot edit safely: drop the timeline, the next read rebuilds it
+            cache.delete(FEED_KEY)
+            return
+        try:
+            data = cache.get(FEED_KEY)
+            if data is None:
+                return
+            timeline = Timeline(data['entries'], data['complete'])
+            edit(timeline)
+            cache.set(FEED_KEY, timeline.dump(), FEED_CACHE_TIMEOUT)
+        finally:
+            release_lock()
+
+    # Like invalidate_posts(): only what is committed goes in
+    transaction.on_commit(apply)
+
+
+def feed_changed(posts):
+    """Add the published `posts` to the timeline and drop the others, on commit."""
+    entries = [position(post.created_at, post.pk) for post in posts if post.is_published]
+    hidden = [post.pk for post in posts if not post.is_published]
+
+    def edit(timeline):
+        timeline.remove(hidden)
+        for entry in entries:
+            timeline.add(entry)
+
+    edit_timeline(edit)
+
+
+def feed_removed(pks):
+    """Drop posts `pks` from the timeline, on commit."""
+    pks = list(pks)
+    if pks:
+        edit_timeline(lambda timeline: timeline.remove(pks))
+
+
+def feed_page(size, before=None):
+    """
+    Up to `size` (created_at in microseconds, id) positions of published
+    posts after `before`, newest first, and whether more follow.
+    """
+    timeline = get_timeline()
+    entries = timeline.entries
+    start = 0
+    if before is not None:
+        start = bisect.bisect_right(entries, newest_first(before), key=newest_first)
+    page = entries[start:start + size + 1]
+    if len(page) <= size and not timeline.complete:
+        # Past the cached timeline: read the rest from the database
+        after = page[-1] if page else before
+        page += published_positions(size + 1 - len(page), after)
+    return page[:size], len(page) > size
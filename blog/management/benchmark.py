@@ -0,0 +1,41 @@
+import statistics
+
+from django.conf import settings
+from django.test import override_settings
+from rest_framework.test import APIClient
+from account.tokens import UserAccessToken
+
+
+class Rollback(Exception):
+    """Raised inside transaction.atomic() to throw away benchmark data."""
+
+
+def api_client(user=None):
+    # DEBUG's default ALLOWED_HOSTS accepts localhost but not 'testserver'.
+    client = APIClient(SERVER_NAME='localhost')
+    if user is not None:
+        # A real token, so authentication is part of what gets measured.
+        client.credentials(HTTP_AUTHORIZATION=f'Bearer {UserAccessToken.for_user(user)}')
+    return client
+
+
+def without_throttling():
+    """Lift every throttle rate, so load tests measure the views themselves."""
+    return override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': {}})
+
+
+def percentile(sorted_values, fraction):
+    if not sorted_values:
+        return 0.0
+    index = min(int(len(sorted_values) * fraction), len(sorted_values) - 1)
+    return sorted_values[index]
+
+
+def summarize(timings_ms):
+    timings = sorted(timings_ms)
+    return {
+        'p50': statistics.median(timings) if timings else 0.0,
+        'p95': percentile(timings, 0.95),
+        'p99': percentile(timings, 0.99),
+        'max': timings[-1] if timings else 0.0,
+    }
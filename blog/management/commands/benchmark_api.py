@@ -0,0 +1,298 @@
+import json
+import platform
+import subprocess
+import time
+from collections import Counter
+from dataclasses import dataclass
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.urls import reverse
+from django.utils import timezone
+
+from account import urls as account_urls
+from account.models import CustomUser
+from blog import urls as blog_urls
+from blog.management.benchmark import Rollback, api_client, summarize, without_throttling
+from blog.management.dataset import PASSWORD, generate_dataset
+from blog.models import Post, Comment
+
+
+@dataclass
+class Call:
+    method: str
+    url: str
+    data: object = None
+    user: object = None
+    expect: int = 200
+
+
+class Routes:
+    """
+    One method per named route in blog.urls and account.urls, returning the
+    Call to make for request number `i`. Routes that consume what they touch
+    (deletes, registration) get a fresh target for every request.
+    """
+
+    def __init__(self, dataset, calls):
+        self.author = dataset.author
+        self.post = dataset.hot_post
+        self.own_post = Post.objects.filter(user=self.author).order_by('-created_at').values_list('id', flat=True)[0]
+        self.comment = Comment.objects.create(user=self.author, post=self.post, content='Benchmark comment')
+        # A thread to read: ten replies, each with two of its own
+        replies = Comment.objects.bulk_create(
+            [Comment(user=self.author, post=self.post, parent=self.comment, content=f'Reply {i}') for i in range(10)]
+        )
+        Comment.objects.bulk_create(
+            [Comment(user=self.author, post=self.post, parent=reply, content='Nested reply') for reply in replies * 2]
+        )
+        # A user of its own, so changing the password does not affect login
+        self.password_user = CustomUser.objects.create_user(
+            email='bench-password@example.com', password=PASSWORD, first_name='Bench', last_name='Password'
+        )
+        self.doomed_posts = [
+            post.id for post in Post.objects.bulk_create(
+                [Post(user=self.author, title=f'Doomed {i}', content='Body') for i in range(calls)]
+            )
+        ]
+        self.doomed_comments = [
+            comment.id for comment in Comment.objects.bulk_create(
+                [Comment(user=self.author, post=self.post, content=f'Doomed {i}') for i in range(calls)]
+            )
+        ]
+        self.doomed_users = CustomUser.objects.bulk_create(
+            [CustomUser(email=f'bench-doomed{i}@example.com', first_name='Bench', last_name=str(i)) for i in range(calls)]
+        )
+
+    def __call__(self, name, i):
+        return getattr(self, name)(i)
+
+    # blog.urls
+
+    def create_post(self, i):
+        return Call('post', reverse('create_post'), {'title': f'Load {i}', 'content': 'Body ' * 50}, self.author, 201)
+
+    def create_posts_batch(self, i):
+        posts = [{'title': f'Load {i}.{n}', 'content': 'Body ' * 50} for n in range(20)]
+        return Call('post', reverse('create_posts_batch'), posts, self.author, 201)
+
+    def list_posts(self, i):
+        return Call('get', reverse('list_posts'), user=self.author)
+
+    def feed(self, i):
+        return Call('get', reverse('feed'))
+
+    def search_posts(self, i):
+        return Call('get', f"{reverse('search_posts')}?q=django cache", user=self.author)
+
+    def export_posts(self, i):
+        return Call('get', reverse('export_posts'), user=self.author)
+
+    def view_post(self, i):
+        return Call('get', reverse('view_post', args=[self.post.id]))
+
+    def view_posts(self, i):
+        ids = ','.join(str(pk) for pk in [self.post.id, self.own_post, *self.doomed_posts[:18]])
+        return Call('get', f"{reverse('view_posts')}?ids={ids}")
+
+    def update_post(self, i):
+        return Call('put', reverse('update_post', args=[self.own_post]), {'title': f'Updated {i}'}, self.author)
+
+    def delete_post(self, i):
+        return Call('delete', reverse('delete_post', args=[self.doomed_posts[i]]), user=self.author)
+
+    def create_comment(self, i):
+        return Call('post', reverse('create_comment', args=[self.post.id]), {'content': f'Load {i}'}, self.author, 201)
+
+    def list_comments(self, i):
+        return Call('get', reverse('list_comments', args=[self.post.id]), user=self.author)
+
+    def list_comment_threads(self, i):
+        return Call('get', reverse('list_comment_threads', args=[self.post.id]))
+
+    def view_comment_thread(self, i):
+        return Call('get', reverse('view_comment_thread', args=[self.comment.id]))
+
+    def update_comment(self, i):
+        return Call('put', reverse('update_comment', args=[self.comment.id]), {'content': f'Updated {i}'}, self.author)
+
+    def delete_comment(self, i):
+        return Call('delete', reverse('delete_comment', args=[self.doomed_comments[i]]), user=self.author)
+
+    def list_posts_async(self, i):
+        return Call('get', reverse('list_posts_async'), user=self.author)
+
+    def view_post_async(self, i):
+        return Call('get', reverse('view_post_async', args=[self.post.id]))
+
+    def list_comments_async(self, i):
+        return Call('get', reverse('list_comments_async', args=[self.post.id]), user=self.author)
+
+    # account.urls
+
+    def login(self, i):
+        return Call('post', reverse('login'), {'email': self.author.email, 'password': PASSWORD})
+
+    def register(self, i):
+        data = {'email': f'bench-register{i}@example.com', 'first_name': 'Bench', 'last_name': 'Register',
+                'password': PASSWORD}
+        return Call('post', reverse('register'), data, expect=201)
+
+    def profile(self, i):
+        return Call('get', reverse('profile'), user=self.author)
+
+    def profile_async(self, i):
+        return Call('get', reverse('profile_async'), user=self.author)
+
+    def update_profile(self, i):
+        return Call('put', reverse('update_profile'), {'first_name': f'Bench{i}'}, self.author)
+
+    def change_password(self, i):
+        # Back and forth between two passwords
+        current, new = (PASSWORD, f'{PASSWORD}-next') if i % 2 == 0 else (f'{PASSWORD}-next', PASSWORD)
+        data = {'current_password': current, 'new_password': new, 'confirm_password': new}
+        return Call('put', reverse('change_password'), data, self.password_user)
+
+    def delete_account(self, i):
+        return Call('delete', reverse('delete_account'), user=self.doomed_users[i], expect=204)
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive every route in blog.urls and account.urls in-process against a generated "
+        "dataset, and report throughput, p50/p95/p99 latency and queries per request as JSON."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=100)
+        parser.add_argument('--posts', type=int, default=5000)
+        parser.add_argument('--comments', type=int, default=25000)
+        parser.add_argument('--requests', type=int, default=100, help="Timed requests per route.")
+        parser.add_argument('--warmup', type=int, default=3, help="Untimed requests per route first.")
+        parser.add_argument('--routes', nargs='+', metavar='NAME', help="Only these routes (URL names).")
+        parser.add_argument('--output', help="Write the JSON report to this file.")
+        parser.add_argument('--compare', metavar='REPORT', help="A previous JSON report to show deltas against.")
+        parser.add_argument('--json', action='store_true', help="Print the JSON report instead of the table.")
+
+    @without_throttling()
+    def handle(self, *args, **options):
+        if options['users'] < 1 or options['posts'] < 1:
+            raise CommandError("The dataset needs at least one user and one post.")
+        names = [pattern.name for pattern in blog_urls.urlpatterns + account_urls.urlpatterns]
+        missing = [name for name in names if not hasattr(Routes, name)]
+        if missing:
+            raise CommandError(f"No benchmark request for route(s): {', '.join(missing)}")
+        if options['routes']:
+            unknown = set(options['routes']) - set(names)
+            if unknown:
+                raise CommandError(f"Unknown route(s): {', '.join(sorted(unknown))}")
+            names = [name for name in names if name in options['routes']]
+        baseline = self.load(options['compare']) if options['compare'] else None
+
+        try:
+            with transaction.atomic():
+                dataset = generate_dataset(options['users'], options['posts'], options['comments'], prefix='bench')
+                routes = Routes(dataset, options['warmup'] + options['requests'])
+                results = {name: self.run_route(routes, name, options) for name in names}
+                raise Rollback
+        except Rollback:
+            pass
+
+        report = {
+            'commit': self.commit(),
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'dataset': {'users': options['users'], 'posts': options['posts'], 'comments': options['comments']},
+            'requests': options['requests'],
+            'routes': results,
+        }
+        if options['output']:
+            with open(options['output'], 'w') as f:
+                json.dump(report, f, indent=2)
+        if options['json']:
+            self.stdout.write(json.dumps(report, indent=2))
+        else:
+            self.print_table(results, baseline)
+
+        failed = [name for name, result in results.items() if result['unexpected']]
+        if failed:
+            raise CommandError(f"Unexpected status codes from: {', '.join(failed)}")
+
+    def run_route(self, routes, name, options):
+        clients = {}
+        queries = [0]
+
+        def count_queries(execute, sql, params, many, context):
+            queries[0] += 1
+            return execute(sql, params, many, context)
+
+        timings, statuses, unexpected = [], Counter(), Counter()
+        with connection.execute_wrapper(count_queries):
+            for i in range(options['warmup'] + options['requests']):
+                call = routes(name, i)
+                key = call.user.pk if call.user else None
+                if key not in clients:
+                    clients[key] = api_client(call.user)
+                if i == options['warmup']:
+                    queries[0] = 0
+                started = time.perf_counter()
+                if call.method == 'get':
+                    response = clients[key].get(call.url)
+                else:
+                    response = getattr(clients[key], call.method)(call.url, call.data, format='json')
+                if response.streaming:
+                    b''.join(response.streaming_content)
+                elapsed = time.perf_counter() - started
+                if i < options['warmup']:
+                    continue
+                timings.append(elapsed * 1000)
+                statuses[response.status_code] += 1
+                if response.status_code != call.expect:
+                    unexpected[response.status_code] += 1
+
+        total = sum(timings) / 1000
+        return {
+            'requests': len(timings),
+            'throughput': len(timings) / total if total else 0.0,
+            **summarize(timings),
+            'queries': queries[0] / len(timings) if timings else 0.0,
+            'statuses': {str(code): count for code, count in sorted(statuses.items())},
+            'unexpected': {str(code): count for code, count in sorted(unexpected.items())},
+        }
+
+    def print_table(self, results, baseline):
+        header = f"{'route':<22} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'queries':>8}"
+        if baseline:
+            header += f" {'p50 vs base':>12} {'queries vs base':>16}"
+        self.stdout.write(self.style.MIGRATE_HEADING(header))
+        for name, result in results.items():
+            line = (
+                f"{name:<22} {result['throughput']:9.1f} {result['p50']:8.2f} {result['p95']:8.2f} "
+                f"{result['p99']:8.2f} {result['queries']:8.1f}"
+            )
+            before = (baseline or {}).get('routes', {}).get(name)
+            if before:
+                change = (result['p50'] - before['p50']) / before['p50'] * 100 if before['p50'] else 0.0
+                line += f" {change:+11.0f}% {result['queries'] - before['queries']:+16.1f}"
+            elif baseline:
+                line += f" {'new':>12}"
+            style = self.style.ERROR if result['unexpected'] else (lambda text: text)
+            self.stdout.write(line, style_func=style)
+
+    def load(self, path):
+        try:
+            with open(path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            raise CommandError(f"Could not read {path}: {e}")
+
+    def commit(self):
+        try:
+            return subprocess.run(
+                ['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True, check=True
+            ).stdout.strip()
+        except (OSError, subprocess.CalledProcessError):
+            return None
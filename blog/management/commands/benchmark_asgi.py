@@ -0,0 +1,110 @@
+import asyncio
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand
+from django.db import connections
+from django.test import AsyncClient, Client, override_settings
+from django.urls import reverse
+
+from account.models import CustomUser
+from account.tokens import UserAccessToken
+from blog.management.benchmark import summarize, without_throttling
+from blog.models import Post, Comment
+
+
+class Command(BaseCommand):
+    help = (
+        "Load-test the read endpoints in-process: sync views through the WSGI handler, "
+        "and sync and async views through the ASGI handler, reporting throughput and latency."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500, help="Requests per endpoint and mode.")
+        parser.add_argument('--concurrency', type=int, default=32, help="Threads (WSGI) or tasks (ASGI) in flight.")
+        parser.add_argument('--posts', type=int, default=200)
+        parser.add_argument('--comments', type=int, default=1000)
+
+    @override_settings(ALLOWED_HOSTS=['testserver'])
+    @without_throttling()
+    def handle(self, *args, **options):
+        # The clients run on other threads/connections, so the data is
+        # committed and removed again at the end instead of rolled back.
+        user, post = self.seed(options)
+        try:
+            headers = {'Authorization': f'Bearer {UserAccessToken.for_user(user)}'}
+            endpoints = [
+                ('list_posts', reverse('list_posts'), reverse('list_posts_async')),
+                ('view_post', reverse('view_post', args=[post.id]), reverse('view_post_async', args=[post.id])),
+                ('list_comments', reverse('list_comments', args=[post.id]), reverse('list_comments_async', args=[post.id])),
+                ('profile', reverse('profile'), reverse('profile_async')),
+            ]
+            for name, sync_url, async_url in endpoints:
+                self.stdout.write(self.style.MIGRATE_HEADING(f"\n{name}"))
+                self.report('wsgi sync ', *self.run_wsgi(sync_url, headers, options))
+                self.report('asgi sync ', *asyncio.run(self.run_asgi(sync_url, headers, options)))
+                self.report('asgi async', *asyncio.run(self.run_asgi(async_url, headers, options)))
+        finally:
+            user.delete()
+
+    def seed(self, options):
+        user = CustomUser.objects.create_user(
+            email=f'bench-{uuid.uuid4().hex[:8]}@example.com', password='benchmark', first_name='Bench', last_name='ASGI'
+        )
+        posts = Post.objects.bulk_create([
+            Post(user=user, title=f'Post {i}', content='Lorem ipsum dolor sit amet. ' * 20, is_published=True)
+            for i in range(options['posts'])
+        ])
+        Comment.objects.bulk_create(
+            [Comment(user=user, post=posts[0], content='Nice post!') for _ in range(options['comments'])],
+            batch_size=500,
+        )
+        return user, posts[0]
+
+    def run_wsgi(self, url, headers, options):
+        def worker(count):
+            client = Client(headers=headers)
+            timings = []
+            try:
+                for _ in range(count):
+                    started = time.perf_counter()
+                    response = client.get(url)
+                    timings.append((time.perf_counter() - started) * 1000)
+                    assert response.status_code == 200, response.status_code
+            finally:
+                connections.close_all()
+            return timings
+
+        counts = self.split(options['requests'], options['concurrency'])
+        started = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=len(counts)) as pool:
+            timings = [t for result in pool.map(worker, counts) for t in result]
+        return timings, time.perf_counter() - started
+
+    async def run_asgi(self, url, headers, options):
+        async def worker(count):
+            client = AsyncClient()
+            timings = []
+            for _ in range(count):
+                started = time.perf_counter()
+                response = await client.get(url, headers=headers)
+                timings.append((time.perf_counter() - started) * 1000)
+                assert response.status_code == 200, response.status_code
+            return timings
+
+        counts = self.split(options['requests'], options['concurrency'])
+        started = time.perf_counter()
+        results = await asyncio.gather(*(worker(count) for count in counts))
+        return [t for result in results for t in result], time.perf_counter() - started
+
+    def split(self, total, workers):
+        workers = max(1, min(workers, total))
+        return [total // workers + (1 if i < total % workers else 0) for i in range(workers)]
+
+    def report(self, mode, timings, elapsed):
+        stats = summarize(timings)
+        self.stdout.write(
+            f"  {mode}  {len(timings) / elapsed:8.0f} req/s  "
+            f"p50={stats['p50']:.2f}ms p99={stats['p99']:.2f}ms max={stats['max']:.2f}ms"
+        )
@@ -0,0 +1,101 @@
+import io
+import time
+import tracemalloc
+from collections import OrderedDict
+from datetime import timedelta
+from decimal import Decimal
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+
+from backend.parsers import FastJSONParser
+from backend.renderers import FastJSONRenderer, orjson
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the stdlib JSON renderer/parser with the orjson-backed ones on list-page "
+        "sized payloads: time per call and memory allocated."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=100, help="Posts per payload (max_page_size is 100).")
+        parser.add_argument('--repeat', type=int, default=500)
+
+    def handle(self, *args, **options):
+        if orjson is None:
+            self.stdout.write(self.style.WARNING("orjson is not installed, FastJSONRenderer falls back to the stdlib"))
+        size, repeat = options['page_size'], options['repeat']
+
+        page = self.list_page(size)
+        raw = self.list_page(size, formatted=False)
+        body = JSONRenderer().render([{'title': post['title'], 'content': post['content']} for post in page['results']])
+
+        for name, data in (('list page', page), ('list page, raw datetimes and decimals', raw)):
+            expected = JSONRenderer().render(data)
+            if FastJSONRenderer().render(data) != expected:
+                raise CommandError(f"{name}: FastJSONRenderer output differs")
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\nrender {name} ({len(expected):,} bytes)"))
+            self.compare(
+                lambda renderer: renderer.render(data),
+                (('JSONRenderer', JSONRenderer()), ('FastJSONRenderer', FastJSONRenderer())),
+                repeat,
+            )
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\nparse batch create body ({len(body):,} bytes)"))
+        self.compare(
+            lambda parser: parser.parse(io.BytesIO(body), 'application/json', {}),
+            (('JSONParser', JSONParser()), ('FastJSONParser', FastJSONParser())),
+            repeat,
+        )
+
+    def list_page(self, size, formatted=True):
+        # Shaped like ListPostView's response; `formatted` as the serializers
+        # emit it, otherwise with datetime and Decimal values for the encoder
+        now = timezone.now()
+        results = []
+        for i in range(size):
+            created_at = now - timedelta(minutes=i)
+            results.append({
+                'id': size - i,
+                'title': f'Post number {i}',
+                'content': 'Lorem ipsum dolor sit amet, consectetur adipiscing elit. ' * 8,
+                'is_published': i % 3 != 0,
+                'comment_count': i * 7 % 50,
+                'created_at': created_at.strftime("%Y-%m-%d %H:%M:%S") if formatted else created_at,
+                'updated_at': now.strftime("%Y-%m-%d %H:%M:%S") if formatted else now,
+                **({} if formatted else {'score': Decimal(i) / 7}),
+            })
+        return OrderedDict([
+            ('count', 1000),
+            ('next', 'http://localhost:8000/api/blog/list/?page=3&page_size=100'),
+            ('previous', 'http://localhost:8000/api/blog/list/?page_size=100'),
+            ('results', results),
+        ])
+
+    def compare(self, call, implementations, repeat):
+        results = {}
+        for label, implementation in implementations:
+            call(implementation)
+            started = time.perf_counter()
+            for _ in range(repeat):
+                call(implementation)
+            elapsed = (time.perf_counter() - started) / repeat
+
+            tracemalloc.start()
+            before = tracemalloc.take_snapshot()
+            call(implementation)
+            after = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            allocated = sum(stat.size_diff for stat in after.compare_to(before, 'filename') if stat.size_diff > 0)
+
+            results[label] = elapsed
+            self.stdout.write(
+                f"  {label:<17} {elapsed * 1e6:9.1f}us per call  peak {peak / 1024:8.1f}KiB  "
+                f"retained {allocated / 1024:6.1f}KiB"
+            )
+        (slow, slow_time), (fast, fast_time) = results.items()
+        self.stdout.write(f"  {fast} is {slow_time / fast_time:.1f}x faster than {slow}")
@@ -0,0 +1,107 @@
+import os
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import override_settings
+from django.urls import reverse
+
+from account.hashing import executor as password_hashing
+from account.models import CustomUser
+from blog.management.benchmark import api_client, summarize, without_throttling
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure login throughput (logins/sec, total and per core) through the bounded "
+        "password hashing pool, for one or more password hashers."
+    )
+
+    password = 'benchmark-password'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--logins', type=int, default=200, help="Logins per hasher.")
+        parser.add_argument('--concurrency', type=int, default=2 * (os.cpu_count() or 1), help="Concurrent clients.")
+        parser.add_argument(
+            '--hasher', action='append', dest='hashers',
+            help="Hasher algorithm to measure (e.g. pbkdf2_sha256, scrypt); repeatable. "
+                 "Defaults to the preferred hasher.",
+        )
+
+    @without_throttling()
+    def handle(self, *args, **options):
+        algorithms = options['hashers'] or [get_hasher().algorithm]
+        cores = os.cpu_count() or 1
+        stats = password_hashing.stats()
+        self.stdout.write(
+            f"{cores} cores, {stats['workers']} hashing workers, "
+            f"{options['concurrency']} concurrent clients, {options['logins']} logins per hasher"
+        )
+        for algorithm in algorithms:
+            with override_settings(PASSWORD_HASHERS=self.hashers_preferring(algorithm)):
+                self.measure(algorithm, cores, options)
+
+    def hashers_preferring(self, algorithm):
+        # Make `algorithm` the preferred hasher so logins do not rehash
+        for path in settings.PASSWORD_HASHERS:
+            with override_settings(PASSWORD_HASHERS=[path]):
+                if get_hasher().algorithm != algorithm:
+                    continue
+                try:
+                    make_password(self.password)
+                except ValueError as exc:
+                    raise CommandError(f"{algorithm}: {exc}")
+            return [path] + [other for other in settings.PASSWORD_HASHERS if other != path]
+        raise CommandError(f"{algorithm} is not in PASSWORD_HASHERS")
+
+    def measure(self, algorithm, cores, options):
+        # Clients run on other threads and connections, so the user is
+        # committed and deleted again at the end instead of rolled back.
+        user = CustomUser.objects.create_user(
+            email=f'bench-{uuid.uuid4().hex[:8]}@example.com', password=self.password,
+            first_name='Bench', last_name='Login',
+        )
+        credentials = {'email': user.email, 'password': self.password}
+
+        def worker(count):
+            client = api_client()
+            timings = []
+            try:
+                for _ in range(count):
+                    started = time.perf_counter()
+                    response = client.post(reverse('login'), credentials)
+                    timings.append((time.perf_counter() - started) * 1000)
+                    assert response.status_code == 200, response.status_code
+            finally:
+                connections.close_all()
+            return timings
+
+        workers = max(1, min(options['concurrency'], options['logins']))
+        counts = [options['logins'] // workers + (1 if i < options['logins'] % workers else 0) for i in range(workers)]
+        before = password_hashing.stats()
+        started = time.perf_counter()
+        try:
+            with ThreadPoolExecutor(max_workers=workers) as pool:
+                timings = [t for result in pool.map(worker, counts) for t in result]
+        finally:
+            user.delete()
+        elapsed = time.perf_counter() - started
+        after = password_hashing.stats()
+
+        hashes = after['completed'] - before['completed']
+        rate = len(timings) / elapsed
+        latency = summarize(timings)
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n{algorithm}"))
+        self.stdout.write(f"  {rate:8.1f} logins/s  {rate / cores:6.1f} logins/s/core")
+        self.stdout.write(
+            f"  latency p50={latency['p50']:.1f}ms p99={latency['p99']:.1f}ms max={latency['max']:.1f}ms"
+        )
+        self.stdout.write(
+            f"  hashing: avg hash {1000 * (after['hash_seconds'] - before['hash_seconds']) / max(hashes, 1):.1f}ms, "
+            f"avg queue wait {1000 * (after['wait_seconds'] - before['wait_seconds']) / max(hashes, 1):.1f}ms, "
+            f"max queue depth {after['max_queue_depth']}, rejected {after['rejected'] - before['rejected']}"
+        )
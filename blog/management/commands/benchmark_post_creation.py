@@ -0,0 +1,49 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.urls import reverse
+
+from account.models import CustomUser
+from blog.management.benchmark import Rollback, api_client, without_throttling
+
+
+class Command(BaseCommand):
+    help = "Compare rows/sec of the single-post and batch post creation endpoints."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--posts', type=int, default=2000, help="Posts created through each path.")
+        parser.add_argument('--batch-size', type=int, default=500, help="Posts per batch request.")
+
+    @without_throttling()
+    def handle(self, *args, **options):
+        total = options['posts']
+        batch_size = options['batch_size']
+        try:
+            with transaction.atomic():
+                user = CustomUser.objects.create_user(
+                    email='bench-create@example.com', password='benchmark', first_name='Bench', last_name='Create'
+                )
+                client = api_client(user)
+                posts = [{'title': f'Post {i}', 'content': 'Lorem ipsum dolor sit amet. ' * 20} for i in range(total)]
+
+                started = time.perf_counter()
+                for post in posts:
+                    response = client.post(reverse('create_post'), post, format='json')
+                    assert response.status_code == 201, response.data
+                single = time.perf_counter() - started
+
+                started = time.perf_counter()
+                for start in range(0, total, batch_size):
+                    response = client.post(reverse('create_posts_batch'), posts[start:start + batch_size], format='json')
+                    assert response.status_code == 201, response.data
+                batch = time.perf_counter() - started
+                raise Rollback
+        except Rollback:
+            pass
+
+        self.stdout.write(f"single  {total} posts in {single:.2f}s  {total / single:,.0f} rows/sec")
+        self.stdout.write(
+            f"batch   {total} posts in {batch:.2f}s  {total / batch:,.0f} rows/sec  (batches of {batch_size})"
+        )
+        self.stdout.write(self.style.SUCCESS(f"batch speedup: {single / batch:.1f}x"))
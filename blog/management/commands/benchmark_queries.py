@@ -0,0 +1,126 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.core.signals import request_started
+from django.db import connection, reset_queries, transaction
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+
+from blog.management.benchmark import Rollback, api_client, summarize, without_throttling
+from blog.management.dataset import generate_dataset
+
+
+class Command(BaseCommand):
+    help = "Seed a large dataset and report EXPLAIN plans and timings for the blog endpoints."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--posts', type=int, default=20000)
+        parser.add_argument('--comments', type=int, default=100000)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--iterations', type=int, default=20, help="Requests timed per endpoint.")
+        parser.add_argument('--analyze', action='store_true', help="Use EXPLAIN ANALYZE (PostgreSQL only).")
+        parser.add_argument('--keep', action='store_true', help="Keep the seeded rows instead of rolling back.")
+        parser.add_argument('--strict', action='store_true', help="Exit with an error if any plan scans a blog table without an index.")
+
+    @without_throttling()
+    def handle(self, *args, **options):
+        self.options = options
+        self.seq_scans = []
+        try:
+            with transaction.atomic():
+                author, post = self.seed()
+                self.run_endpoints(author, post)
+                if not options['keep']:
+                    raise Rollback
+        except Rollback:
+            self.stdout.write("Seeded rows rolled back.")
+
+        if self.seq_scans:
+            for name in self.seq_scans:
+                self.stdout.write(self.style.WARNING(f"{name}: plan contains a full table scan"))
+            if options['strict']:
+                raise CommandError("Query plans regressed to full table scans.")
+
+    def seed(self):
+        options = self.options
+        dataset = generate_dataset(
+            options['users'], options['posts'], options['comments'], batch_size=options['batch_size'], prefix='bench'
+        )
+        self.stdout.write(
+            f"Seeded {len(dataset.users)} users, {len(dataset.posts)} posts, {dataset.comments} comments "
+            f"in {dataset.seconds:.1f}s"
+        )
+        return dataset.author, dataset.hot_post
+
+    def run_endpoints(self, author, post):
+        client = api_client(author)
+        list_posts = reverse('list_posts')
+        list_comments = reverse('list_comments', args=[post.id])
+        last_post_page = max(author.posts.count() // 5, 1)
+        last_comment_page = max(post.comments.count() // 5, 1)
+        endpoints = [
+            ('list_posts', list_posts),
+            ('list_posts deep page', f'{list_posts}?page={last_post_page}'),
+            ('list_posts cursor', f'{list_posts}?cursor='),
+            ('list_posts is_published', f'{list_posts}?is_published=true'),
+            ('list_posts title', f'{list_posts}?title=Post%20100'),
+            ('list_posts ordering', f'{list_posts}?ordering=-created_at'),
+            ('view_post', reverse('view_post', args=[post.id])),
+            ('list_comments', list_comments),
+            ('list_comments deep page', f'{list_comments}?page={last_comment_page}'),
+            ('list_comments cursor', f'{list_comments}?cursor='),
+            ('list_comments ordering', f'{list_comments}?ordering=-created_at'),
+        ]
+        # Every request would otherwise clear the query log we are capturing.
+        request_started.disconnect(reset_queries)
+        try:
+            for name, url in endpoints:
+                self.run_endpoint(client, name, url)
+        finally:
+            request_started.connect(reset_queries)
+
+    def run_endpoint(self, client, name, url):
+        # The log is a bounded deque; start empty so the capture is not clipped.
+        reset_queries()
+        with CaptureQueriesContext(connection) as captured:
+            response = client.get(url)
+        timings = []
+        for _ in range(self.options['iterations']):
+            started = time.perf_counter()
+            client.get(url)
+            timings.append((time.perf_counter() - started) * 1000)
+        stats = summarize(timings)
+
+        self.stdout.write(self.style.MIGRATE_HEADING(f"\n{name}  GET {url}"))
+        self.stdout.write(
+            f"  status={response.status_code} queries={len(captured)} "
+            f"p50={stats['p50']:.2f}ms p95={stats['p95']:.2f}ms max={stats['max']:.2f}ms"
+        )
+        for query in captured.captured_queries:
+            sql = query['sql']
+            if not sql.lstrip().upper().startswith('SELECT'):
+                continue
+            self.stdout.write(f"  {sql}")
+            for line in self.explain(sql):
+                self.stdout.write(f"    {line}")
+                if self.is_seq_scan(line):
+                    self.seq_scans.append(name)
+
+    def explain(self, sql):
+        options = {}
+        if self.options['analyze'] and connection.vendor == 'postgresql':
+            options['analyze'] = True
+        prefix = connection.ops.explain_query_prefix(**options)
+        with connection.cursor() as cursor:
+            cursor.execute(f'{prefix} {sql}')
+            rows = cursor.fetchall()
+        if connection.vendor == 'sqlite':
+            # EXPLAIN QUERY PLAN rows are (id, parent, notused, detail).
+            return [row[-1] for row in rows]
+        return [row[0] for row in rows]
+
+    def is_seq_scan(self, line):
+        if connection.vendor == 'sqlite':
+            return line.startswith('SCAN blog_') and 'INDEX' not in line
+        return 'Seq Scan on blog_' in line
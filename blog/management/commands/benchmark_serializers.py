@@ -0,0 +1,71 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from rest_framework.renderers import JSONRenderer
+
+from account.models import CustomUser
+from blog.management.benchmark import Rollback
+from blog.models import Post, Comment
+from blog.serializers import CommentRowSerializer, CommentSerializer, PostRowSerializer, PostSerializer
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare the list serializers (ModelSerializer over instances) with the row "
+        "serializers (.values_list() rows) on full pages, and check their output is identical."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--page-size', type=int, default=100)
+        parser.add_argument('--repeat', type=int, default=200, help="Pages serialized per measurement.")
+
+    def handle(self, *args, **options):
+        try:
+            with transaction.atomic():
+                self.run(options)
+                raise Rollback
+        except Rollback:
+            pass
+
+    def run(self, options):
+        size, repeat = options['page_size'], options['repeat']
+        user = CustomUser.objects.create_user(
+            email='bench-serializers@example.com', password='benchmark', first_name='Bench', last_name='Rows'
+        )
+        posts = Post.objects.bulk_create([
+            Post(user=user, title=f'Post {i}', content='Lorem ipsum dolor sit amet. ' * 20, is_published=True)
+            for i in range(size)
+        ])
+        Comment.objects.bulk_create([Comment(user=user, post=posts[0], content='Nice post!') for _ in range(size)])
+
+        cases = [
+            ('posts', PostSerializer, PostRowSerializer, Post.objects.filter(user=user).order_by('-created_at', '-id')),
+            ('comments', CommentSerializer, CommentRowSerializer,
+             Comment.objects.filter(post=posts[0]).select_related('user').order_by('id')),
+        ]
+        renderer = JSONRenderer()
+        for name, serializer_class, row_serializer_class, queryset in cases:
+            instances = list(queryset.all())
+            rows = list(row_serializer_class.select(queryset))
+            expected = renderer.render(serializer_class(instances, many=True).data)
+            if renderer.render(row_serializer_class(rows).data) != expected:
+                raise CommandError(f"{name}: row serializer output differs")
+
+            self.stdout.write(self.style.MIGRATE_HEADING(f"\n{name}, {size} per page"))
+            results = {}
+            for label, serialize in (
+                ('model serializer', lambda: serializer_class(instances, many=True).data),
+                ('row serializer', lambda: row_serializer_class(rows).data),
+                ('model + fetch', lambda: serializer_class(list(queryset.all()), many=True).data),
+                ('rows + fetch', lambda: row_serializer_class(list(row_serializer_class.select(queryset))).data),
+            ):
+                started = time.perf_counter()
+                for _ in range(repeat):
+                    serialize()
+                results[label] = (time.perf_counter() - started) * 1000 / repeat
+                self.stdout.write(f"  {label:<17} {results[label]:8.3f}ms per page")
+            self.stdout.write(
+                f"  speedup: {results['model serializer'] / results['row serializer']:.1f}x serializing, "
+                f"{results['model + fetch'] / results['rows + fetch']:.1f}x with the query"
+            )
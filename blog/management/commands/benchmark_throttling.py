@@ -0,0 +1,84 @@
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.test import RequestFactory, override_settings
+from django.urls import reverse
+from rest_framework.request import Request
+
+from account.models import CustomUser
+from backend.throttling import RedisBucketStore, get_store, scoped_throttles
+from blog.management.benchmark import Rollback, api_client, summarize
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure the throttling overhead: the throttle check on its own, store calls per "
+        "request, and request latency with and without throttling."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--checks', type=int, default=20000, help="Throttle checks for the micro benchmark.")
+        parser.add_argument('--requests', type=int, default=500, help="Requests per mode for the latency comparison.")
+
+    def handle(self, *args, **options):
+        store = get_store()
+        self.stdout.write(
+            f"store: {type(store).__name__} on the '{store.cache.__class__.__name__}' cache "
+            f"({'one round trip per check' if isinstance(store, RedisBucketStore) else 'process-local'})"
+        )
+        # Rates high enough that nothing is refused, so every check does the full update
+        rates = {'user': '1000000/min', 'anon': '1000000/min', 'comment': '1000000/min'}
+        with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates}):
+            self.check_overhead(options['checks'])
+            try:
+                with transaction.atomic():
+                    self.request_overhead(rates, options['requests'])
+                    raise Rollback
+            except Rollback:
+                pass
+
+    def check_overhead(self, checks):
+        user = CustomUser(id=1, email='bench-throttle@example.com')
+        request = Request(RequestFactory().get('/'))
+        request.user = user
+        throttle = scoped_throttles('comment')[0]()
+
+        started = time.perf_counter()
+        for _ in range(checks):
+            throttle.allow_request(request, None)
+        elapsed = time.perf_counter() - started
+
+        self.stdout.write(self.style.MIGRATE_HEADING("\nthrottle check (user + comment buckets)"))
+        self.stdout.write(
+            f"  {1e6 * elapsed / checks:.1f}us per check, {checks / elapsed:,.0f} checks/s, "
+            f"one store call per check for {len(throttle.get_buckets(request))} buckets"
+        )
+
+    def request_overhead(self, rates, requests):
+        user = CustomUser.objects.create_user(
+            email='bench-throttle@example.com', password='benchmark', first_name='Bench', last_name='Throttle'
+        )
+        post = Post.objects.create(user=user, title='Throttled', content='Body', is_published=True)
+        url = reverse('view_post', args=[post.id])
+
+        self.stdout.write(self.style.MIGRATE_HEADING("\ncached post view, authenticated"))
+        results = {}
+        for label, mode_rates in (('unthrottled', {}), ('throttled', rates)):
+            with override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': mode_rates}):
+                client = api_client(user)
+                client.get(url)
+                timings = []
+                for _ in range(requests):
+                    started = time.perf_counter()
+                    response = client.get(url)
+                    timings.append((time.perf_counter() - started) * 1000)
+                    assert response.status_code == 200, response.status_code
+            results[label] = summarize(timings)
+            self.stdout.write(
+                f"  {label:<12} p50={results[label]['p50']:.3f}ms p99={results[label]['p99']:.3f}ms"
+            )
+        overhead = results['throttled']['p50'] - results['unthrottled']['p50']
+        self.stdout.write(f"  overhead     p50={overhead * 1000:+.0f}us per request")
@@ -0,0 +1,40 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from account.models import CustomUser
+from blog.management.dataset import PASSWORD, generate_dataset
+
+
+class Command(BaseCommand):
+    help = (
+        "Bulk insert a realistic dataset for load testing: Zipf-distributed authors and "
+        "comment threads, with comment counts and creation times filled in."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--users', type=int, default=1000)
+        parser.add_argument('--posts', type=int, default=50000)
+        parser.add_argument('--comments', type=int, default=250000)
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--skew', type=float, default=1.1, help="Zipf exponent; 0 spreads rows evenly.")
+        parser.add_argument('--seed', type=int, default=0)
+        parser.add_argument('--prefix', default='load', help="Users are <prefix><n>@example.com.")
+
+    def handle(self, *args, **options):
+        if options['users'] < 1:
+            raise CommandError("--users must be at least 1.")
+        if CustomUser.objects.filter(email=f"{options['prefix']}0@example.com").exists():
+            raise CommandError(f"Users prefixed '{options['prefix']}' already exist, pass another --prefix.")
+
+        with transaction.atomic():
+            dataset = generate_dataset(
+                options['users'], options['posts'], options['comments'], batch_size=options['batch_size'],
+                skew=options['skew'], seed=options['seed'], prefix=options['prefix'],
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f"Inserted {len(dataset.users)} users, {len(dataset.posts)} posts and {dataset.comments} comments "
+            f"in {dataset.seconds:.1f}s ({(len(dataset.users) + len(dataset.posts) + dataset.comments) / dataset.seconds:,.0f} rows/sec)."
+        ))
+        self.stdout.write(f"Busiest author: {dataset.author.email} (password '{PASSWORD}')")
+        if dataset.posts:
+            self.stdout.write(f"Hottest post: {dataset.hot_post.id} with {dataset.hot_post.comment_count} comments")
@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand
+
+from blog.deletion import batch_size, process_due_jobs
+
+
+class Command(BaseCommand):
+    help = (
+        "Remove the rows of deleted posts and accounts in batches. Run with --loop as a "
+        "worker when DELETION_IN_PROCESS is off, or once to drain retries."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=None, help="Rows per transaction (default: DELETION_BATCH_SIZE).")
+        parser.add_argument('--loop', action='store_true', help="Keep polling for jobs.")
+        parser.add_argument('--interval', type=float, default=5, help="Seconds between polls with --loop.")
+
+    def handle(self, *args, **options):
+        size = options['batch_size'] or batch_size()
+        while True:
+            ran = process_due_jobs(size=size)
+            if ran or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(f"Ran {ran} deletion job(s)."))
+            if not options['loop']:
+                return
+            if not ran:
+                time.sleep(options['interval'])
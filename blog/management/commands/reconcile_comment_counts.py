@@ -0,0 +1,43 @@
+from django.core.management.base import BaseCommand
+from django.db.models import F
+
+from blog.cache import invalidate_posts
+from blog.counters import actual_comment_count
+from blog.models import Post
+
+
+class Command(BaseCommand):
+    help = "Repair Post.comment_count where it has drifted from the actual number of comments."
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--dry-run', action='store_true', help="Report drifted posts without fixing them.")
+
+    def handle(self, *args, **options):
+        drifted = (
+            Post.objects.annotate(actual=actual_comment_count())
+            .exclude(comment_count=F('actual'))
+            .values_list('id', 'comment_count', 'actual')
+        )
+        batch = []
+        fixed = 0
+        for row in drifted.iterator(chunk_size=options['batch_size']):
+            post_id, stored, actual = row
+            self.stdout.write(f"Post {post_id}: comment_count={stored}, actual={actual}", style_func=self.style.WARNING)
+            batch.append(post_id)
+            if len(batch) >= options['batch_size']:
+                fixed += self.repair(batch, options['dry_run'])
+                batch = []
+        if batch:
+            fixed += self.repair(batch, options['dry_run'])
+
+        verb = "Found" if options['dry_run'] else "Repaired"
+        self.stdout.write(self.style.SUCCESS(f"{verb} {fixed} drifted post(s)."))
+
+    def repair(self, post_ids, dry_run):
+        if dry_run:
+            return len(post_ids)
+        # Recount in the UPDATE itself so comments written meanwhile are included
+        Post.objects.filter(id__in=post_ids).update(comment_count=actual_comment_count())
+        invalidate_posts(post_ids)
+        return len(post_ids)
@@ -0,0 +1,140 @@
+import random
+import time
+from collections import Counter
+from contextlib import contextmanager
+from dataclasses import dataclass
+from datetime import timedelta
+from itertools import accumulate
+
+from django.contrib.auth.hashers import make_password
+from django.db import connection
+from django.utils import timezone
+
+from account.models import CustomUser
+from blog.models import Post, Comment, make_excerpt
+
+PASSWORD = 'benchmark'
+
+WORDS = (
+    'lorem ipsum dolor sit amet consectetur adipiscing elit sed do eiusmod tempor incididunt ut labore '
+    'et dolore magna aliqua django python api cache query index latency throughput replica token'
+).split()
+
+
+@dataclass
+class Dataset:
+    users: list
+    posts: list
+    comments: int
+    seconds: float
+
+    @property
+    def author(self):
+        """The user with the most posts."""
+        return self.users[0]
+
+    @property
+    def hot_post(self):
+        """The post with the most comments."""
+        return self.posts[0]
+
+
+def zipf_weights(n, skew):
+    # Cumulative weights for random.choices(): rank i is picked in
+    # proportion to 1 / (i + 1) ** skew, so index 0 is the most popular
+    return list(accumulate(1 / (rank + 1) ** skew for rank in range(n)))
+
+
+@contextmanager
+def explicit_timestamps(*models):
+    """
+    Let bulk_create() write the created_at/updated_at values given, instead
+    of stamping every row with the same instant. Not thread-safe: for
+    management commands only.
+    """
+    fields = [
+        field for model in models for field in model._meta.concrete_fields
+        if getattr(field, 'auto_now', False) or getattr(field, 'auto_now_add', False)
+    ]
+    saved = [(field.auto_now, field.auto_now_add) for field in fields]
+    for field in fields:
+        field.auto_now = field.auto_now_add = False
+    try:
+        yield
+    finally:
+        for field, (auto_now, auto_now_add) in zip(fields, saved):
+            field.auto_now, field.auto_now_add = auto_now, auto_now_add
+
+
+def sentence(rng, words):
+    return ' '.join(rng.choice(WORDS) for _ in range(words)).capitalize()
+
+
+def generate_dataset(users, posts, comments, batch_size=1000, skew=1.1, seed=0, prefix='load'):
+    """
+    Bulk insert `users`, `posts` and `comments` rows shaped like production
+    traffic: authors and threads follow a Zipf distribution, so the first
+    user writes the most posts and the first post gets the most comments.
+
+    Every user's password is PASSWORD. Post comment counts are filled in,
+    and creation times spread back from now. The same arguments generate
+    the same rows.
+    """
+    rng = random.Random(seed)
+    now = timezone.now()
+    started = time.perf_counter()
+
+    password = make_password(PASSWORD)
+    with explicit_timestamps(CustomUser, Post, Comment):
+        user_rows = CustomUser.objects.bulk_create(
+            [
+                CustomUser(
+                    email=f'{prefix}{i}@example.com', first_name='Load', last_name=str(i), password=password,
+                    date_joined=now, last_login=now,
+                )
+                for i in range(users)
+            ],
+            batch_size=batch_size,
+        )
+
+        # Threads are picked up front, so each post is inserted with its final count
+        threads = rng.choices(range(posts), cum_weights=zipf_weights(posts, skew), k=comments) if posts else []
+        comment_counts = Counter(threads)
+        authors = rng.choices(user_rows, cum_weights=zipf_weights(users, skew), k=posts)
+        # Oldest first, so the hot post has had the longest to collect comments
+        post_rows = [
+            Post(
+                user=authors[i],
+                title=sentence(rng, rng.randint(3, 8)),
+                content='\n\n'.join(sentence(rng, rng.randint(20, 60)) for _ in range(rng.randint(1, 5))),
+                is_published=i == 0 or rng.random() < 0.8,
+                comment_count=comment_counts[i],
+                created_at=now - timedelta(minutes=posts - i),
+                updated_at=now - timedelta(minutes=posts - i),
+            )
+            for i in range(posts)
+        ]
+        # bulk_create() skips save(), which fills in the excerpt
+        for post in post_rows:
+            post.excerpt = make_excerpt(post.content)
+        Post.objects.bulk_create(post_rows, batch_size=batch_size)
+
+        commenters = zipf_weights(users, skew)
+        for start in range(0, comments, batch_size):
+            batch = []
+            for index in threads[start:start + batch_size]:
+                post = post_rows[index]
+                created_at = min(post.created_at + timedelta(seconds=rng.randint(1, 86400)), now)
+                batch.append(Comment(
+                    user=rng.choices(user_rows, cum_weights=commenters)[0],
+                    post=post,
+                    content=sentence(rng, rng.randint(3, 30)),
+                    created_at=created_at,
+                    updated_at=created_at,
+                ))
+            Comment.objects.bulk_create(batch)
+
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE account_customuser; ANALYZE blog_post; ANALYZE blog_comment;')
+    return Dataset(user_rows, post_rows, comments, time.perf_counter() - started)
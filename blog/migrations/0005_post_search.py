@@ -0,0 +1,22 @@
+from django.db import migrations
+
+
+def install_search(apps, schema_editor):
+    from blog.search import install_search
+    install_search(schema_editor.connection)
+
+
+def uninstall_search(apps, schema_editor):
+    from blog.search import uninstall_search
+    uninstall_search(schema_editor.connection)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0004_post_comment_count'),
+    ]
+
+    operations = [
+        migrations.RunPython(install_search, uninstall_search),
+    ]
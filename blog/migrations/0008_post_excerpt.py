@@ -0,0 +1,34 @@
+# Generated by Django 5.2 on 2026-10-18 17:47
+
+from django.db import migrations, models
+from django.utils.text import Truncator
+
+
+def backfill_excerpt(apps, schema_editor):
+    # Same as blog.models.make_excerpt(), frozen here
+    Post = apps.get_model('blog', 'Post')
+    batch = []
+    for post in Post.objects.only('id', 'content').iterator(chunk_size=1000):
+        post.excerpt = Truncator(' '.join(post.content.split())).chars(200)
+        batch.append(post)
+        if len(batch) >= 1000:
+            Post.objects.bulk_update(batch, ['excerpt'])
+            batch = []
+    if batch:
+        Post.objects.bulk_update(batch, ['excerpt'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('blog', '0007_post_published_created_idx'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='post',
+            name='excerpt',
+            field=models.CharField(blank=True, editable=False, max_length=200),
+        ),
+        migrations.RunPython(backfill_excerpt, migrations.RunPython.noop),
+    ]
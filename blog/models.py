@@ -1,14 +1,93 @@
-from django.db import models
+from django.db import models, router, transaction
+from django.utils import timezone
+from django.utils.text import Truncator
 from account.models import CustomUser
+from .threads import path_segment, root_path
+
+EXCERPT_LENGTH = 200
+
+
+def make_excerpt(content):
+    # Whitespace collapsed, cut at EXCERPT_LENGTH characters with an ellipsis
+    return Truncator(' '.join(content.split())).chars(EXCERPT_LENGTH)
+
+
+class PostManager(models.Manager):
+    # Posts pending deletion, and those of accounts pending deletion, are
+    # hidden until blog.deletion removes them; use Post.all_objects to see them
+    def get_queryset(self):
+        return super().get_queryset().filter(deleted_at__isnull=True, user__deleted_at__isnull=True)
+
+
+class CommentQuerySet(models.QuerySet):
+    def bulk_create(self, objs, *args, **kwargs):
+        # Like save(), give the comments their depth and path (see blog/threads.py);
+        # replies' parents must already have theirs
+        objs = list(objs)
+        for obj in objs:
+            if obj.parent_id is not None:
+                obj.depth = obj.parent.depth + 1
+        # No row is left without its path when an id does not fit one
+        with transaction.atomic(using=self.db, savepoint=False):
+            objs = super().bulk_create(objs, *args, **kwargs)
+            roots = [obj for obj in objs if not obj.path and obj.parent_id is None]
+            replies = [obj for obj in objs if not obj.path and obj.parent_id is not None]
+            if roots:
+                for obj in roots:
+                    obj.path = path_segment(obj.pk)
+                self.model._base_manager.filter(pk__in=[obj.pk for obj in roots]).update(path=root_path())
+            if replies:
+                for obj in replies:
+                    obj.path = obj.parent.path + path_segment(obj.pk)
+                self.model._base_manager.bulk_update(replies, ['path'])
+        return objs
+
+
+class CommentManager(models.Manager.from_queryset(CommentQuerySet)):
+    # Comments of accounts pending deletion, and those on posts Post.objects
+    # hides, are hidden too, see PostManager
+    def get_queryset(self):
+        return super().get_queryset().filter(
+            user__deleted_at__isnull=True, post__deleted_at__isnull=True, post__user__deleted_at__isnull=True,
+        )
+
 
 # Create your models here.
 class Post(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE, related_name='posts')
     title = models.CharField(max_length=200)
     content = models.TextField()
+    # Kept in step with content by save(); list pages show it without reading content
+    excerpt = models.CharField(max_length=EXCERPT_LENGTH, blank=True, editable=False)
     is_published = models.BooleanField(default=False)
+    # Maintained by the comment write views; repair with reconcile_comment_counts
+    comment_count = models.PositiveIntegerField(default=0)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Set when the post is deleted; the rows go later, see blog/deletion.py
+    deleted_at = models.DateTimeField(null=True, blank=True, editable=False)
+
+    objects = PostManager()
+    all_objects = models.Manager()
+
+    class Meta:
+        indexes = [
+            # ListPostView: a user's posts, newest first (and keyset pages).
+            models.Index(fields=['user', 'created_at', 'id'], name='post_user_created_idx'),
+            # ListPostView with ?is_published=...
+            models.Index(fields=['user', 'is_published', 'created_at'], name='post_user_published_idx'),
+            # ListPostView with ?title=...
+            models.Index(fields=['user', 'title'], name='post_user_title_idx'),
+            # FeedView: everyone's published posts, newest first
+            models.Index(fields=['is_published', 'created_at', 'id'], name='post_published_created_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        self.excerpt = make_excerpt(self.content)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'content' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'excerpt'}
+        super().save(*args, **kwargs)
 
     def __str__(self):
         return self.title + " by " + str(self.author)
@@ -17,9 +96,79 @@ class Post(models.Model):
 class Comment(models.Model):
     user = models.ForeignKey(CustomUser, on_delete=models.CASCADE)
     post = models.ForeignKey(Post, on_delete=models.CASCADE, related_name='comments')
+    # Replies are deleted with their thread, by path (see DeleteCommentView)
+    parent = models.ForeignKey(
+        'self', null=True, blank=True, on_delete=models.DO_NOTHING, related_name='replies',
+    )
+    # Materialized path and depth, see blog/threads.py
+    path = models.CharField(max_length=255, blank=True, editable=False)
+    depth = models.PositiveSmallIntegerField(default=0, editable=False)
     content = models.TextField()
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
+    objects = CommentManager()
+    all_objects = CommentQuerySet.as_manager()
+
+    class Meta:
+        indexes = [
+            # ListCommentView: a post's comments, oldest or newest first.
+            models.Index(fields=['post', 'created_at', 'id'], name='comment_post_created_idx'),
+            # Threads: a subtree is a range of paths
+            models.Index(fields=['post', 'path'], name='comment_post_path_idx'),
+            # Threads: a post's roots, without scanning their replies
+            models.Index(fields=['post', 'depth', 'path'], name='comment_post_root_idx'),
+        ]
+
+    def save(self, *args, **kwargs):
+        adding = self._state.adding
+        if adding and self.parent_id is not None:
+            self.depth = self.parent.depth + 1
+        using = kwargs.get('using') or router.db_for_write(type(self), instance=self)
+        # No row is left without its path when its id does not fit one
+        with transaction.atomic(using=using, savepoint=False):
+            super().save(*args, **kwargs)
+            if adding and not self.path:
+                # The path ends with the id, known only once inserted
+                self.path = (self.parent.path if self.parent_id is not None else '') + path_segment(self.pk)
+                type(self)._base_manager.filter(pk=self.pk).update(path=self.path)
+
     def __str__(self):
         return f"Comment by {self.user.email} on {self.post.title}"
+
+
+class DeletionJob(models.Model):
+    """
+    A post or account waiting to be removed in batches by blog.deletion,
+    with its progress and retry state.
+    """
+    POST = 'post'
+    ACCOUNT = 'account'
+    KIND_CHOICES = [(POST, 'Post'), (ACCOUNT, 'Account')]
+
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = [(PENDING, 'Pending'), (RUNNING, 'Running'), (DONE, 'Done'), (FAILED, 'Failed')]
+
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    object_id = models.BigIntegerField()
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    rows_deleted = models.PositiveBigIntegerField(default=0)
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+    # Not picked up before this, to back off between retries
+    run_after = models.DateTimeField(default=timezone.now)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+    finished_at = models.DateTimeField(null=True, blank=True)
+
+    class Meta:
+        indexes = [
+            # The worker's queue: due jobs, oldest first
+            models.Index(fields=['status', 'run_after'], name='deletion_job_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"Delete {self.kind} {self.object_id} ({self.status})"
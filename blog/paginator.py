@@ -1,6 +1,254 @@
+import json
+from base64 import urlsafe_b64decode, urlsafe_b64encode
+from collections import OrderedDict
+
+from django.core.paginator import EmptyPage, InvalidPage, Page, PageNotAnInteger, Paginator
+from django.db.models import Q
+from django.utils.dateparse import parse_datetime
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
 from rest_framework.pagination import PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.utils.urls import remove_query_param, replace_query_param
+
+from .counting import acount_rows, count_rows
+
+# Largest id a cursor or an id list may name: a signed 64-bit column's
+MAX_ID = 2 ** 63 - 1
+
+
+class CountedPage(Page):
+    def has_next(self):
+        if self.paginator.count_exact:
+            return super().has_next()
+        return self.more
+
+
+class CountedPaginator(Paginator):
+    """
+    Paginator counting with blog.counting.count_rows(). When the count is
+    an estimate, any page number is accepted and each page reads one row
+    more to tell whether there is a next one, so no row is out of reach.
+    """
+
+    def __init__(self, object_list, per_page, count_key=None, **kwargs):
+        super().__init__(object_list, per_page, **kwargs)
+        self.count_key = count_key
+
+    @cached_property
+    def counted(self):
+        return count_rows(self.object_list, self.count_key)
+
+    @property
+    def count(self):
+        return self.counted.value
+
+    @property
+    def count_exact(self):
+        return self.counted.exact
+
+    def validate_number(self, number):
+        if self.count_exact:
+            return super().validate_number(number)
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise PageNotAnInteger(self.error_messages['invalid_page'])
+        if number < 1:
+            raise EmptyPage(self.error_messages['min_page'])
+        return number
+
+    def page(self, number):
+        if self.count_exact:
+            return super().page(number)
+        number = self.validate_number(number)
+        return self.open_page(number, list(self.window(number)))
+
+    async def apage(self, number):
+        if self.count_exact:
+            page = self.page(number)
+            page.object_list = [row async for row in page.object_list]
+            return page
+        number = self.validate_number(number)
+        return self.open_page(number, [row async for row in self.window(number)])
+
+    def window(self, number):
+        # The page's rows, plus one to tell whether there is a next page
+        bottom = (number - 1) * self.per_page
+        return self.object_list[bottom:bottom + self.per_page + 1]
+
+    def open_page(self, number, rows):
+        if not rows and number > 1:
+            raise EmptyPage(self.error_messages['no_results'])
+        page = self._get_page(rows[:self.per_page], number, self)
+        page.more = len(rows) > self.per_page
+        return page
+
+    def _get_page(self, *args, **kwargs):
+        return CountedPage(*args, **kwargs)
+
 
 class CustomPagination(PageNumberPagination):
     page_size = 5
     page_size_query_param = 'page_size'
     max_page_size = 100
+
+    # Sending `?cursor=` (empty for the first page) switches to keyset mode:
+    # pages are sliced on (ordering field, id) instead of COUNT + OFFSET.
+    cursor_query_param = 'cursor'
+    keyset_fields = ['created_at', 'updated_at', 'id']
+    default_keyset_ordering = '-created_at'
+    invalid_cursor_message = 'Invalid cursor'
+
+    keyset = False
+    # Set by views whose unfiltered count a write view invalidates, see
+    # blog/counting.py
+    count_key = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        if self.cursor_query_param not in request.query_params:
+            # PageNumberPagination.paginate_queryset(), counting with count_rows()
+            self.request = request
+            page_size = self.get_page_size(request)
+            paginator = CountedPaginator(queryset, page_size, count_key=self.count_key)
+            page_number = self.get_page_number(request, paginator)
+            try:
+                self.page = paginator.page(page_number)
+            except InvalidPage as exc:
+                raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+            if paginator.num_pages > 1 and self.template is not None:
+                self.display_page_controls = True
+            return list(self.page)
+        return self.keyset_page(list(self.keyset_queryset(queryset, request)))
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """Async counterpart of paginate_queryset(), for the async read views."""
+        if self.cursor_query_param in request.query_params:
+            return self.keyset_page([row async for row in self.keyset_queryset(queryset, request)])
+
+        self.request = request
+        page_size = self.get_page_size(request)
+        paginator = CountedPaginator(queryset, page_size, count_key=self.count_key)
+        # Prime the cached count so page() below does not run a sync COUNT
+        paginator.counted = await acount_rows(queryset, self.count_key)
+        page_number = self.get_page_number(request, paginator)
+        try:
+            self.page = await paginator.apage(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        return list(self.page)
+
+    def keyset_queryset(self, queryset, request):
+        # The page's rows, plus one to tell whether there is more after it.
+        self.keyset = True
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        self.field, self.descending = self.get_keyset_ordering(queryset)
+        self.position, self.backwards = self.decode_cursor(request)
+
+        # Walking backwards reads the reversed order and flips the page after.
+        reverse = self.descending != self.backwards
+        if self.position is not None:
+            value, pk = self.position
+            lookup = 'lt' if reverse else 'gt'
+            if self.field == 'id':
+                queryset = queryset.filter(**{f'id__{lookup}': pk})
+            else:
+                queryset = queryset.filter(
+                    Q(**{f'{self.field}__{lookup}': value})
+                    | Q(**{self.field: value, f'id__{lookup}': pk})
+                )
+
+        prefix = '-' if reverse else ''
+        ordering = [prefix + self.field]
+        if self.field != 'id':
+            ordering.append(prefix + 'id')
+        return queryset.order_by(*ordering)[:self.page_size + 1]
+
+    def keyset_page(self, rows):
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if self.backwards:
+            rows.reverse()
+            self.has_next = self.position is not None
+            self.has_previous = has_more
+        else:
+            self.has_next = has_more
+            self.has_previous = self.position is not None
+        self.rows = rows
+        return rows
+
+    def get_paginated_response(self, data):
+        if not self.keyset:
+            return Response(OrderedDict([
+                ('count', self.page.paginator.count),
+                # False when the count is the database's estimate
+                ('count_exact', self.page.paginator.count_exact),
+                ('next', self.get_next_link()),
+                ('previous', self.get_previous_link()),
+                ('results', data),
+            ]))
+        return Response(OrderedDict([
+            ('next', self.get_next_link()),
+            ('previous', self.get_previous_link()),
+            ('results', data),
+        ]))
+
+    def get_next_link(self):
+        if not self.keyset:
+            return super().get_next_link()
+        if not self.has_next or not self.rows:
+            return None
+        return self.encode_cursor(self.rows[-1], backwards=False)
+
+    def get_previous_link(self):
+        if not self.keyset:
+            return super().get_previous_link()
+        if not self.has_previous or not self.rows:
+            return None
+        return self.encode_cursor(self.rows[0], backwards=True)
+
+    def get_keyset_ordering(self, queryset):
+        # Reuse whatever OrderingFilter applied, as long as it is a keyset field.
+        ordering = list(queryset.query.order_by) or [self.default_keyset_ordering]
+        term = ordering[0]
+        field = term.lstrip('-')
+        if field not in self.keyset_fields:
+            term = self.default_keyset_ordering
+            field = term.lstrip('-')
+        return field, term.startswith('-')
+
+    def ordering_term(self):
+        return ('-' if self.descending else '') + self.field
+
+    def encode_cursor(self, row, backwards):
+        value = row[self.field] if isinstance(row, dict) else getattr(row, self.field)
+        pk = row['id'] if isinstance(row, dict) else row.id
+        if hasattr(value, 'isoformat'):
+            value = value.isoformat()
+        payload = json.dumps([self.ordering_term(), value, pk, int(backwards)], separators=(',', ':'))
+        cursor = urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+        url = self.request.build_absolute_uri()
+        url = remove_query_param(url, self.page_query_param)
+        return replace_query_param(url, self.cursor_query_param, cursor)
+
+    def decode_cursor(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if not cursor:
+            return None, False
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            ordering, value, pk, backwards = json.loads(urlsafe_b64decode(padded.encode()))
+            pk = int(pk)
+            if self.field != 'id':
+                # None when malformed, ValueError when out of range (month 13)
+                value = parse_datetime(value) if isinstance(value, str) else None
+        except (TypeError, ValueError):
+            raise NotFound(self.invalid_cursor_message)
+        # A cursor is only meaningful for the ordering it was issued under,
+        # direction included.
+        if ordering != self.ordering_term() or not 0 < pk <= MAX_ID:
+            raise NotFound(self.invalid_cursor_message)
+        if self.field != 'id' and value is None:
+            raise NotFound(self.invalid_cursor_message)
+        return (value, pk), bool(backwards)
@@ -0,0 +1,155 @@
+import re
+
+from django.db import connections
+from django.db.models import BooleanField, Case, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+# Full-text search over Post.title and Post.content.
+#
+# PostgreSQL: blog_post.search_vector is a stored generated tsvector column
+# (title weighted A, content weighted B) with a GIN index, so the database
+# keeps it current on every write, bulk or not.
+# SQLite: an external-content FTS5 table, blog_post_fts, kept in sync by
+# triggers. Neither is declared on the model; see migration 0005.
+# Other databases: unindexed icontains matching, see icontains_search().
+
+SEARCH_CONFIG = 'english'
+
+POSTGRES_SQL = [
+    f"""
+    ALTER TABLE blog_post ADD COLUMN search_vector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(title, '')), 'A') ||
+        setweight(to_tsvector('{SEARCH_CONFIG}', coalesce(content, '')), 'B')
+    ) STORED
+    """,
+    "CREATE INDEX post_search_vector_idx ON blog_post USING GIN (search_vector)",
+]
+POSTGRES_REVERSE_SQL = [
+    "DROP INDEX IF EXISTS post_search_vector_idx",
+    "ALTER TABLE blog_post DROP COLUMN IF EXISTS search_vector",
+]
+
+SQLITE_TRIGGERS = {
+    'blog_post_fts_ai': """
+        CREATE TRIGGER IF NOT EXISTS blog_post_fts_ai AFTER INSERT ON blog_post BEGIN
+            INSERT INTO blog_post_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+        END
+    """,
+    'blog_post_fts_ad': """
+        CREATE TRIGGER IF NOT EXISTS blog_post_fts_ad AFTER DELETE ON blog_post BEGIN
+            INSERT INTO blog_post_fts(blog_post_fts, rowid, title, content)
+            VALUES ('delete', old.id, old.title, old.content);
+        END
+    """,
+    'blog_post_fts_au': """
+        CREATE TRIGGER IF NOT EXISTS blog_post_fts_au AFTER UPDATE OF title, content ON blog_post BEGIN
+            INSERT INTO blog_post_fts(blog_post_fts, rowid, title, content)
+            VALUES ('delete', old.id, old.title, old.content);
+            INSERT INTO blog_post_fts(rowid, title, content) VALUES (new.id, new.title, new.content);
+        END
+    """,
+}
+SQLITE_REVERSE_SQL = [f"DROP TRIGGER IF EXISTS {name}" for name in SQLITE_TRIGGERS] + [
+    "DROP TABLE IF EXISTS blog_post_fts",
+]
+
+
+def install_search(connection):
+    if connection.vendor == 'postgresql':
+        with connection.cursor() as cursor:
+            for sql in POSTGRES_SQL:
+                cursor.execute(sql)
+    elif connection.vendor == 'sqlite':
+        install_sqlite_fts(connection)
+
+
+def uninstall_search(connection):
+    sql = {'postgresql': POSTGRES_REVERSE_SQL, 'sqlite': SQLITE_REVERSE_SQL}.get(connection.vendor, [])
+    with connection.cursor() as cursor:
+        for statement in sql:
+            cursor.execute(statement)
+
+
+def install_sqlite_fts(connection):
+    """
+    Create the FTS5 table and its triggers if missing (idempotent).
+
+    SQLite migrations that rebuild blog_post drop its triggers, so this also
+    runs after every migrate and rebuilds the index when it had to re-add any.
+    """
+    with connection.cursor() as cursor:
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'table' AND name = 'blog_post'")
+        if cursor.fetchone() is None:
+            return
+        cursor.execute("SELECT name FROM sqlite_master WHERE type = 'trigger' AND name LIKE 'blog_post_fts_%'")
+        existing = {row[0] for row in cursor.fetchall()}
+        cursor.execute(
+            "CREATE VIRTUAL TABLE IF NOT EXISTS blog_post_fts USING fts5("
+            "title, content, content='blog_post', content_rowid='id', tokenize='porter unicode61')"
+        )
+        for name, sql in SQLITE_TRIGGERS.items():
+            cursor.execute(sql)
+        if existing != set(SQLITE_TRIGGERS):
+            cursor.execute("INSERT INTO blog_post_fts(blog_post_fts) VALUES ('rebuild')")
+
+
+def install_search_after_migrate(using, **kwargs):
+    connection = connections[using]
+    if connection.vendor == 'sqlite':
+        install_sqlite_fts(connection)
+
+
+def query_words(query):
+    return re.findall(r'\w+', query)
+
+
+def fts5_query(query):
+    # Quote every word so user input can never be parsed as FTS5 syntax;
+    # adjacent terms are ANDed like websearch_to_tsquery does.
+    return ' '.join(f'"{word}"' for word in query_words(query))
+
+
+def icontains_search(queryset, query):
+    """
+    search_posts() without a full-text index: posts containing every word in
+    their title or content, those with all of them in the title first.
+    """
+    words = query_words(query)
+    if not words:
+        return queryset.none()
+    in_title = Q()
+    for word in words:
+        queryset = queryset.filter(Q(title__icontains=word) | Q(content__icontains=word))
+        in_title &= Q(title__icontains=word)
+    rank = Case(When(in_title, then=Value(1.0)), default=Value(0.0), output_field=FloatField())
+    return queryset.annotate(rank=rank).order_by('-rank', '-id')
+
+
+def search_posts(queryset, query):
+    """
+    Filter `queryset` to posts matching `query`, annotated with `rank`
+    (higher is better) and ordered by it.
+    """
+    vendor = connections[queryset.db].vendor
+    if vendor == 'postgresql':
+        tsquery = 'websearch_to_tsquery(%s::regconfig, %s)'
+        params = [SEARCH_CONFIG, query]
+        matches = RawSQL(f'"blog_post"."search_vector" @@ {tsquery}', params, output_field=BooleanField())
+        rank = RawSQL(f'ts_rank("blog_post"."search_vector", {tsquery})', params, output_field=FloatField())
+    elif vendor == 'sqlite':
+        match = fts5_query(query)
+        if not match:
+            return queryset.none()
+        matches = RawSQL(
+            '"blog_post"."id" IN (SELECT rowid FROM blog_post_fts WHERE blog_post_fts MATCH %s)',
+            [match], output_field=BooleanField(),
+        )
+        # bm25() is lower-is-better; title hits weigh more, as with the A/B weights
+        rank = RawSQL(
+            '(SELECT -bm25(blog_post_fts, 10.0, 1.0) FROM blog_post_fts '
+            'WHERE blog_post_fts MATCH %s AND rowid = "blog_post"."id")',
+            [match], output_field=FloatField(),
+        )
+    else:
+        return icontains_search(queryset, query)
+    return queryset.filter(matches).annotate(rank=rank).order_by('-rank', '-id')
@@ -1,5 +1,19 @@
+from django.utils import timezone
 from rest_framework import serializers
-from .models import Post, Comment
+from backend.profiling import measure
+from .models import Post, Comment, make_excerpt
+
+
+class PostListSerializer(serializers.ListSerializer):
+    # Insert a validated batch with one multi-row INSERT instead of one per post
+    batch_size = 500
+
+    def create(self, validated_data):
+        posts = [self.child.Meta.model(**item) for item in validated_data]
+        # bulk_create() skips save(), which fills in the excerpt
+        for post in posts:
+            post.excerpt = make_excerpt(post.content)
+        return self.child.Meta.model.objects.bulk_create(posts, batch_size=self.batch_size)
 
 
 class PostSerializer(serializers.ModelSerializer):
@@ -7,16 +21,148 @@ class PostSerializer(serializers.ModelSerializer):
     updated_at = serializers.DateTimeField(format="%Y-%m-%d %H:%M:%S", read_only=True)
     class Meta:
         model = Post
-        fields = ['id', 'title', 'content', 'is_published', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'created_at', 'updated_at']
+        fields = ['id', 'title', 'content', 'is_published', 'comment_count', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'comment_count', 'created_at', 'updated_at']
+        list_serializer_class = PostListSerializer
 
 
 class CommentSerializer(serializers.ModelSerializer):
     created_at = serializers.DateTimeField(format="%Y-%m-%d %H:%M:%S", read_only=True)
     updated_at = serializers.DateTimeField(format="%Y-%m-%d %H:%M:%S", read_only=True)
     user = serializers.CharField(source='user.email', read_only=True)
+    # Set when replying; CreateCommentView checks it is on the same post
+    parent = serializers.PrimaryKeyRelatedField(
+        queryset=Comment.objects.all(), required=False, allow_null=True, write_only=True,
+    )
 
     class Meta:
         model = Comment
-        fields = ['id', 'user','post_id', 'content', 'created_at', 'updated_at']
-        read_only_fields = ['id', 'created_at', 'updated_at', 'post', 'user']
+        fields = ['id', 'user','post_id', 'parent', 'parent_id', 'depth', 'content', 'created_at', 'updated_at']
+        read_only_fields = ['id', 'created_at', 'updated_at', 'post', 'user', 'parent_id', 'depth']
+
+    def update(self, instance, validated_data):
+        # A comment stays where it was posted in its thread
+        validated_data.pop('parent', None)
+        return super().update(instance, validated_data)
+
+
+def format_datetimes(values):
+    """
+    Format a column of aware datetimes like DateTimeField(format="%Y-%m-%d %H:%M:%S"):
+    converted to the current time zone, seconds precision, no offset.
+    """
+    tz = timezone.get_current_timezone()
+    return [
+        None if value is None else value.astimezone(tz).isoformat(' ', 'seconds')[:19]
+        for value in values
+    ]
+
+
+class RowSerializer:
+    """
+    Read-only counterpart of a ModelSerializer for list pages.
+
+    Rows come from `select(queryset)` (a named .values_list(), no model
+    instances) and `data` builds the same dicts, key for key, as the model
+    serializer would: columns are converted in bulk and zipped with the
+    output names, instead of going field by field through DRF.
+
+    Clients can narrow the output with ?fields= or ?omit= (see
+    `requested_fields()`), and only those columns are read; `optional_fields`
+    are only sent when asked for.
+    """
+    # (output name, values_list lookup) in output order
+    fields = ()
+    datetime_fields = ()
+    optional_fields = ()
+    # Always read, for the paginator's cursors and the page ETag
+    required_fields = ('id', 'created_at', 'updated_at')
+
+    def __init_subclass__(cls, **kwargs):
+        super().__init_subclass__(**kwargs)
+        cls.names = tuple(name for name, _ in cls.fields)
+        cls.lookups = dict(cls.fields)
+        cls.default_fields = tuple(name for name in cls.names if name not in cls.optional_fields)
+
+    def __init__(self, rows, fields=None):
+        self.rows = rows
+        self.output = fields or self.default_fields
+
+    @classmethod
+    def requested_fields(cls, query_params):
+        """
+        The output names ?fields= (a comma-separated list) or ?omit= (names
+        to drop from the default) ask for, in output order.
+        """
+        if 'fields' in query_params:
+            wanted = cls.parse_names(query_params, 'fields')
+        elif 'omit' in query_params:
+            wanted = set(cls.default_fields) - cls.parse_names(query_params, 'omit')
+        else:
+            return cls.default_fields
+        if not wanted:
+            raise serializers.ValidationError({'fields': ["At least one field is required."]})
+        return tuple(name for name in cls.names if name in wanted)
+
+    @classmethod
+    def parse_names(cls, query_params, param):
+        names = {name.strip() for name in query_params.get(param, '').split(',') if name.strip()}
+        unknown = names - set(cls.names)
+        if unknown:
+            raise serializers.ValidationError({param: [f"Unknown field(s): {', '.join(sorted(unknown))}."]})
+        return names
+
+    @classmethod
+    def select(cls, queryset, fields=None):
+        # Named, so paginators and validators can read row.id, row.updated_at...
+        selected = set(fields or cls.default_fields) | set(cls.required_fields)
+        return queryset.values_list(*(cls.lookups[name] for name in cls.names if name in selected), named=True)
+
+    @property
+    @measure('serialize')
+    def data(self):
+        if not self.rows:
+            return []
+        columns = dict(zip(self.rows[0]._fields, zip(*self.rows)))
+        output = [columns[self.lookups[name]] for name in self.output]
+        for index, name in enumerate(self.output):
+            if name in self.datetime_fields:
+                output[index] = format_datetimes(output[index])
+        names = self.output
+        return [dict(zip(names, row)) for row in zip(*output)]
+
+
+class PostRowSerializer(RowSerializer):
+    # Same output as PostSerializer, plus the excerpt on request
+    fields = (
+        ('id', 'id'),
+        ('title', 'title'),
+        ('content', 'content'),
+        ('excerpt', 'excerpt'),
+        ('is_published', 'is_published'),
+        ('comment_count', 'comment_count'),
+        ('created_at', 'created_at'),
+        ('updated_at', 'updated_at'),
+    )
+    datetime_fields = ('created_at', 'updated_at')
+    optional_fields = ('excerpt',)
+    # comment_count is part of the page ETag
+    required_fields = ('id', 'comment_count', 'created_at', 'updated_at')
+
+
+class CommentRowSerializer(RowSerializer):
+    # Same output as CommentSerializer, plus the thread path on request
+    fields = (
+        ('id', 'id'),
+        ('user', 'user__email'),
+        ('post_id', 'post_id'),
+        ('parent_id', 'parent_id'),
+        ('depth', 'depth'),
+        ('path', 'path'),
+        ('content', 'content'),
+        ('created_at', 'created_at'),
+        ('updated_at', 'updated_at'),
+    )
+    datetime_fields = ('created_at', 'updated_at')
+    optional_fields = ('path',)
+
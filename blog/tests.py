@@ -1,3 +1,1615 @@
-from django.test import TestCase
+import csv
+import json
+import logging
+import os
+import pstats
+import subprocess
+import sys
+import tempfile
+import threading
+import uuid
+from base64 import urlsafe_b64encode
+from datetime import date, datetime, time, timedelta, timezone as dt_timezone
+from decimal import Decimal
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock, skipIf
+from urllib.parse import urlencode
+from zoneinfo import ZoneInfo
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.handlers.asgi import ASGIHandler
+from django.core.management import CommandError, call_command
+from django.db import DEFAULT_DB_ALIAS, connections, router, transaction
+from django.db.utils import load_backend
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from django.utils.http import http_date
+from django.utils.translation import gettext_lazy
+from prometheus_client import REGISTRY, CollectorRegistry
+from prometheus_client.multiprocess import MultiProcessCollector
+from rest_framework.exceptions import ErrorDetail, ParseError
+from rest_framework.parsers import JSONParser
+from rest_framework.renderers import JSONRenderer
+from rest_framework import status
+from rest_framework.test import APITestCase
+
+try:
+    import fakeredis
+except ImportError:
+    fakeredis = None
+
+from account import urls as account_urls
+from account.authentication import user_changed
+from backend.parsers import FastJSONParser
+from backend.replicas import reset_health
+from backend.throttling import RedisBucketStore, get_store, stores
+from backend.renderers import FastJSONRenderer
+from account.models import CustomUser
+from account.tokens import UserAccessToken
+from . import urls as blog_urls
+from .cache import get_cached_post, post_cache_key
+from .counting import comment_count_key
+from .deletion import process_due_jobs, purge_account
+from .models import EXCERPT_LENGTH, Post, Comment, DeletionJob
+from .serializers import PostSerializer, CommentSerializer, PostRowSerializer, CommentRowSerializer
+from .threads import SEGMENT_WIDTH, check_max_depth
+from .views import cache_entries
+
+
+class BlogTestCase(APITestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = self.create_user('author@example.com')
+        self.other = self.create_user('reader@example.com')
+        self.post = Post.objects.create(user=self.user, title='Hello', content='World', is_published=True)
+
+    def create_user(self, email):
+        return CustomUser.objects.create_user(
+            email=email, password='password123', first_name='Test', last_name='User'
+        )
+
+    def login(self, user):
+        # Use a real token so the budgets include JWT authentication
+        self.client.credentials(HTTP_AUTHORIZATION=f'Bearer {UserAccessToken.for_user(user)}')
+
+
+class PostQueryBudgetTests(BlogTestCase):
+    def test_create_post(self):
+        self.login(self.user)
+        # insert, the token carries the user
+        with self.assertNumQueries(1):
+            response = self.client.post(reverse('create_post'), {'title': 'New', 'content': 'Post'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_list_posts(self):
+        Post.objects.bulk_create([
+            Post(user=self.user, title=f'Post {i}', content='Body') for i in range(20)
+        ])
+        self.login(self.user)
+        # count + page, independent of page size
+        for page_size in (5, 20):
+            with self.assertNumQueries(2):
+                response = self.client.get(reverse('list_posts'), {'page_size': page_size})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(response.data['results']), page_size)
+
+    def test_list_posts_cursor(self):
+        Post.objects.bulk_create([
+            Post(user=self.user, title=f'Post {i}', content='Body') for i in range(20)
+        ])
+        self.login(self.user)
+        # page, no count
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('list_posts'), {'cursor': ''})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        with self.assertNumQueries(1):
+            response = self.client.get(response.data['next'])
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_list_posts_only_returns_own_posts(self):
+        Post.objects.create(user=self.other, title='Other', content='Body')
+        self.login(self.user)
+        response = self.client.get(reverse('list_posts'))
+        self.assertEqual([post['id'] for post in response.data['results']], [self.post.id])
+
+    def test_view_post(self):
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('view_post', args=[self.post.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_update_post(self):
+        self.login(self.user)
+        # fetch + update
+        with self.assertNumQueries(2):
+            response = self.client.put(reverse('update_post', args=[self.post.id]), {'title': 'Changed'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_update_post_by_other_user_is_forbidden(self):
+        self.login(self.other)
+        with self.assertNumQueries(1):
+            response = self.client.put(reverse('update_post', args=[self.post.id]), {'title': 'Changed'})
+        self.assertEqual(response.status_code, status.HTTP_403_FORBIDDEN)
+
+    def test_delete_post(self):
+        Comment.objects.bulk_create([
+            Comment(user=self.other, post=self.post, content=f'Comment {i}') for i in range(10)
+        ])
+        self.login(self.user)
+        # fetch + savepoint, mark deleted, queue the job, release; the
+        # comments go in the background
+        with self.assertNumQueries(5):
+            response = self.client.delete(reverse('delete_post', args=[self.post.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertFalse(Post.objects.exists())
+        process_due_jobs()
+        self.assertFalse(Post.all_objects.exists())
+        self.assertFalse(Comment.all_objects.exists())
+
+
+class KeysetPaginationTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        Post.objects.bulk_create([Post(user=self.user, title=f'Post {i}', content='Body') for i in range(6)])
+        # all at the same time, so every page boundary is a tie broken on id
+        Post.objects.update(created_at=timezone.now())
+        self.ids = sorted(Post.objects.values_list('id', flat=True), reverse=True)
+        self.login(self.user)
+
+    def walk(self, url, link):
+        pages = []
+        while url:
+            response = self.client.get(url)
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            pages.append([post['id'] for post in response.data['results']])
+            url = response.data[link]
+        return pages, response
+
+    def cursor(self, *payload):
+        return urlsafe_b64encode(json.dumps(payload).encode()).decode().rstrip('=')
+
+    def test_walks_forward_and_back(self):
+        first = self.client.get(reverse('list_posts'), {'cursor': '', 'page_size': 3})
+        self.assertNotIn('count', first.data)
+        self.assertIsNone(first.data['previous'])
+        pages, last = self.walk(first.data['next'], 'next')
+        pages.insert(0, [post['id'] for post in first.data['results']])
+        self.assertEqual(pages, [self.ids[:3], self.ids[3:6], self.ids[6:]])
+
+        # back from the last page, through the previous links
+        back, first_again = self.walk(last.data['previous'], 'previous')
+        self.assertEqual(back, [self.ids[3:6], self.ids[:3]])
+        self.assertIsNone(first_again.data['previous'])
+        self.assertIsNotNone(first_again.data['next'])
+
+    def test_follows_the_ordering(self):
+        url = reverse('list_posts') + '?' + urlencode({'cursor': '', 'page_size': 4, 'ordering': 'created_at'})
+        pages, _ = self.walk(url, 'next')
+        self.assertEqual(pages, [self.ids[::-1][:4], self.ids[::-1][4:]])
+
+    def test_invalid_cursors(self):
+        created_at = Post.objects.get(id=self.ids[0]).created_at.isoformat()
+        cursors = [
+            'nope',
+            urlsafe_b64encode(b'not json').decode(),
+            self.cursor('-created_at', created_at),
+            self.cursor('-created_at', '2024-13-01T00:00:00+00:00', self.ids[0], 0),
+            self.cursor('-created_at', 'yesterday', self.ids[0], 0),
+            self.cursor('-created_at', created_at, 2 ** 64, 0),
+            # issued under another ordering, or direction
+            self.cursor('-updated_at', created_at, self.ids[0], 0),
+            self.cursor('created_at', created_at, self.ids[0], 0),
+        ]
+        for cursor in cursors:
+            response = self.client.get(reverse('list_posts'), {'cursor': cursor})
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND, cursor)
+        response = self.client.get(reverse('list_posts'), {'cursor': self.cursor('-created_at', created_at, self.ids[0], 0)})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class PostCacheTests(BlogTestCase):
+    def test_view_post_is_served_from_cache(self):
+        url = reverse('view_post', args=[self.post.id])
+        with self.assertNumQueries(1):
+            first = self.client.get(url)
+        with self.assertNumQueries(0):
+            second = self.client.get(url)
+        self.assertEqual(first.data, second.data)
+
+    def test_missing_post_is_not_cached(self):
+        response = self.client.get(reverse('view_post', args=[0]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertIsNone(cache.get(post_cache_key(0)))
+
+    def test_update_post_invalidates_entry(self):
+        url = reverse('view_post', args=[self.post.id])
+        self.client.get(url)
+        self.login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(reverse('update_post', args=[self.post.id]), {'title': 'Changed'})
+        self.assertIsNone(cache.get(post_cache_key(self.post.id)))
+        self.assertEqual(self.client.get(url).data['post']['title'], 'Changed')
+
+    @override_settings(DELETION_IN_PROCESS=False)
+    def test_delete_post_invalidates_entry(self):
+        url = reverse('view_post', args=[self.post.id])
+        self.client.get(url)
+        self.login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse('delete_post', args=[self.post.id]))
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_concurrent_misses_fill_once(self):
+        calls = []
+        barrier = threading.Barrier(8)
+
+        def fill():
+            calls.append(1)
+            threading.Event().wait(0.1)
+            return {'id': 42}
+
+        def read(results):
+            barrier.wait()
+            results.append(get_cached_post(42, fill))
+
+        results = []
+        threads = [threading.Thread(target=read, args=(results,)) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEqual(len(calls), 1)
+        self.assertEqual(results, [{'id': 42}] * 8)
+
+
+class ViewPostsTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.posts = [self.post] + [
+            Post.objects.create(user=self.other, title=f'Post {i}', content='Body') for i in range(3)
+        ]
+
+    def test_posts_are_keyed_by_id_with_missing_ones_marked(self):
+        ids = [post.id for post in self.posts]
+        missing = max(ids) + 1
+        # one in_bulk for all of them
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('view_posts'), {'ids': f'{ids[1]},{missing},{ids[0]},{ids[1]}'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(list(response.data['posts']), [str(ids[1]), str(missing), str(ids[0])])
+        self.assertEqual(response.data['posts'][str(ids[0])], PostSerializer(self.post).data)
+        self.assertIsNone(response.data['posts'][str(missing)])
+        self.assertEqual(response.data['not_found'], [missing])
+
+    def test_shares_the_single_post_cache(self):
+        self.client.get(reverse('view_post', args=[self.post.id]))
+        ids = ','.join(str(post.id) for post in self.posts)
+        # the misses only
+        with mock.patch('blog.views.cache_entries', wraps=cache_entries) as fill:
+            self.client.get(reverse('view_posts'), {'ids': ids})
+        fill.assert_called_once_with([post.id for post in self.posts[1:]])
+        with self.assertNumQueries(0):
+            response = self.client.get(reverse('view_posts'), {'ids': ids})
+        self.assertEqual(response.data['not_found'], [])
+        # and fills it for the single post view
+        with self.assertNumQueries(0):
+            self.client.get(reverse('view_post', args=[self.posts[-1].id]))
+
+    def test_deleted_posts_are_not_found(self):
+        Post.objects.filter(id=self.posts[-1].id).update(deleted_at=timezone.now())
+        response = self.client.get(reverse('view_posts'), {'ids': str(self.posts[-1].id)})
+        self.assertEqual(response.data['not_found'], [self.posts[-1].id])
+
+    @override_settings(POST_VIEW_MAX_IDS=3)
+    def test_invalid_ids_are_rejected(self):
+        for ids in ('', 'a,b', '1,2,3,4', ',,', '0', '-1', str(2 ** 63), '99999999999999999999'):
+            response = self.client.get(reverse('view_posts'), {'ids': ids})
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, ids)
+        # the largest id the column holds is merely not found
+        response = self.client.get(reverse('view_posts'), {'ids': str(2 ** 63 - 1)})
+        self.assertEqual(response.data['not_found'], [2 ** 63 - 1])
+
+
+class ConditionalGetTests(BlogTestCase):
+    def test_view_post_not_modified(self):
+        url = reverse('view_post', args=[self.post.id])
+        response = self.client.get(url)
+        etag = response['ETag']
+        cache.clear()
+        # updated_at only, no full row and no serialization
+        with self.assertNumQueries(1):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.assertEqual(response['ETag'], etag)
+
+    def test_view_post_not_modified_from_cache(self):
+        url = reverse('view_post', args=[self.post.id])
+        response = self.client.get(url)
+        with self.assertNumQueries(0):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_new_comment_is_not_hidden_by_a_304(self):
+        urls = [
+            reverse('view_post', args=[self.post.id]),
+            reverse('view_post_async', args=[self.post.id]),
+            reverse('list_comments', args=[self.post.id]),
+            reverse('list_comments_async', args=[self.post.id]),
+        ]
+        before = {url: self.client.get(url) for url in urls}
+        self.login(self.other)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.post(reverse('create_comment', args=[self.post.id]), {'content': 'New'})
+        # the comment does not touch the post's updated_at, so no Last-Modified
+        # is sent and If-Modified-Since cannot answer 304
+        for url, response in before.items():
+            self.assertNotIn('Last-Modified', response)
+            response = self.client.get(
+                url, HTTP_IF_NONE_MATCH=response['ETag'], HTTP_IF_MODIFIED_SINCE=http_date(timezone.now().timestamp() + 60)
+            )
+            self.assertEqual(response.status_code, status.HTTP_200_OK, url)
+            response = self.client.get(url, HTTP_IF_MODIFIED_SINCE=http_date(timezone.now().timestamp() + 60))
+            self.assertEqual(response.status_code, status.HTTP_200_OK, url)
+
+    def test_view_post_etag_changes_on_update(self):
+        url = reverse('view_post', args=[self.post.id])
+        etag = self.client.get(url)['ETag']
+        self.login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.put(reverse('update_post', args=[self.post.id]), {'title': 'Changed'})
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertNotEqual(response['ETag'], etag)
+
+    def test_list_posts_not_modified(self):
+        self.login(self.user)
+        url = reverse('list_posts')
+        etag = self.client.get(url)['ETag']
+        # count + page validators, the posts are never loaded
+        with self.assertNumQueries(2):
+            response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        Post.objects.create(user=self.user, title='New', content='Post')
+        response = self.client.get(url, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['count'], 2)
+
+    def test_list_comments_not_modified(self):
+        comment = Comment.objects.create(user=self.other, post=self.post, content='First')
+        url = reverse('list_comments', args=[self.post.id])
+        response = self.client.get(url, {'cursor': ''})
+        etag = response['ETag']
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'cursor': ''}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+        comment.content = 'Edited'
+        comment.save()
+        response = self.client.get(url, {'cursor': ''}, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['results'][0]['content'], 'Edited')
+
+
+class CommentQueryBudgetTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.comment = Comment.objects.create(user=self.other, post=self.post, content='First')
+
+    def test_create_comment(self):
+        self.login(self.other)
+        # post + savepoint, insert, path, counter update, release
+        with self.assertNumQueries(6):
+            response = self.client.post(reverse('create_comment', args=[self.post.id]), {'content': 'Hi'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+
+    def test_list_comments(self):
+        users = [self.create_user(f'commenter{i}@example.com') for i in range(10)]
+        Comment.objects.bulk_create([
+            Comment(user=user, post=self.post, content='Hi') for user in users
+        ])
+        # post + count + page with authors joined, independent of page size
+        for page_size in (5, 10):
+            with self.assertNumQueries(3):
+                response = self.client.get(reverse('list_comments', args=[self.post.id]), {'page_size': page_size})
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            self.assertEqual(len(response.data['results']), page_size)
+        self.assertTrue(all('@example.com' in comment['user'] for comment in response.data['results']))
+
+    def test_list_comments_cursor(self):
+        # post + page
+        with self.assertNumQueries(2):
+            response = self.client.get(reverse('list_comments', args=[self.post.id]), {'cursor': ''})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+    def test_update_comment(self):
+        self.login(self.other)
+        # comment with author + update
+        with self.assertNumQueries(2):
+            response = self.client.put(reverse('update_comment', args=[self.comment.id]), {'content': 'Edited'})
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.data['comment']['user'], self.other.email)
+
+    def test_delete_comment(self):
+        self.login(self.other)
+        # fetch + savepoint, delete, counter update, release
+        with self.assertNumQueries(5):
+            response = self.client.delete(reverse('delete_comment', args=[self.comment.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+
+
+class CommentCountTests(BlogTestCase):
+    def test_comment_writes_maintain_count(self):
+        self.login(self.other)
+        for content in ('One', 'Two'):
+            self.client.post(reverse('create_comment', args=[self.post.id]), {'content': content})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 2)
+
+        comment = Comment.objects.filter(post=self.post).first()
+        self.client.delete(reverse('delete_comment', args=[comment.id]))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 1)
+
+    def test_count_is_serialized_without_extra_queries(self):
+        self.login(self.other)
+        self.client.post(reverse('create_comment', args=[self.post.id]), {'content': 'Hi'})
+        self.client.credentials()
+        with self.assertNumQueries(1):
+            response = self.client.get(reverse('view_post', args=[self.post.id]))
+        self.assertEqual(response.data['post']['comment_count'], 1)
+
+    def test_delete_account_releases_counts_on_other_posts(self):
+        self.login(self.other)
+        self.client.post(reverse('create_comment', args=[self.post.id]), {'content': 'Hi'})
+        self.client.delete(reverse('delete_account'))
+        process_due_jobs()
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 0)
+
+    def test_reconcile_repairs_drift(self):
+        Comment.objects.create(user=self.other, post=self.post, content='Hi')
+        drifted = Post.objects.create(user=self.user, title='Drifted', content='Body', comment_count=7)
+        out = StringIO()
+        call_command('reconcile_comment_counts', stdout=out)
+        self.post.refresh_from_db()
+        drifted.refresh_from_db()
+        self.assertEqual((self.post.comment_count, drifted.comment_count), (1, 0))
+        self.assertIn('Repaired 2 drifted post(s)', out.getvalue())
+
+
+class DeletionTests(BlogTestCase):
+    def test_deleted_post_is_hidden_before_it_is_purged(self):
+        Comment.objects.create(user=self.other, post=self.post, content='Hi')
+        self.login(self.user)
+        self.client.delete(reverse('delete_post', args=[self.post.id]))
+        self.client.credentials()
+        response = self.client.get(reverse('view_post', args=[self.post.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertTrue(Comment.all_objects.exists())
+        self.assertEqual(DeletionJob.objects.get().status, DeletionJob.PENDING)
+
+    def test_comments_of_a_deleted_post_are_hidden(self):
+        comment = Comment.objects.create(user=self.other, post=self.post, content='Hi')
+        self.login(self.user)
+        self.client.delete(reverse('delete_post', args=[self.post.id]))
+        self.login(self.other)
+        response = self.client.get(reverse('view_comment_thread', args=[comment.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.put(reverse('update_comment', args=[comment.id]), {'content': 'Edited'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        response = self.client.delete(reverse('delete_comment', args=[comment.id]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+        self.assertEqual(Comment.all_objects.get().content, 'Hi')
+
+    def test_deleted_account_is_hidden_before_it_is_purged(self):
+        other_post = Post.objects.create(user=self.other, title='Other', content='Body', is_published=True)
+        Comment.objects.create(user=self.user, post=other_post, content='Hi')
+        self.login(self.user)
+        self.client.delete(reverse('delete_account'))
+        self.assertFalse(Post.objects.filter(user=self.user).exists())
+        self.assertFalse(Comment.objects.exists())
+        self.user.refresh_from_db()
+        self.assertFalse(self.user.is_active)
+        self.assertIsNotNone(self.user.deleted_at)
+
+    def test_purge_runs_in_batches_and_records_progress(self):
+        Comment.objects.bulk_create([
+            Comment(user=self.other, post=self.post, content=f'Comment {i}') for i in range(25)
+        ])
+        self.login(self.user)
+        self.client.delete(reverse('delete_post', args=[self.post.id]))
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as queries:
+            self.assertEqual(process_due_jobs(size=10), 1)
+        deletes = [q['sql'] for q in queries if q['sql'].startswith('DELETE FROM "blog_comment"')]
+        # 10 + 10 + 5, then the post's (empty) cascade
+        self.assertEqual(len(deletes), 4)
+        job = DeletionJob.objects.get()
+        self.assertEqual((job.status, job.rows_deleted, job.attempts), (DeletionJob.DONE, 26, 1))
+        self.assertIsNotNone(job.finished_at)
+
+    def test_account_purge_releases_counts_in_batches(self):
+        posts = Post.objects.bulk_create([
+            Post(user=self.other, title=f'Post {i}', content='Body') for i in range(3)
+        ])
+        Comment.objects.bulk_create([
+            Comment(user=self.user, post=post, content='Hi') for post in posts for _ in range(2)
+        ])
+        Post.objects.filter(user=self.other).update(comment_count=2)
+        Comment.objects.create(user=self.other, post=self.post, content='Hi')
+        self.login(self.user)
+        self.client.delete(reverse('delete_account'))
+        process_due_jobs(size=4)
+        self.assertEqual(list(Post.objects.filter(user=self.other).values_list('comment_count', flat=True)), [0, 0, 0])
+        self.assertFalse(CustomUser.objects.filter(pk=self.user.pk).exists())
+        self.assertEqual(Comment.all_objects.count(), 0)
+        self.assertEqual(DeletionJob.objects.get().rows_deleted, 9)
+
+    def test_account_purge_bounds_the_replies_to_its_comments(self):
+        other_post = Post.objects.create(user=self.other, title='Busy', content='Body', is_published=True)
+        root = Comment.objects.create(user=self.user, post=other_post, content='Hi')
+        parent = Comment.objects.create(user=self.other, post=other_post, parent=root, content='Reply')
+        Comment.objects.bulk_create([
+            Comment(user=self.other, post=other_post, parent=parent, content=f'Reply {i}') for i in range(12)
+        ])
+        Post.objects.filter(pk=other_post.pk).update(comment_count=14)
+        self.login(self.user)
+        self.client.delete(reverse('delete_account'))
+        batches = []
+
+        def purge(user_id, size):
+            batches.append(purge_account(user_id, size))
+            return batches[-1]
+
+        with mock.patch('blog.deletion.purge_account', side_effect=purge):
+            process_due_jobs(size=5)
+        # the replies' replies, deepest first, then the reply and the comment
+        self.assertEqual([deleted for deleted, _ in batches[:3]], [5, 5, 4])
+        self.assertEqual(Post.objects.get(pk=other_post.pk).comment_count, 0)
+        self.assertFalse(Comment.all_objects.filter(post=other_post).exists())
+
+    @override_settings(DELETION_MAX_ATTEMPTS=2, DELETION_RETRY_DELAY=60)
+    def test_failed_job_is_retried_with_backoff(self):
+        self.login(self.user)
+        self.client.delete(reverse('delete_post', args=[self.post.id]))
+        with mock.patch('blog.deletion.purge_post', side_effect=RuntimeError('lock timeout')), \
+                self.assertLogs('blog.deletion', 'ERROR'):
+            process_due_jobs()
+            job = DeletionJob.objects.get()
+            self.assertEqual((job.status, job.attempts), (DeletionJob.PENDING, 1))
+            self.assertIn('lock timeout', job.last_error)
+            self.assertGreater(job.run_after, timezone.now())
+            # Not due yet
+            self.assertEqual(process_due_jobs(), 0)
+            DeletionJob.objects.update(run_after=timezone.now())
+            process_due_jobs()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (DeletionJob.FAILED, 2))
+        self.assertTrue(Post.all_objects.exists())
+
+    def test_stale_running_job_is_taken_over(self):
+        self.login(self.user)
+        self.client.delete(reverse('delete_post', args=[self.post.id]))
+        stale = timezone.now() - timedelta(hours=1)
+        DeletionJob.objects.update(status=DeletionJob.RUNNING, updated_at=stale)
+        out = StringIO()
+        call_command('process_deletions', stdout=out)
+        self.assertIn('Ran 1 deletion job(s)', out.getvalue())
+        self.assertEqual(DeletionJob.objects.get().status, DeletionJob.DONE)
+        self.assertFalse(Post.all_objects.exists())
+
+
+class FeedTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.posts = [self.post] + [
+            Post.objects.create(user=self.other, title=f'Post {i}', content='Body', is_published=True)
+            for i in range(6)
+        ]
+        self.draft = Post.objects.create(user=self.user, title='Draft', content='Body')
+
+    def feed_ids(self, url=None, **params):
+        response = self.client.get(url or reverse('feed'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [post['id'] for post in response.data['results']], response.data['next']
+
+    def newest_first(self, posts):
+        return [post.id for post in sorted(posts, key=lambda post: (post.created_at, post.id), reverse=True)]
+
+    def read_feed(self, page_size):
+        seen = []
+        ids, next_url = self.feed_ids(page_size=page_size)
+        while True:
+            seen += ids
+            if next_url is None:
+                return seen
+            ids, next_url = self.feed_ids(next_url)
+
+    def test_feed_pages_published_posts_newest_first(self):
+        self.assertEqual(self.read_feed(3), self.newest_first(self.posts))
+
+    def test_cached_timeline_and_posts_are_read_in_two_queries_at_most(self):
+        self.feed_ids()
+        # timeline and posts cached
+        with self.assertNumQueries(0):
+            self.feed_ids()
+        cache.delete_many([post_cache_key(post.id) for post in self.posts])
+        # the misses in one in_bulk
+        with self.assertNumQueries(1):
+            self.feed_ids()
+
+    def test_writes_update_the_timeline_in_place(self):
+        self.feed_ids()
+        self.login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            created = self.client.post(reverse('create_post'), {'title': 'New', 'content': 'Body', 'is_published': True})
+            self.client.put(reverse('update_post', args=[self.draft.id]), {'is_published': True})
+            self.client.put(reverse('update_post', args=[self.post.id]), {'is_published': False})
+        with self.assertNumQueries(1):
+            ids, _ = self.feed_ids(page_size=100)
+        self.assertEqual(ids[0], created.data['post']['id'])
+        self.assertIn(self.draft.id, ids)
+        self.assertNotIn(self.post.id, ids)
+
+    @override_settings(DELETION_IN_PROCESS=False)
+    def test_deleted_post_leaves_the_timeline(self):
+        self.feed_ids()
+        self.login(self.other)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse('delete_post', args=[self.posts[-1].id]))
+        ids, _ = self.feed_ids(page_size=100)
+        self.assertEqual(ids, self.newest_first(self.posts[:-1]))
+
+    def test_pages_past_a_bounded_timeline_come_from_the_database(self):
+        # 3 from the timeline, 1 from the timeline and 2 from the database, 1
+        with mock.patch('blog.feed.FEED_SIZE', 4):
+            self.assertEqual(self.read_feed(3), self.newest_first(self.posts))
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('feed'), {'cursor': 'nope'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class CommentThreadTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.login(self.other)
+
+    def reply(self, parent=None, content='Hi'):
+        data = {'content': content}
+        if parent is not None:
+            data['parent'] = parent['id'] if isinstance(parent, dict) else parent.id
+        response = self.client.post(reverse('create_comment', args=[self.post.id]), data)
+        return response.data.get('comment', response.data)
+
+    def build(self):
+        # a
+        # ├── a1
+        # │   └── a11
+        # └── a2
+        # b
+        # c
+        # └── c1
+        a = self.reply(content='a')
+        a1 = self.reply(a, 'a1')
+        b = self.reply(content='b')
+        a11 = self.reply(a1, 'a11')
+        a2 = self.reply(a, 'a2')
+        c = self.reply(content='c')
+        c1 = self.reply(c, 'c1')
+        return a, a1, a11, a2, b, c, c1
+
+    def contents(self, rows):
+        return [row['content'] for row in rows]
+
+    def test_replies_get_paths_and_depths(self):
+        a, a1, a11, *_ = self.build()
+        self.assertEqual((a1['parent_id'], a1['depth'], a11['depth']), (a['id'], 1, 2))
+        comment = Comment.objects.get(id=a11['id'])
+        self.assertEqual(comment.path, ''.join(f'{pk:010d}' for pk in (a['id'], a1['id'], a11['id'])))
+
+    def test_subtree_is_depth_first_and_paged(self):
+        a, *_ = self.build()
+        url = reverse('view_comment_thread', args=[a['id']])
+        # root + page
+        with self.assertNumQueries(2):
+            response = self.client.get(url, {'page_size': 3})
+        self.assertEqual(self.contents(response.data['results']), ['a', 'a1', 'a11'])
+        response = self.client.get(response.data['next'])
+        self.assertEqual(self.contents(response.data['results']), ['a2'])
+        self.assertIsNone(response.data['next'])
+        response = self.client.get(url, {'depth': 1})
+        self.assertEqual(self.contents(response.data['results']), ['a', 'a1', 'a2'])
+
+    def test_threads_page_whole_roots_with_their_first_replies(self):
+        self.build()
+        url = reverse('list_comment_threads', args=[self.post.id])
+        # post + roots + replies
+        with self.assertNumQueries(3):
+            response = self.client.get(url, {'page_size': 2, 'replies': 2})
+        a, b = response.data['results']
+        self.assertEqual(self.contents(a['replies']), ['a1', 'a11'])
+        self.assertTrue(a['more_replies'])
+        self.assertEqual((b['replies'], b['more_replies']), ([], False))
+        response = self.client.get(response.data['next'])
+        [c] = response.data['results']
+        self.assertEqual(self.contents(c['replies']), ['c1'])
+        self.assertIsNone(response.data['next'])
+        response = self.client.get(url, {'depth': 1, 'replies': 5, 'fields': 'content'})
+        self.assertEqual(response.data['results'][0]['replies'], [{'content': 'a1'}, {'content': 'a2'}])
+
+    @override_settings(COMMENT_MAX_DEPTH=2)
+    def test_depth_limit(self):
+        a, a1, a11, *_ = self.build()
+        response = self.client.post(reverse('create_comment', args=[self.post.id]), {'content': 'x', 'parent': a11['id']})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_parent_must_be_on_the_same_post(self):
+        other_post = Post.objects.create(user=self.user, title='Other', content='Body', is_published=True)
+        foreign = Comment.objects.create(user=self.other, post=other_post, content='Elsewhere')
+        response = self.client.post(reverse('create_comment', args=[self.post.id]), {'content': 'x', 'parent': foreign.id})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+    def test_deleting_a_comment_deletes_its_replies(self):
+        a, *_ = self.build()
+        self.client.delete(reverse('delete_comment', args=[a['id']]))
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.comment_count, 3)
+        self.assertEqual(sorted(Comment.objects.values_list('content', flat=True)), ['b', 'c', 'c1'])
+
+    def test_account_purge_takes_replies_to_its_comments(self):
+        other_post = Post.objects.create(user=self.other, title='Other', content='Body', is_published=True)
+        mine = Comment.objects.create(user=self.user, post=other_post, content='mine')
+        Comment.objects.create(user=self.other, post=other_post, parent=mine, content='answer')
+        kept = Comment.objects.create(user=self.other, post=other_post, content='kept')
+        Post.objects.filter(id=other_post.id).update(comment_count=3)
+        self.login(self.user)
+        self.client.delete(reverse('delete_account'))
+        process_due_jobs(size=1)
+        other_post.refresh_from_db()
+        self.assertEqual(other_post.comment_count, 1)
+        self.assertEqual(list(Comment.all_objects.all()), [kept])
+
+    def test_invalid_cursor(self):
+        response = self.client.get(reverse('list_comment_threads', args=[self.post.id]), {'cursor': '12'})
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_ids_past_the_segment_width_are_refused(self):
+        pk = 10 ** SEGMENT_WIDTH
+        with self.assertRaises(ValueError), transaction.atomic():
+            Comment(user=self.other, post=self.post, content='Hi', id=pk).save()
+        with self.assertRaises(ValueError), transaction.atomic():
+            Comment.objects.bulk_create([Comment(user=self.other, post=self.post, content='Hi', id=pk)])
+        # rolled back with their paths
+        self.assertFalse(Comment.all_objects.filter(id=pk).exists())
+
+    def test_max_depth_must_fit_the_path_column(self):
+        self.assertEqual(check_max_depth(), [])
+        with override_settings(COMMENT_MAX_DEPTH=25):
+            self.assertEqual([error.id for error in check_max_depth()], ['blog.E001'])
+
+    def test_widest_id_has_a_subtree(self):
+        root = Comment.objects.create(user=self.other, post=self.post, content='root', id=10 ** SEGMENT_WIDTH - 1)
+        # ids after it would not fit, take a smaller one
+        Comment.objects.create(user=self.other, post=self.post, parent=root, content='reply', id=1)
+        response = self.client.get(reverse('view_comment_thread', args=[root.id]))
+        self.assertEqual(self.contents(response.data['results']), ['root', 'reply'])
+        response = self.client.get(reverse('list_comment_threads', args=[self.post.id]))
+        self.assertEqual(self.contents(response.data['results'][0]['replies']), ['reply'])
+
+
+class PaginationCountTests(BlogTestCase):
+    def comment(self, n):
+        Comment.objects.bulk_create([Comment(user=self.other, post=self.post, content='Hi') for _ in range(n)])
+
+    def count(self, name, *args, **params):
+        response = self.client.get(reverse(name, args=args), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        data = response.json()
+        return data['count'], data['count_exact']
+
+    def test_small_counts_are_exact(self):
+        self.comment(3)
+        self.assertEqual(self.count('list_comments', self.post.id), (3, True))
+        # nothing was cached below the limit
+        self.comment(1)
+        self.assertEqual(self.count('list_comments', self.post.id), (4, True))
+
+    @override_settings(DELETION_IN_PROCESS=False)
+    @mock.patch('blog.counting.EXACT_COUNT_LIMIT', 2)
+    def test_comment_counts_are_cached_until_a_comment_changes(self):
+        self.comment(3)
+        self.assertEqual(self.count('list_comments', self.post.id), (3, True))
+        # written past the views: the cached count stands
+        self.comment(1)
+        self.assertEqual(self.count('list_comments', self.post.id), (3, True))
+        self.assertEqual(self.count('list_comments_async', self.post.id), (3, True))
+        # filtered lists are counted each time
+        self.assertEqual(self.count('list_comments', self.post.id, user=self.other.id), (4, True))
+
+        self.login(self.other)
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.post(reverse('create_comment', args=[self.post.id]), {'content': 'New'})
+        self.assertEqual(self.count('list_comments', self.post.id), (5, True))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse('delete_comment', args=[response.data['comment']['id']]))
+        self.assertEqual(self.count('list_comments_async', self.post.id), (4, True))
+
+        # hiding a deleted account's comments changes the count too
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse('delete_account'))
+        self.client.credentials()
+        self.assertEqual(self.count('list_comments', self.post.id), (0, True))
+
+    @override_settings(DELETION_IN_PROCESS=False)
+    @mock.patch('blog.counting.EXACT_COUNT_LIMIT', 2)
+    def test_deleting_the_post_drops_its_cached_count(self):
+        self.comment(3)
+        self.client.get(reverse('list_comments', args=[self.post.id]))
+        self.assertEqual(cache.get(comment_count_key(self.post.id)), 3)
+        self.login(self.user)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.delete(reverse('delete_post', args=[self.post.id]))
+        self.assertIsNone(cache.get(comment_count_key(self.post.id)))
+        # and again once the rows are gone, in case it was refilled meanwhile
+        cache.set(comment_count_key(self.post.id), 3)
+        with self.captureOnCommitCallbacks(execute=True):
+            process_due_jobs()
+        self.assertIsNone(cache.get(comment_count_key(self.post.id)))
+
+    @mock.patch('blog.counting.EXACT_COUNT_LIMIT', 2)
+    @mock.patch('blog.counting.planner_estimate', return_value=1)
+    def test_estimated_counts_reach_every_page(self, planner_estimate):
+        Post.objects.bulk_create([Post(user=self.user, title=f'Post {i}', content='Body') for i in range(6)])
+        self.login(self.user)
+        # never below the rows counted exactly
+        self.assertEqual(self.count('list_posts'), (3, False))
+        self.assertEqual(self.count('list_posts_async'), (3, False))
+
+        for name in ('list_posts', 'list_posts_async'):
+            page = self.client.get(reverse(name), {'page_size': 3, 'page': 2}).json()
+            self.assertEqual(len(page['results']), 3)
+            self.assertIsNotNone(page['next'])
+            page = self.client.get(reverse(name), {'page_size': 3, 'page': 3}).json()
+            self.assertEqual(len(page['results']), 1)
+            self.assertIsNone(page['next'])
+            response = self.client.get(reverse(name), {'page_size': 3, 'page': 4})
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class SearchPostTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.title_hit = Post.objects.create(user=self.other, title='Django performance', content='Notes', is_published=True)
+        self.content_hit = Post.objects.create(user=self.other, title='Notes', content='Tuning django queries', is_published=True)
+        self.draft = Post.objects.create(user=self.other, title='Django draft', content='Unpublished', is_published=False)
+        self.own_draft = Post.objects.create(user=self.user, title='My django draft', content='Mine', is_published=False)
+        self.login(self.user)
+
+    def search(self, **params):
+        return self.client.get(reverse('search_posts'), params)
+
+    def test_ranked_results_include_own_drafts_only(self):
+        # count + page
+        with self.assertNumQueries(2):
+            response = self.search(q='django')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        ids = [post['id'] for post in response.data['results']]
+        self.assertEqual(set(ids), {self.title_hit.id, self.content_hit.id, self.own_draft.id})
+        self.assertLess(ids.index(self.title_hit.id), ids.index(self.content_hit.id))
+
+    def test_combines_with_published_filter_and_pagination(self):
+        response = self.search(q='django', is_published='true', page_size=1)
+        self.assertEqual(response.data['count'], 2)
+        self.assertEqual(len(response.data['results']), 1)
+        self.assertIsNotNone(response.data['next'])
+
+    def test_index_follows_updates_and_deletes(self):
+        self.title_hit.title = 'Flask performance'
+        self.title_hit.save()
+        self.content_hit.delete()
+        response = self.search(q='django', is_published='true')
+        self.assertEqual(response.data['count'], 0)
+        response = self.search(q='flask')
+        self.assertEqual([post['id'] for post in response.data['results']], [self.title_hit.id])
+
+    def test_other_databases_fall_back_to_icontains(self):
+        connection = connections[DEFAULT_DB_ALIAS]
+        with mock.patch.object(connection, 'vendor', 'mysql'):
+            response = self.search(q='django')
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            ids = [post['id'] for post in response.data['results']]
+            self.assertEqual(set(ids), {self.title_hit.id, self.content_hit.id, self.own_draft.id})
+            self.assertLess(ids.index(self.title_hit.id), ids.index(self.content_hit.id))
+            self.assertEqual(self.search(q='django tuning').data['count'], 1)
+            self.assertEqual(self.search(q='"*').data['count'], 0)
+
+    def test_query_syntax_is_not_interpreted(self):
+        response = self.search(q='django" OR (NEAR')
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(self.search(q='"*').data['count'], 0)
+
+    def test_query_is_required(self):
+        self.assertEqual(self.search(q=' ').status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class BatchCreatePostTests(BlogTestCase):
+    def test_batch_is_inserted_with_one_query(self):
+        self.login(self.user)
+        posts = [{'title': f'Post {i}', 'content': 'Body'} for i in range(50)]
+        # savepoint, bulk insert, release
+        with self.assertNumQueries(3):
+            response = self.client.post(reverse('create_posts_batch'), posts, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(len(response.data['posts']), 50)
+        self.assertTrue(all(post['id'] for post in response.data['posts']))
+        self.assertEqual(Post.objects.filter(user=self.user).count(), 51)
+
+    def test_per_item_errors_reject_the_batch(self):
+        self.login(self.user)
+        posts = [{'title': 'Fine', 'content': 'Body'}, {'title': 'No content'}, {'content': 'No title'}]
+        response = self.client.post(reverse('create_posts_batch'), posts, format='json')
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+        self.assertEqual([error['index'] for error in response.data['error']], [1, 2])
+        self.assertIn('content', response.data['error'][0]['errors'])
+        self.assertEqual(Post.objects.filter(user=self.user).count(), 1)
+
+    def test_payload_must_be_a_non_empty_list(self):
+        self.login(self.user)
+        for payload in ({'title': 'Not a list', 'content': 'Body'}, []):
+            response = self.client.post(reverse('create_posts_batch'), payload, format='json')
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+            self.assertIn('non_field_errors', response.data['error'])
+
+
+class ExportPostTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.second = Post.objects.create(user=self.user, title='Second, "quoted"', content='Line\nbreak')
+        Post.objects.create(user=self.other, title='Not mine', content='Body')
+        Comment.objects.create(user=self.other, post=self.post, content='First')
+        Comment.objects.create(user=self.user, post=self.post, content='Second')
+        self.login(self.user)
+
+    def export(self, **params):
+        response = self.client.get(reverse('export_posts'), params)
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response.streaming)
+        return b''.join(response.streaming_content).decode()
+
+    def test_ndjson(self):
+        lines = self.export().splitlines()
+        posts = [json.loads(line) for line in lines]
+        self.assertEqual([post['id'] for post in posts], [self.post.id, self.second.id])
+        self.assertEqual(posts[0], PostSerializer(self.post).data)
+        self.assertNotIn('comments', posts[0])
+
+    def test_ndjson_with_comments(self):
+        # posts cursor + comments cursor
+        with self.assertNumQueries(2):
+            content = self.export(comments='true')
+        posts = [json.loads(line) for line in content.splitlines()]
+        self.assertEqual([c['content'] for c in posts[0]['comments']], ['First', 'Second'])
+        self.assertEqual(posts[0]['comments'][0]['user'], self.other.email)
+        self.assertNotIn('comments', posts[1])
+
+    def test_csv_with_comments(self):
+        rows = list(csv.reader(StringIO(self.export(output='csv', comments='1'))))
+        self.assertEqual(rows[0][:3], ['type', 'id', 'post_id'])
+        self.assertEqual([row[0] for row in rows[1:]], ['post', 'comment', 'comment', 'post'])
+        self.assertEqual(rows[4][4:6], ['Second, "quoted"', 'Line\nbreak'])
+
+    def test_unknown_output(self):
+        response = self.client.get(reverse('export_posts'), {'output': 'xml'})
+        self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST)
+
+
+class AsyncReadViewTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        Post.objects.bulk_create([
+            Post(user=self.user, title=f'Post {i}', content='Body') for i in range(7)
+        ])
+        Comment.objects.bulk_create([
+            Comment(user=self.other, post=self.post, content=f'Comment {i}') for i in range(7)
+        ])
+        self.login(self.user)
+
+    def assertSameResponse(self, sync_url, async_url, **params):
+        expected = self.client.get(sync_url, params)
+        cache.clear()
+        response = self.client.get(async_url, params)
+        self.assertEqual(response.status_code, expected.status_code)
+        # Byte-identical apart from pagination links pointing at the async route
+        self.assertEqual(response.content.replace(b'/async/', b'/'), expected.content)
+        return response
+
+    def test_list_posts_matches_sync_view(self):
+        self.assertSameResponse(reverse('list_posts'), reverse('list_posts_async'), page=2, ordering='-id')
+        response = self.assertSameResponse(reverse('list_posts'), reverse('list_posts_async'), cursor='')
+        # the links are built from the async route itself
+        self.assertIn(reverse('list_posts_async'), response.json()['next'])
+        self.assertSameResponse(reverse('list_posts'), reverse('list_posts_async'), fields='id,excerpt')
+        self.assertSameResponse(reverse('list_posts'), reverse('list_posts_async'), fields='nope')
+
+    def test_view_post_matches_sync_view(self):
+        response = self.assertSameResponse(
+            reverse('view_post', args=[self.post.id]), reverse('view_post_async', args=[self.post.id])
+        )
+        self.assertEqual(response['ETag'], self.client.get(reverse('view_post', args=[self.post.id]))['ETag'])
+        response = self.client.get(reverse('view_post_async', args=[0]))
+        self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+    def test_list_comments_matches_sync_view(self):
+        args = [self.post.id]
+        self.assertSameResponse(reverse('list_comments', args=args), reverse('list_comments_async', args=args))
+        self.assertSameResponse(
+            reverse('list_comments', args=args), reverse('list_comments_async', args=args), user=self.other.id
+        )
+        self.assertSameResponse(reverse('list_comments', args=[0]), reverse('list_comments_async', args=[0]))
+
+    def test_query_budgets(self):
+        # count + page
+        with self.assertNumQueries(2):
+            self.client.get(reverse('list_posts_async'))
+        # post exists + count + page with authors joined
+        self.client.credentials()
+        with self.assertNumQueries(3):
+            self.client.get(reverse('list_comments_async', args=[self.post.id]))
+        with self.assertNumQueries(1):
+            self.client.get(reverse('view_post_async', args=[self.post.id]))
+
+    def test_conditional_get(self):
+        etag = self.client.get(reverse('list_posts_async'))['ETag']
+        response = self.client.get(reverse('list_posts_async'), HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, status.HTTP_304_NOT_MODIFIED)
+
+    def test_authentication_errors_match_sync_view(self):
+        self.client.credentials()
+        self.assertSameAuthError(reverse('list_posts'), reverse('list_posts_async'))
+        self.client.credentials(HTTP_AUTHORIZATION='Bearer not-a-token')
+        self.assertSameAuthError(reverse('list_posts'), reverse('list_posts_async'))
+
+    def assertSameAuthError(self, sync_url, async_url):
+        expected = self.client.get(sync_url)
+        response = self.client.get(async_url)
+        self.assertEqual(response.status_code, status.HTTP_401_UNAUTHORIZED)
+        self.assertEqual(response.status_code, expected.status_code)
+        self.assertEqual(response.json(), expected.json())
+        self.assertEqual(response['WWW-Authenticate'], expected['WWW-Authenticate'])
+
+
+class RowSerializerTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        Post.objects.bulk_create([
+            Post(user=self.user, title=f'Post "{i}"', content='Body\n', is_published=bool(i % 2)) for i in range(20)
+        ])
+        Comment.objects.bulk_create([
+            Comment(user=self.other, post=self.post, content=f'Comment {i}') for i in range(20)
+        ])
+
+    def assertSameOutput(self, serializer_class, row_serializer_class, queryset):
+        expected = json.dumps(serializer_class(queryset, many=True).data)
+        rows = list(row_serializer_class.select(queryset))
+        self.assertEqual(json.dumps(row_serializer_class(rows).data), expected)
+
+    def test_post_rows_match_post_serializer(self):
+        self.assertSameOutput(PostSerializer, PostRowSerializer, Post.objects.order_by('id'))
+
+    def test_comment_rows_match_comment_serializer(self):
+        self.assertSameOutput(CommentSerializer, CommentRowSerializer, Comment.objects.order_by('id'))
+
+    def test_datetimes_use_current_time_zone(self):
+        with timezone.override('Africa/Lagos'):
+            self.assertSameOutput(PostSerializer, PostRowSerializer, Post.objects.order_by('id'))
+
+    def test_empty_page(self):
+        self.assertEqual(PostRowSerializer([]).data, [])
+
+    def test_list_posts_output_is_unchanged(self):
+        self.login(self.user)
+        response = self.client.get(reverse('list_posts'), {'page_size': 100, 'ordering': 'id'})
+        expected = PostSerializer(Post.objects.filter(user=self.user).order_by('id'), many=True).data
+        self.assertEqual(json.dumps(response.json()['results']), json.dumps(expected))
+
+    def test_list_comments_output_is_unchanged(self):
+        response = self.client.get(reverse('list_comments', args=[self.post.id]), {'page_size': 100, 'ordering': 'id'})
+        expected = CommentSerializer(Comment.objects.order_by('id'), many=True).data
+        self.assertEqual(json.dumps(response.json()['results']), json.dumps(expected))
+
+
+class SparseFieldsTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        self.long = Post.objects.create(
+            user=self.user, title='Long', content='word  \n' * 100, is_published=True,
+        )
+        Comment.objects.create(user=self.other, post=self.post, content='Hi')
+        self.login(self.user)
+
+    def test_fields_pick_the_columns_read_and_sent(self):
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as queries:
+            response = self.client.get(reverse('list_posts'), {'fields': 'title,id'})
+        self.assertEqual(list(response.data['results'][0]), ['id', 'title'])
+        self.assertFalse(any('"content"' in query['sql'] for query in queries))
+
+    def test_omit_drops_fields_from_the_default(self):
+        response = self.client.get(reverse('list_posts'), {'omit': 'content,updated_at'})
+        self.assertEqual(
+            list(response.data['results'][0]), ['id', 'title', 'is_published', 'comment_count', 'created_at'],
+        )
+
+    def test_excerpt_is_only_sent_when_asked_for(self):
+        response = self.client.get(reverse('list_posts'), {'ordering': '-id'})
+        self.assertNotIn('excerpt', response.data['results'][0])
+        response = self.client.get(reverse('list_posts'), {'ordering': '-id', 'fields': 'id,excerpt'})
+        excerpt = response.data['results'][0]['excerpt']
+        self.assertEqual(len(excerpt), EXCERPT_LENGTH)
+        self.assertTrue(excerpt.startswith('word word '))
+        self.assertTrue(excerpt.endswith('…'))
+
+    def test_excerpt_follows_content(self):
+        self.client.put(reverse('update_post', args=[self.post.id]), {'content': 'Shorter'})
+        self.post.refresh_from_db()
+        self.assertEqual(self.post.excerpt, 'Shorter')
+        response = self.client.post(reverse('create_posts_batch'), [{'title': 'A', 'content': 'Batch  body'}], format='json')
+        self.assertEqual(Post.objects.get(id=response.data['posts'][0]['id']).excerpt, 'Batch body')
+
+    def test_comment_fields(self):
+        response = self.client.get(reverse('list_comments', args=[self.post.id]), {'fields': 'user,content'})
+        self.assertEqual(response.data['results'], [{'user': 'reader@example.com', 'content': 'Hi'}])
+
+    def test_unknown_or_empty_fields_are_rejected(self):
+        for params in ({'fields': 'title,secret'}, {'fields': ''}, {'omit': 'nope'}):
+            response = self.client.get(reverse('list_posts'), params)
+            self.assertEqual(response.status_code, status.HTTP_400_BAD_REQUEST, params)
+
+    def test_conditional_requests_use_the_same_fields(self):
+        response = self.client.get(reverse('list_posts'), {'fields': 'title'})
+        repeat = self.client.get(reverse('list_posts'), {'fields': 'title'}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(repeat.status_code, status.HTTP_304_NOT_MODIFIED)
+        self.post.title = 'Changed'
+        self.post.save()
+        changed = self.client.get(reverse('list_posts'), {'fields': 'title'}, HTTP_IF_NONE_MATCH=response['ETag'])
+        self.assertEqual(changed.status_code, status.HTTP_200_OK)
+        self.assertIn({'title': 'Changed'}, changed.data['results'])
+
+
+class FastJSONTests(BlogTestCase):
+    data = {
+        'utc': datetime(2025, 1, 2, 3, 4, 5, 678901, tzinfo=dt_timezone.utc),
+        'lagos': datetime(2025, 1, 2, 3, 4, 5, tzinfo=ZoneInfo('Africa/Lagos')),
+        'naive': datetime(2025, 1, 2, 3, 4, 5),
+        'date': date(2025, 1, 2),
+        'time': time(3, 4, 5),
+        'decimal': Decimal('12.50'),
+        'uuid': uuid.UUID('12345678-1234-5678-1234-567812345678'),
+        'lazy': gettext_lazy('Post not found'),
+        'error': [ErrorDetail('This field is required.', code='required')],
+        'text': 'caf\u00e9 \u2028 \u2029 "quoted"',
+        'nested': {1: (1, 2.5, None, True)},
+    }
+
+    def test_renders_like_json_renderer(self):
+        self.assertEqual(FastJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+
+    def test_indent_and_missing_orjson_fall_back(self):
+        self.assertEqual(
+            FastJSONRenderer().render(self.data, 'application/json; indent=4'),
+            JSONRenderer().render(self.data, 'application/json; indent=4'),
+        )
+        with mock.patch('backend.renderers.orjson', None):
+            self.assertEqual(FastJSONRenderer().render(self.data), JSONRenderer().render(self.data))
+
+    def test_huge_integers_fall_back(self):
+        self.assertEqual(FastJSONRenderer().render({'n': 2 ** 70}), b'{"n":1180591620717411303424}')
+
+    def test_list_posts_response_is_unchanged(self):
+        Post.objects.bulk_create([Post(user=self.user, title=f'Post {i}', content='Body') for i in range(20)])
+        self.login(self.user)
+        response = self.client.get(reverse('list_posts'), {'page_size': 20})
+        self.assertEqual(response.content, JSONRenderer().render(response.data))
+
+    def parse(self, parser, body):
+        return parser.parse(BytesIO(body), 'application/json', {})
+
+    def test_parses_like_json_parser(self):
+        body = json.dumps({'title': 'caf\u00e9', 'n': 2 ** 70, 'items': [1.5, None, False]}).encode()
+        self.assertEqual(self.parse(FastJSONParser(), body), self.parse(JSONParser(), body))
+
+    def test_parse_errors_match_json_parser(self):
+        for body in (b'{"title": ', b'{"n": NaN}'):
+            with self.assertRaises(ParseError) as expected:
+                self.parse(JSONParser(), body)
+            with self.assertRaises(ParseError) as raised:
+                self.parse(FastJSONParser(), body)
+            self.assertEqual(str(raised.exception), str(expected.exception))
+
+    def test_create_post_with_json_body(self):
+        self.login(self.user)
+        response = self.client.post(reverse('create_post'), {'title': 'New', 'content': 'Post'}, format='json')
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertEqual(response.data['post']['title'], 'New')
+
+
+def throttle_rates(**rates):
+    return override_settings(REST_FRAMEWORK={**settings.REST_FRAMEWORK, 'DEFAULT_THROTTLE_RATES': rates})
+
+
+class ThrottleTests(BlogTestCase):
+    def comment(self):
+        return self.client.post(reverse('create_comment', args=[self.post.id]), {'content': 'Hi'})
+
+    @throttle_rates(user='100/min', comment='2/min')
+    def test_comment_scope_is_per_user(self):
+        self.login(self.other)
+        self.assertEqual(self.comment().status_code, status.HTTP_201_CREATED)
+        self.assertEqual(self.comment().status_code, status.HTTP_201_CREATED)
+        response = self.comment()
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '30')
+        # Other endpoints only draw from the user rate
+        self.assertEqual(self.client.get(reverse('list_posts')).status_code, status.HTTP_200_OK)
+        self.login(self.user)
+        self.assertEqual(self.comment().status_code, status.HTTP_201_CREATED)
+
+    @throttle_rates(user='2/min')
+    def test_user_rate_covers_every_endpoint(self):
+        self.login(self.user)
+        self.client.get(reverse('list_posts'))
+        self.client.get(reverse('view_post', args=[self.post.id]))
+        response = self.client.get(reverse('list_posts'))
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+
+    @throttle_rates(anon='1/min')
+    def test_anonymous_requests_are_limited_per_ip(self):
+        url = reverse('view_post', args=[self.post.id])
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(self.client.get(url, REMOTE_ADDR='10.0.0.2').status_code, status.HTTP_200_OK)
+
+    @throttle_rates(anon='1/min')
+    def test_async_views_are_throttled(self):
+        url = reverse('view_post_async', args=[self.post.id])
+        self.assertEqual(self.client.get(url).status_code, status.HTTP_200_OK)
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status.HTTP_429_TOO_MANY_REQUESTS)
+        self.assertEqual(response['Retry-After'], '60')
+
+    def test_shared_caches_other_than_redis_are_refused(self):
+        caches_setting = {
+            **settings.CACHES,
+            'throttle': {'BACKEND': 'django.core.cache.backends.db.DatabaseCache', 'LOCATION': 'throttle'},
+        }
+        with override_settings(CACHES=caches_setting), \
+                mock.patch('backend.throttling.THROTTLE_CACHE', 'throttle'), mock.patch.dict(stores, clear=True):
+            with self.assertRaisesMessage(ImproperlyConfigured, 'DatabaseCache cannot update the buckets atomically'):
+                get_store()
+
+    @skipIf(fakeredis is None, "needs redis and fakeredis[lua]")
+    def test_redis_buckets(self):
+        # OPTIONS reach the script's client: this one talks to an in-memory server
+        server = fakeredis.FakeServer()
+        caches_setting = {
+            **settings.CACHES,
+            'throttle': {
+                'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+                'LOCATION': 'redis://primary:6379/0,redis://replica:6379/0',
+                'OPTIONS': {'connection_class': fakeredis.FakeConnection, 'server': server},
+            },
+        }
+        with override_settings(CACHES=caches_setting), \
+                mock.patch('backend.throttling.THROTTLE_CACHE', 'throttle'), mock.patch.dict(stores, clear=True):
+            store = get_store()
+            self.assertIsInstance(store, RedisBucketStore)
+            self.assertEqual(store.client.connection_pool.connection_kwargs['host'], 'primary')
+            buckets = [('throttle:user:1', 100, 100 / 60), ('throttle:comment:1', 2, 2 / 60)]
+            self.assertEqual(store.consume(buckets), 0)
+            self.assertEqual(store.consume(buckets), 0)
+            self.assertAlmostEqual(store.consume(buckets), 30, delta=1)
+            # nothing was taken from either bucket by the refused request
+            self.assertAlmostEqual(float(store.client.hget(':1:throttle:user:1', 'tokens')), 98, delta=0.1)
+            # another user has buckets of their own
+            self.assertEqual(store.consume([('throttle:comment:2', 2, 2 / 60)]), 0)
+
+    def test_throttling_adds_no_queries(self):
+        self.client.get(reverse('view_post', args=[self.post.id]))
+        with self.assertNumQueries(0):
+            self.client.get(reverse('view_post', args=[self.post.id]))
+
+
+class LoadTestingTests(BlogTestCase):
+    def test_generated_data_is_skewed_and_consistent(self):
+        call_command('generate_data', users=5, posts=40, comments=200, stdout=StringIO())
+        users = CustomUser.objects.filter(email__startswith='load')
+        posts = Post.objects.filter(user__in=users)
+        self.assertEqual((users.count(), posts.count()), (5, 40))
+        self.assertEqual(Comment.objects.filter(user__in=users).count(), 200)
+        # the first user and the first post are the busiest
+        per_user = [posts.filter(user=user).count() for user in users.order_by('id')]
+        self.assertEqual(per_user[0], max(per_user))
+        hot = posts.order_by('id').first()
+        self.assertEqual(hot.comment_count, max(posts.values_list('comment_count', flat=True)))
+        for post in posts:
+            self.assertEqual(post.comment_count, post.comments.count())
+        self.assertEqual(posts.values('created_at').distinct().count(), 40)
+
+    def test_generated_data_is_reproducible(self):
+        call_command('generate_data', users=3, posts=10, comments=30, prefix='gen-a', stdout=StringIO())
+        call_command('generate_data', users=3, posts=10, comments=30, prefix='gen-b', stdout=StringIO())
+        titles = [
+            list(Post.objects.filter(user__email__startswith=prefix).order_by('id').values_list('title', 'comment_count'))
+            for prefix in ('gen-a', 'gen-b')
+        ]
+        self.assertEqual(titles[0], titles[1])
+        with self.assertRaisesMessage(CommandError, "already exist"):
+            call_command('generate_data', users=3, posts=10, comments=30, prefix='gen-a', stdout=StringIO())
+
+    @override_settings(ALLOWED_HOSTS=['localhost'])
+    def test_benchmark_covers_every_route(self):
+        out = StringIO()
+        call_command(
+            'benchmark_api', users=3, posts=5, comments=10, requests=1, warmup=0, json=True, stdout=out
+        )
+        report = json.loads(out.getvalue())
+        names = {pattern.name for pattern in blog_urls.urlpatterns + account_urls.urlpatterns}
+        self.assertEqual(set(report['routes']), names)
+        for name, result in report['routes'].items():
+            self.assertEqual(result['unexpected'], {}, name)
+            self.assertEqual(result['requests'], 1)
+        self.assertEqual(report['routes']['view_post']['queries'], 1)
+        # the seeded rows are rolled back
+        self.assertFalse(CustomUser.objects.filter(email__startswith='bench').exists())
+
+
+class ProfilingTests(BlogTestCase):
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.profiles = Path(directory.name)
+        self.login(self.user)
+
+    def profiling(self, **overrides):
+        return override_settings(PROFILING_ENABLED=True, PROFILING_DIR=self.profiles, **overrides)
+
+    def server_timing(self, response):
+        return {
+            metric.split(';')[0]: metric for metric in response['Server-Timing'].split(', ')
+        }
+
+    def test_disabled_by_default(self):
+        response = self.client.get(reverse('list_posts'))
+        self.assertNotIn('Server-Timing', response)
+
+    def test_server_timing(self):
+        with self.profiling(PROFILING_SAMPLE_RATE=0):
+            response = self.client.get(reverse('list_posts'))
+        metrics = self.server_timing(response)
+        self.assertEqual(set(metrics), {'total', 'db', 'serialize'})
+        self.assertIn('desc="2 queries"', metrics['db'])
+        self.assertRegex(metrics['total'], r'^total;dur=\d+\.\d\d$')
+        self.assertNotEqual(metrics['serialize'], 'serialize;dur=0.00')
+        self.assertEqual(list(self.profiles.iterdir()), [])
+
+    async def test_async_views(self):
+        with self.profiling(PROFILING_SAMPLE_RATE=0):
+            response = await self.async_client.get(reverse('view_post_async', args=[self.post.id]))
+        self.assertIn('desc="1 queries"', self.server_timing(response)['db'])
+
+    def test_sampled_requests_are_listed_for_staff(self):
+        with self.profiling(PROFILING_SAMPLE_RATE=1, PROFILING_MAX_DUMPS=2):
+            for _ in range(3):
+                response = self.client.get(reverse('view_post', args=[self.post.id]))
+        name = self.server_timing(response)['profile'].split('"')[1]
+
+        # a client of its own, without profiling
+        self.client = self.client_class()
+        self.login(self.user)
+        self.assertEqual(self.client.get(reverse('profiles')).status_code, status.HTTP_403_FORBIDDEN)
+        staff = self.create_user('staff@example.com')
+        staff.is_staff = True
+        staff.save()
+        self.login(staff)
+        with override_settings(PROFILING_DIR=self.profiles):
+            profiles = self.client.get(reverse('profiles')).json()['profiles']
+            # the oldest dump was dropped
+            self.assertEqual(len(profiles), 2)
+            self.assertEqual(profiles[0]['name'], name)
+            self.assertEqual(profiles[0]['path'], reverse('view_post', args=[self.post.id]))
+            self.assertEqual(profiles[0]['queries'], 0)
+
+            response = self.client.get(reverse('profile_dump', args=[name]))
+            self.assertEqual(response.status_code, status.HTTP_200_OK)
+            stats_file = self.profiles / 'downloaded.prof'
+            stats_file.write_bytes(b''.join(response.streaming_content))
+            self.assertTrue(pstats.Stats(str(stats_file)).total_calls)
+            response = self.client.get(reverse('profile_dump', args=['..%2Fsettings']))
+            self.assertEqual(response.status_code, status.HTTP_404_NOT_FOUND)
+
+
+class MetricsTests(BlogTestCase):
+    def sample(self, name, **labels):
+        return REGISTRY.get_sample_value(name, labels) or 0
+
+    def test_requests_are_recorded_by_url_name(self):
+        self.login(self.user)
+        labels = {'view': 'list_posts', 'method': 'GET'}
+        before = (
+            self.sample('blog_api_requests_total', status='200', **labels),
+            self.sample('blog_api_request_duration_seconds_count', **labels),
+            self.sample('blog_api_request_queries_sum', view='list_posts'),
+        )
+        self.client.get(reverse('list_posts'))
+        after = (
+            self.sample('blog_api_requests_total', status='200', **labels),
+            self.sample('blog_api_request_duration_seconds_count', **labels),
+            self.sample('blog_api_request_queries_sum', view='list_posts'),
+        )
+        # one request, with its count and page queries
+        self.assertEqual([b - a for a, b in zip(before, after)], [1, 1, 2])
+        self.assertEqual(self.sample('blog_api_requests_in_flight'), 0)
+
+        before = self.sample('blog_api_requests_total', view='<unresolved>', method='GET', status='404')
+        self.client.get('/no/such/page/')
+        after = self.sample('blog_api_requests_total', view='<unresolved>', method='GET', status='404')
+        self.assertEqual(after - before, 1)
+
+    @override_settings(DEBUG=True, PROFILING_ENABLED=True, DATABASE_REPLICAS=['replica'])
+    def test_middleware_is_async_capable(self):
+        # With DEBUG on, Django logs each middleware it adapts to the handler
+        with self.assertLogs('django.request', 'DEBUG') as logs:
+            logging.getLogger('django.request').debug('Loading')
+            ASGIHandler()
+        self.assertEqual([line for line in logs.output if 'adapted' in line], [])
+
+    async def test_async_views_stay_async(self):
+        before = self.sample('blog_api_request_queries_sum', view='view_post_async')
+        response = await self.async_client.get(reverse('view_post_async', args=[self.post.id]))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        # the queries the view ran in sync_to_async() threads are counted
+        self.assertGreater(self.sample('blog_api_request_queries_sum', view='view_post_async'), before)
+
+    def test_endpoint_exports_text_format(self):
+        self.client.get(reverse('view_post', args=[self.post.id]))
+        response = self.client.get(reverse('metrics'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        self.assertIn(
+            b'blog_api_requests_total{method="GET",status="200",view="view_post"}', response.content
+        )
+
+    def test_worker_processes_are_aggregated(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        worker = (
+            "import django; django.setup()\n"
+            "from backend import metrics\n"
+            "metrics.REQUESTS.labels('login', 'POST', '200').inc()\n"
+            "metrics.LATENCY.labels('login', 'POST').observe(0.2)\n"
+        )
+        env = {**os.environ, 'PROMETHEUS_MULTIPROC_DIR': directory.name}
+        for _ in range(2):
+            subprocess.run([sys.executable, '-c', worker], env=env, cwd=settings.BASE_DIR, check=True)
+
+        registry = CollectorRegistry()
+        MultiProcessCollector(registry, path=directory.name)
+        labels = {'view': 'login', 'method': 'POST'}
+        self.assertEqual(registry.get_sample_value('blog_api_requests_total', {'status': '200', **labels}), 2)
+        self.assertEqual(registry.get_sample_value('blog_api_request_duration_seconds_count', labels), 2)
+        self.assertEqual(
+            registry.get_sample_value('blog_api_request_duration_seconds_bucket', {'le': '0.25', **labels}), 2
+        )
+
+
+class ReplicaRoutingTests(BlogTestCase):
+    """Replicas are SQLite files holding different rows, so responses show where they were read."""
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.add_database('replica', Path(directory.name) / 'replica.sqlite3')
+        self.add_database('replica_down', Path(directory.name) / 'missing' / 'replica.sqlite3')
+        with connections['replica'].schema_editor() as editor:
+            editor.create_model(CustomUser)
+            editor.create_model(Post)
+            editor.create_model(Comment)
+        CustomUser.objects.using('replica').create(id=self.user.id, email=self.user.email)
+        Post.objects.using('replica').create(id=self.post.id, user_id=self.user.id, title='Replica copy', content='Old')
+
+        reset_health()
+        self.addCleanup(reset_health)
+        replicas = override_settings(DATABASE_REPLICAS=['replica'])
+        replicas.enable()
+        self.addCleanup(replicas.disable)
+        self.login(self.user)
+
+    def add_database(self, alias, name):
+        # Not in settings.DATABASES: a connection created on the fly, which
+        # TestCase lets through
+        settings_dict = connections.configure_settings({
+            DEFAULT_DB_ALIAS: connections.settings[DEFAULT_DB_ALIAS],
+            alias: {'ENGINE': 'django.db.backends.sqlite3', 'NAME': str(name)},
+        })[alias]
+        connections[alias] = load_backend(settings_dict['ENGINE']).DatabaseWrapper(settings_dict, alias)
+
+        def remove():
+            connections[alias].close()
+            del connections[alias]
+        self.addCleanup(remove)
+
+    def titles(self):
+        response = self.client.get(reverse('list_posts'))
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        return [post['title'] for post in response.data['results']]
+
+    def test_safe_requests_read_from_a_replica(self):
+        self.assertEqual(self.titles(), ['Replica copy'])
+        # the export queries while it streams
+        response = self.client.get(reverse('export_posts'))
+        self.assertIn(b'Replica copy', b''.join(response.streaming_content))
+
+    async def test_async_views_read_from_a_replica(self):
+        response = await self.async_client.get(
+            reverse('list_posts_async'), headers={'Authorization': f'Bearer {UserAccessToken.for_user(self.user)}'}
+        )
+        self.assertEqual([post['title'] for post in response.json()['results']], ['Replica copy'])
+
+    @mock.patch('blog.counting.EXACT_COUNT_LIMIT', 1)
+    def test_shared_caches_are_filled_from_the_primary(self):
+        # what every client would be served until the entries expire
+        response = self.client.get(reverse('view_post', args=[self.post.id]))
+        self.assertEqual(response.data['post']['title'], 'Hello')
+        response = self.client.get(reverse('view_posts'), {'ids': self.post.id})
+        self.assertEqual(response.data['posts'][str(self.post.id)]['title'], 'Hello')
+        cache.clear()
+        response = self.client.get(reverse('feed'))
+        self.assertEqual([post['title'] for post in response.data['results']], ['Hello'])
+
+        CustomUser.objects.using('replica').create(id=self.other.id, email=self.other.email)
+        for _ in range(2):
+            comment = Comment.objects.create(user=self.other, post=self.post, content='Hi')
+            Comment.objects.using('replica').create(id=comment.id, user_id=self.other.id, post_id=self.post.id, content='Hi')
+        Comment.objects.create(user=self.other, post=self.post, content='Not replicated yet')
+        self.assertEqual(self.client.get(reverse('list_comments', args=[self.post.id])).data['count'], 3)
+
+        # deactivation is marked in the shared cache, not read from a replica
+        with self.captureOnCommitCallbacks(execute=True):
+            CustomUser.objects.filter(pk=self.user.pk).update(is_active=False)
+            user_changed(self.user.pk, is_active=False)
+        self.assertEqual(self.client.get(reverse('list_posts')).status_code, status.HTTP_401_UNAUTHORIZED)
+
+    def test_writers_read_their_writes(self):
+        response = self.client.post(reverse('create_post'), {'title': 'New', 'content': 'Post'})
+        self.assertEqual(response.status_code, status.HTTP_201_CREATED)
+        self.assertCountEqual(self.titles(), ['New', 'Hello'])
+
+        # only the client that wrote is pinned
+        self.login(self.other)
+        with CaptureQueriesContext(connections['replica']) as replica_queries:
+            self.client.get(reverse('list_posts'))
+        self.assertTrue(replica_queries)
+
+        # and only for a while
+        self.login(self.user)
+        cache.clear()
+        self.assertEqual(self.titles(), ['Replica copy'])
+
+    @override_settings(DATABASE_REPLICAS=['replica_down', 'replica'])
+    def test_unhealthy_replicas_are_skipped(self):
+        for _ in range(3):
+            self.assertEqual(self.titles(), ['Replica copy'])
+        with override_settings(DATABASE_REPLICAS=['replica_down']):
+            reset_health()
+            self.assertEqual(self.titles(), ['Hello'])
+
+    def test_primary_outside_requests(self):
+        self.assertEqual(Post.objects.get(id=self.post.id).title, 'Hello')
+        self.assertIs(router.allow_migrate('replica', 'blog', model_name='post'), False)
+        self.assertTrue(router.allow_migrate('default', 'blog', model_name='post'))
@@ -0,0 +1,92 @@
+import re
+
+from django.apps import apps
+from django.conf import settings
+from django.core import checks
+from django.db.models import CharField, F, Q, Value, Window
+from django.db.models.functions import Cast, LPad, RowNumber, Substr
+
+# A comment's path is its ancestors' ids and its own, each zero-padded to
+# SEGMENT_WIDTH digits: ordering by path walks a thread depth first, and a
+# subtree is the range [path, path padded with nines to the column's
+# width]. Digits only, so the range holds under any collation. Ids past 10 digits do not fit and are
+# refused: a wider segment would sort before its narrower siblings.
+SEGMENT_WIDTH = 10
+PATH_PATTERN = re.compile(rf'^(\d{{{SEGMENT_WIDTH}}})+$')
+
+
+def max_depth():
+    """Deepest reply allowed, roots being depth 0."""
+    return getattr(settings, 'COMMENT_MAX_DEPTH', 8)
+
+
+def path_segment(pk):
+    if not 0 < pk < 10 ** SEGMENT_WIDTH:
+        raise ValueError(f"Comment id {pk} does not fit a {SEGMENT_WIDTH}-digit path segment")
+    return f'{pk:0{SEGMENT_WIDTH}d}'
+
+
+def check_max_depth(app_configs=None, **kwargs):
+    """System check: the deepest path allowed fits Comment.path."""
+    max_length = apps.get_model('blog', 'Comment')._meta.get_field('path').max_length
+    if (max_depth() + 1) * SEGMENT_WIDTH <= max_length:
+        return []
+    return [checks.Error(
+        f"COMMENT_MAX_DEPTH = {max_depth()} makes paths longer than Comment.path's {max_length} characters",
+        hint=f"Use at most {max_length // SEGMENT_WIDTH - 1}.",
+        id='blog.E001',
+    )]
+
+
+def root_path():
+    """Expression giving a root comment its path, for update()."""
+    return LPad(Cast('id', output_field=CharField()), SEGMENT_WIDTH, Value('0'))
+
+
+def subtree_last(path):
+    # The largest path a reply could have. Unlike the next sibling's path,
+    # it exists for the largest id too, and unlike path + ':' it is digits.
+    max_length = apps.get_model('blog', 'Comment')._meta.get_field('path').max_length
+    return path.ljust(max_length, '9')
+
+
+def subtree(post_id, path):
+    """Q matching the comment at `path` and all its replies."""
+    return Q(post_id=post_id, path__gte=path, path__lte=subtree_last(path))
+
+
+def subtrees(rows):
+    """Q matching the subtrees of (post_id, path) `rows`."""
+    q = Q(pk__in=[])
+    for post_id, path in rows:
+        q |= subtree(post_id, path)
+    return q
+
+
+def thread_roots(comments, post_id, after=None):
+    """Root comments of a post after path `after`, oldest first."""
+    roots = comments.filter(post_id=post_id, depth=0)
+    if after:
+        roots = roots.filter(path__gt=after)
+    return roots.order_by('path')
+
+
+def thread_replies(comments, post_id, first, last, depth, limit):
+    """
+    The first `limit` replies (depth first, at most `depth` deep) of each
+    root from path `first` to path `last`, in one range scan.
+    """
+    return (
+        comments.filter(post_id=post_id, depth__gte=1, depth__lte=depth, path__gte=first, path__lte=subtree_last(last))
+        .annotate(position=Window(RowNumber(), partition_by=[Substr('path', 1, SEGMENT_WIDTH)], order_by=F('path').asc()))
+        .filter(position__lte=limit)
+        .order_by('path')
+    )
+
+
+def thread(comments, root, depth, after=None):
+    """`root` and its replies at most `depth` below it, depth first, after path `after`."""
+    rows = comments.filter(subtree(root.post_id, root.path), depth__lte=root.depth + depth)
+    if after:
+        rows = rows.filter(path__gt=after)
+    return rows.order_by('path')
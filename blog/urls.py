@@ -1,25 +1,47 @@
 from django.urls import path
+from backend.throttling import scoped_throttles
 from .views import (
     CreatepostView, 
+    BatchCreatePostView,
     ListPostView, 
+    FeedView,
+    SearchPostView,
+    ExportPostView,
     ViewAPostView, 
+    ViewPostsView,
     UpdatePostView, 
     DeletePostView, 
     CreateCommentView, 
     ListCommentView,
+    ListCommentThreadsView,
+    ViewCommentThreadView,
     UpdateCommentView,
     DeleteCommentView,
+    AsyncListPostView,
+    AsyncViewAPostView,
+    AsyncListCommentView,
 )
 
 
 urlpatterns = [
-    path('create/', CreatepostView.as_view(), name='create_post'),
+    path('create/', CreatepostView.as_view(throttle_classes=scoped_throttles('post')), name='create_post'),
+    path('create/batch/', BatchCreatePostView.as_view(throttle_classes=scoped_throttles('post')), name='create_posts_batch'),
     path('list/', ListPostView.as_view(), name='list_posts'),
+    path('feed/', FeedView.as_view(), name='feed'),
+    path('search/', SearchPostView.as_view(throttle_classes=scoped_throttles('search')), name='search_posts'),
+    path('export/', ExportPostView.as_view(throttle_classes=scoped_throttles('export')), name='export_posts'),
     path('view/<int:pk>/', ViewAPostView.as_view(), name='view_post'),
+    path('view/', ViewPostsView.as_view(), name='view_posts'),
     path('update/<int:pk>/', UpdatePostView.as_view(), name='update_post'),
     path('delete/<int:pk>/', DeletePostView.as_view(), name='delete_post'),
-    path('create/<int:pk>/comments/', CreateCommentView.as_view(), name='create_comment'),
+    path('create/<int:pk>/comments/', CreateCommentView.as_view(throttle_classes=scoped_throttles('comment')), name='create_comment'),
     path('list/<int:pk>/comments/', ListCommentView.as_view(), name='list_comments'),
+    path('list/<int:pk>/comments/threads/', ListCommentThreadsView.as_view(), name='list_comment_threads'),
+    path('comments/<int:pk>/thread/', ViewCommentThreadView.as_view(), name='view_comment_thread'),
     path('update/<int:pk>/comments/', UpdateCommentView.as_view(), name='update_comment'),
     path('delete/comments/<int:pk>/', DeleteCommentView.as_view(), name='delete_comment'),
+    # Async read path, for ASGI deployments
+    path('async/list/', AsyncListPostView.as_view(), name='list_posts_async'),
+    path('async/view/<int:pk>/', AsyncViewAPostView.as_view(), name='view_post_async'),
+    path('async/list/<int:pk>/comments/', AsyncListCommentView.as_view(), name='list_comments_async'),
 ]
\ No newline at end of file
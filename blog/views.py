@@ -1,18 +1,44 @@
 from .models import Post, Comment
-from .serializers import PostSerializer, CommentSerializer
-from .paginator import CustomPagination
-from account.models import CustomUser
+from .serializers import PostSerializer, CommentSerializer, PostRowSerializer, CommentRowSerializer
+from .paginator import MAX_ID, CustomPagination
+from .cache import (
+    get_cached_post, get_cached_posts, peek_cached_post, aget_cached_post, apeek_cached_post, invalidate_post,
+)
+from .counters import adjust_comment_count
+from .counting import comment_count_key, invalidate_counts
+from .deletion import schedule_post_deletion
+from .feed import feed_changed, feed_page
+from .threads import PATH_PATTERN, SEGMENT_WIDTH, max_depth, subtree, thread, thread_replies, thread_roots
+from .search import search_posts
+from .export import iter_export, ndjson_lines, csv_lines
+from .conditional import (
+    is_conditional,
+    not_modified_response,
+    page_etag,
+    paginate_conditionally,
+    post_etag,
+    set_etag,
+)
+from backend.async_api import AsyncAPIView
 from rest_framework.permissions import IsAuthenticated
 from rest_framework import status
 from rest_framework.response import Response
 from django.shortcuts import get_object_or_404
+from django.http import Http404, StreamingHttpResponse
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models import Q
+from asgiref.sync import sync_to_async
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework.filters import OrderingFilter
+from rest_framework.exceptions import NotFound, ValidationError
+from rest_framework.utils.urls import replace_query_param
 from rest_framework.generics import (
     CreateAPIView,
     ListAPIView,
     DestroyAPIView,
-    UpdateAPIView
+    UpdateAPIView,
+    GenericAPIView,
 )
 
 # Create your views here.
@@ -29,7 +55,8 @@ class CreatepostView(CreateAPIView):
                 return Response({"error": "User is not authenticated"}, status=status.HTTP_401_UNAUTHORIZED)
             
             # Save the post with the author
-            serializer.save(user=author)
+            post = serializer.save(user=author)
+            feed_changed([post])
             # return the created post data
             return Response({
                 "post": serializer.data,
@@ -41,6 +68,34 @@ class CreatepostView(CreateAPIView):
             )
 
 
+class BatchCreatePostView(CreateAPIView):
+    serializer_class = PostSerializer
+    permission_classes = [IsAuthenticated]
+
+    def post(self, request):
+        serializer = self.serializer_class(
+            data=request.data, many=True, allow_empty=False, max_length=settings.POST_BATCH_MAX_SIZE
+        )
+        if not serializer.is_valid():
+            errors = serializer.errors
+            # Per-post errors come as a list or, in newer DRF, a dict keyed by
+            # index; non_field_errors means the payload itself is wrong
+            if isinstance(errors, list):
+                errors = dict(enumerate(errors))
+            if all(isinstance(index, int) for index in errors):
+                errors = [{"index": index, "errors": error} for index, error in sorted(errors.items()) if error]
+            return Response({"error": errors}, status=status.HTTP_400_BAD_REQUEST)
+
+        # Insert the whole batch in one transaction, it is all or nothing
+        with transaction.atomic():
+            posts = serializer.save(user=request.user)
+            feed_changed(posts)
+        return Response({
+            "posts": serializer.data,
+            "message": f"{len(serializer.data)} posts created successfully by {request.user.first_name} {request.user.last_name}",
+        }, status=status.HTTP_201_CREATED)
+
+
 class ListPostView(ListAPIView):
     queryset = Post.objects.all()
     serializer_class = PostSerializer
@@ -51,44 +106,204 @@ class ListPostView(ListAPIView):
     ordering_fields = ['created_at', 'updated_at', 'id']
 
     def get(self, request):
-        # Get the user from the request
-        user = CustomUser.objects.get(id=request.user.id)
-        # Get all posts by the user
-        posts = Post.objects.filter(user=user)
+        # Get all posts by the user; request.user is built from the token, no lookup
+        posts = Post.objects.filter(user=request.user)
+
+        # Apply filters
+        for backend in list(self.filter_backends):
+            posts = backend().filter_queryset(request, posts, self)
+
+        # ?fields=/?omit= pick the columns read as well as those sent, so
+        # content is only loaded when it is asked for
+        fields = PostRowSerializer.requested_fields(request.query_params)
+        paginator = self.pagination_class()
+        # Paginate the posts, answering If-None-Match with a 304
+        page, etag, not_modified = paginate_conditionally(
+            request, paginator, PostRowSerializer.select(posts, fields), ('id', 'created_at', 'updated_at', 'comment_count')
+        )
+        if not_modified is not None:
+            return not_modified
+        # Return the posts in the response, serialized straight from the rows
+        serializer = PostRowSerializer(page, fields)
+        response = paginator.get_paginated_response(
+            serializer.data
+        )
+        return set_etag(response, etag)
+
+
+class SearchPostView(ListAPIView):
+    serializer_class = PostSerializer
+    permission_classes = [IsAuthenticated]
+    filter_backends = [DjangoFilterBackend]
+    pagination_class = CustomPagination
+    filterset_fields = ['is_published']
+
+    def get(self, request):
+        query = request.query_params.get('q', '').strip()
+        if not query:
+            return Response(
+                {"error": "A search query (q) is required"}, status=status.HTTP_400_BAD_REQUEST
+            )
+        # Search published posts and the user's own drafts, best matches first
+        posts = search_posts(Post.objects.filter(Q(is_published=True) | Q(user=request.user)), query)
 
         # Apply filters
         for backend in list(self.filter_backends):
             posts = backend().filter_queryset(request, posts, self)
 
         paginator = self.pagination_class()
-        # Paginate the posts
         page = paginator.paginate_queryset(posts, request)
-        # Return the posts in the response
         serializer = self.serializer_class(page, many=True)
         return paginator.get_paginated_response(
             serializer.data
         )
 
 
+class ExportPostView(GenericAPIView):
+    permission_classes = [IsAuthenticated]
+    # `format` is taken by DRF's content negotiation, so the type is `output`
+    outputs = {
+        'ndjson': (ndjson_lines, 'application/x-ndjson'),
+        'csv': (csv_lines, 'text/csv'),
+    }
+
+    def get(self, request):
+        output = request.query_params.get('output', 'ndjson')
+        if output not in self.outputs:
+            return Response(
+                {"error": f"output must be one of: {', '.join(self.outputs)}"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        with_comments = request.query_params.get('comments', '').lower() in ('1', 'true', 'yes')
+        lines, content_type = self.outputs[output]
+
+        # Rows are read through server-side cursors and written as they arrive
+        rows = iter_export(request.user, with_comments, settings.EXPORT_CHUNK_SIZE)
+        response = StreamingHttpResponse(lines(rows), content_type=content_type)
+        response['Content-Disposition'] = f'attachment; filename="posts.{output}"'
+        return response
+
+
+def cache_entry(post):
+    # What the post cache holds for a post, see blog/cache.py. The fillers
+    # read from the primary: a lagging replica's row would be served to
+    # every client, the writer included, until the entry expires.
+    return {'post': dict(PostSerializer(post).data), 'updated_at': post.updated_at}
+
+
+def cache_entries(pks):
+    # get_cached_posts() filler: all the misses in one query
+    return {pk: cache_entry(post) for pk, post in Post.objects.using(DEFAULT_DB_ALIAS).in_bulk(pks).items()}
+
+
+class FeedView(GenericAPIView):
+    """
+    Everyone's published posts, newest first. The page's post ids come from
+    the cached timeline (see blog/feed.py) and the posts from the post
+    cache, with the misses loaded in one query.
+    """
+    pagination_class = CustomPagination
+    cursor_query_param = 'cursor'
+
+    def get(self, request):
+        paginator = self.pagination_class()
+        size = paginator.get_page_size(request)
+        try:
+            before = self.decode_cursor(request.query_params.get(self.cursor_query_param))
+        except ValueError:
+            return Response({"error": "Invalid cursor"}, status=status.HTTP_400_BAD_REQUEST)
+
+        page, has_more = feed_page(size, before)
+        entries = get_cached_posts([pk for _, pk in page], cache_entries)
+        # A post unpublished or deleted since the timeline was read is skipped
+        results = [
+            entries[pk]['post'] for _, pk in page if pk in entries and entries[pk]['post']['is_published']
+        ]
+        next_url = None
+        if has_more:
+            cursor = '{}-{}'.format(*page[-1])
+            next_url = replace_query_param(request.build_absolute_uri(), self.cursor_query_param, cursor)
+        return Response({"next": next_url, "results": results}, status=status.HTTP_200_OK)
+
+    def decode_cursor(self, cursor):
+        if not cursor:
+            return None
+        micros, pk = cursor.split('-')
+        return [int(micros), int(pk)]
+
+
 class ViewAPostView(ListAPIView):
     queryset = Post.objects.all()
     serializer_class = PostSerializer
 
     def get(self, request, pk):
+        # Conditional requests are answered from updated_at and comment_count
+        # alone, without loading or serializing the post
+        if is_conditional(request):
+            entry = peek_cached_post(pk)
+            if entry is not None:
+                validators = (entry['updated_at'], entry['post']['comment_count'])
+            else:
+                validators = Post.objects.filter(id=pk).values_list('updated_at', 'comment_count').first()
+            if validators is not None:
+                not_modified = not_modified_response(request, post_etag(request, pk, *validators))
+                if not_modified is not None:
+                    return not_modified
+
         try:
-            post = Post.objects.get(id=pk)
-            serializer = self.serializer_class(post)
-            return Response(
-                {
-                    "post": serializer.data,
-                    "message": f"Post retrieved successfully",
-                },
-                status=status.HTTP_200_OK,
-            )
+            # Serialized posts are cached; the write views invalidate them
+            entry = get_cached_post(pk, lambda: self.serialize(pk))
         except Post.DoesNotExist:
             return Response(
                 {"error": "Post not found"}, status=status.HTTP_404_NOT_FOUND
             )
+        response = Response(
+            {
+                "post": entry['post'],
+                "message": "Post retrieved successfully",
+            },
+            status=status.HTTP_200_OK,
+        )
+        return set_etag(response, post_etag(request, pk, entry['updated_at'], entry['post']['comment_count']))
+
+    def serialize(self, pk):
+        return cache_entry(Post.objects.using(DEFAULT_DB_ALIAS).get(id=pk))
+
+
+class ViewPostsView(GenericAPIView):
+    """
+    Several posts at once, `?ids=1,2,3` (up to POST_VIEW_MAX_IDS), keyed by
+    id; ids that match no post map to null and are listed in `not_found`.
+    Posts come from the cache ViewAPostView fills, the misses from one query.
+    """
+
+    def get(self, request):
+        try:
+            ids = [int(pk) for pk in request.query_params.get('ids', '').split(',') if pk.strip()]
+        except ValueError:
+            ids = None
+        # Out of range ids would overflow the id column in the lookup
+        if ids is None or not all(0 < pk <= MAX_ID for pk in ids):
+            return Response({"error": "ids must be a comma-separated list of post ids"}, status=status.HTTP_400_BAD_REQUEST)
+        # Duplicates are looked up once, the order is kept
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            return Response({"error": "At least one post id is required"}, status=status.HTTP_400_BAD_REQUEST)
+        if len(ids) > settings.POST_VIEW_MAX_IDS:
+            return Response(
+                {"error": f"At most {settings.POST_VIEW_MAX_IDS} post ids can be requested at once"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+
+        entries = get_cached_posts(ids, cache_entries)
+        return Response(
+            {
+                "posts": {str(pk): entries[pk]['post'] if pk in entries else None for pk in ids},
+                "not_found": [pk for pk in ids if pk not in entries],
+                "message": "Posts retrieved successfully",
+            },
+            status=status.HTTP_200_OK,
+        )
 
 
 class UpdatePostView(UpdateAPIView):
@@ -99,14 +314,18 @@ class UpdatePostView(UpdateAPIView):
     def put(self, request, pk):
         post = get_object_or_404(Post, id=pk)
         # Check if the user is the author of the post
-        if post.user != request.user:
+        if post.user_id != request.user.id:
             return Response(
                 {"message": "You do not have permission to edit this post."},
                 status=status.HTTP_403_FORBIDDEN,
             )
         serializer = self.serializer_class(post, data=request.data, partial=True)
         if serializer.is_valid(raise_exception=True):
+            was_published = post.is_published
             serializer.save()
+            invalidate_post(post.id)
+            if post.is_published != was_published:
+                feed_changed([post])
             return Response(
                 {
                     "post": serializer.data,
@@ -124,14 +343,15 @@ class DeletePostView(DestroyAPIView):
     def delete(self, request, pk):
         post = get_object_or_404(Post, id=pk)
         # Check if the user is the author of the post
-        if post.user != request.user and not request.user.is_superuser:
+        if post.user_id != request.user.id and not request.user.is_superuser:
             # If the user is not the author and not a superuser, deny permission
             return Response(
                 {"message": "You do not have permission to delete this post."},
                 status=status.HTTP_403_FORBIDDEN,
             )
         try:
-            post.delete()
+            # Hidden now, its comments removed in the background
+            schedule_post_deletion(post)
             return Response(
                 {"message": "Post deleted successfully"}, status=status.HTTP_200_OK
             )
@@ -164,9 +384,25 @@ class CreateCommentView(CreateAPIView):
             # Check if the user is authenticated
             if not request.user.is_authenticated:
                 return Response({"error": "User is not authenticated"}, status=status.HTTP_401_UNAUTHORIZED)
-            
-            # Save the comment with the author and post
-            serializer.save(user=request.user, post=post)
+
+            # A reply must be on the same post, and not too deep
+            parent = serializer.validated_data.get('parent')
+            if parent is not None and parent.post_id != post.id:
+                return Response(
+                    {"error": "The parent comment is on another post"}, status=status.HTTP_400_BAD_REQUEST
+                )
+            if parent is not None and parent.depth >= max_depth():
+                return Response(
+                    {"error": f"Replies can be nested at most {max_depth()} levels deep"},
+                    status=status.HTTP_400_BAD_REQUEST,
+                )
+
+            # Save the comment with the author and post, and bump the post's counter
+            with transaction.atomic():
+                serializer.save(user=request.user, post=post)
+                adjust_comment_count(post.id, 1)
+            invalidate_post(post.id)
+            invalidate_counts([comment_count_key(post.id)])
             return Response({
                 "comment": serializer.data,
                 "message": f"Comment added successfully by {request.user.first_name} {request.user.last_name}",
@@ -191,13 +427,128 @@ class ListCommentView(ListAPIView):
         # Apply filters
         for backend in list(self.filter_backends):
             comments = backend().filter_queryset(request, comments, self)
+        fields = CommentRowSerializer.requested_fields(request.query_params)
         paginator = self.pagination_class()
-        # Paginate the comments
-        page = paginator.paginate_queryset(comments, request)
-        serializer = self.serializer_class(page, many=True)
-        return paginator.get_paginated_response(
+        if 'user' not in request.query_params:
+            # All the post's comments: counted once, until one is added or deleted
+            paginator.count_key = comment_count_key(post.id)
+        # Paginate the comments (with the author's email joined in), answering
+        # If-None-Match with a 304
+        page, etag, not_modified = paginate_conditionally(
+            request, paginator, CommentRowSerializer.select(comments, fields), ('id', 'created_at', 'updated_at')
+        )
+        if not_modified is not None:
+            return not_modified
+        serializer = CommentRowSerializer(page, fields)
+        response = paginator.get_paginated_response(
             serializer.data
         )
+        return set_etag(response, etag)
+
+
+class ThreadPagination(CustomPagination):
+    """
+    Pages of a comment tree, continuing after the path of the last comment
+    sent (`?cursor=`), so threads are never reordered by later writes.
+    """
+
+    def paginate_rows(self, rows, request):
+        self.request = request
+        self.page_size = self.get_page_size(request)
+        rows = list(rows[:self.page_size + 1])
+        self.has_next = len(rows) > self.page_size
+        self.rows = rows[:self.page_size]
+        return self.rows
+
+    def after(self, request):
+        cursor = request.query_params.get(self.cursor_query_param)
+        if cursor and not PATH_PATTERN.match(cursor):
+            raise NotFound(self.invalid_cursor_message)
+        return cursor or None
+
+    def get_paginated_response(self, data):
+        next_url = None
+        if self.has_next:
+            next_url = replace_query_param(
+                self.request.build_absolute_uri(), self.cursor_query_param, self.rows[-1].path,
+            )
+        return Response({"next": next_url, "results": data})
+
+
+class CommentThreadsMixin:
+    pagination_class = ThreadPagination
+
+    def thread_params(self, request):
+        """?depth= (default and cap: COMMENT_MAX_DEPTH) and ?fields=, as (depth, fields)."""
+        try:
+            depth = int(request.query_params.get('depth', max_depth()))
+        except ValueError:
+            raise ValidationError({"depth": ["A whole number is required."]})
+        fields = CommentRowSerializer.requested_fields(request.query_params)
+        return min(max(depth, 0), max_depth()), fields
+
+
+class ListCommentThreadsView(CommentThreadsMixin, GenericAPIView):
+    """
+    A post's threads, oldest first: each page holds whole root comments,
+    each with its first `?replies=` replies (depth first, up to `?depth=`
+    deep) and whether it has more. Roots and replies are each one indexed
+    range scan; fetch the rest of a thread from ViewCommentThreadView.
+    """
+    max_replies = 20
+
+    def get(self, request, pk):
+        post = get_object_or_404(Post, id=pk)
+        depth, fields = self.thread_params(request)
+        try:
+            limit = min(max(int(request.query_params.get('replies', 3)), 0), self.max_replies)
+        except ValueError:
+            raise ValidationError({"replies": ["A whole number is required."]})
+
+        paginator = self.pagination_class()
+        selected = (*fields, 'path', 'parent_id')
+        roots = paginator.paginate_rows(
+            CommentRowSerializer.select(thread_roots(Comment.objects.all(), post.id, paginator.after(request)), selected),
+            request,
+        )
+        replies = []
+        if roots and depth and limit:
+            # One more than asked, to tell whether the thread goes on
+            replies = list(CommentRowSerializer.select(
+                thread_replies(Comment.objects.all(), post.id, roots[0].path, roots[-1].path, depth, limit + 1),
+                selected,
+            ))
+        by_root = {}
+        for row in replies:
+            by_root.setdefault(row.path[:SEGMENT_WIDTH], []).append(row)
+
+        results = []
+        for root, data in zip(roots, CommentRowSerializer(roots, fields).data):
+            thread_rows = by_root.get(root.path, [])
+            data['replies'] = CommentRowSerializer(thread_rows[:limit], fields).data
+            data['more_replies'] = len(thread_rows) > limit
+            results.append(data)
+        return paginator.get_paginated_response(results)
+
+
+class ViewCommentThreadView(CommentThreadsMixin, GenericAPIView):
+    """
+    A comment and its replies up to `?depth=` below it, depth first, paged
+    in one indexed range scan per page. Every comment carries its parent_id
+    and depth to rebuild the tree.
+    """
+
+    def get(self, request, pk):
+        root = get_object_or_404(Comment.objects.only('id', 'post_id', 'path', 'depth'), id=pk)
+        depth, fields = self.thread_params(request)
+        paginator = self.pagination_class()
+        rows = paginator.paginate_rows(
+            CommentRowSerializer.select(
+                thread(Comment.objects.all(), root, depth, paginator.after(request)), (*fields, 'path'),
+            ),
+            request,
+        )
+        return paginator.get_paginated_response(CommentRowSerializer(rows, fields).data)
 
 
 class UpdateCommentView(UpdateAPIView):
@@ -207,25 +558,19 @@ class UpdateCommentView(UpdateAPIView):
 
     def put(self, request, pk):
         try:
-            comment = Comment.objects.get(id=pk)
+            comment = Comment.objects.select_related('user').get(id=pk)
         except Comment.DoesNotExist:
             return Response(
                 {"error": "Comment not found"}, status=status.HTTP_404_NOT_FOUND
             )
         # Check if the user is the author of the comment
-        if comment.user != request.user:
+        if comment.user_id != request.user.id:
             return Response(
                 {"message": "You do not have permission to edit this comment."},
                 status=status.HTTP_403_FORBIDDEN,
             )
-        # Check if the post exists
-        try:
-            post = Post.objects.get(id=comment.post.id)
-        except Post.DoesNotExist:
-            return Response(
-                {"error": "Post not found"}, status=status.HTTP_404_NOT_FOUND
-            )
-        
+        # Comment.objects hides the comments of deleted posts, so the post is visible
+
         serializer = self.serializer_class(comment, data=request.data, partial=True)
 
         if not serializer.is_valid():
@@ -253,16 +598,107 @@ class DeleteCommentView(DestroyAPIView):
                 {"error": "Comment not found"}, status=status.HTTP_404_NOT_FOUND
             )
 
-        if comment.user != request.user and not request.user.is_staff and not request.user.is_superuser:
+        if comment.user_id != request.user.id and not request.user.is_staff and not request.user.is_superuser:
             # If the user is not the author and not a superuser, deny permission
             return Response(
                 {"message": "You do not have permission to delete this comment."},
                 status=status.HTTP_403_FORBIDDEN,
             )
-        # delete the comment
-        comment.delete()
+        # delete the comment with its replies and decrement the post's counter
+        with transaction.atomic():
+            deleted, _ = Comment.all_objects.filter(subtree(comment.post_id, comment.path)).delete()
+            adjust_comment_count(comment.post_id, -deleted)
+        invalidate_post(comment.post_id)
+        invalidate_counts([comment_count_key(comment.post_id)])
         return Response(
             {"message": "Comment deleted successfully."},
             status=status.HTTP_200_OK
         )
 
+
+# Async read views, mounted under async/ in blog/urls.py. Under an ASGI
+# server they wait on the database without holding a worker thread.
+
+class AsyncListPostView(AsyncAPIView):
+    require_authentication = True
+    filter_backends = ListPostView.filter_backends
+    filterset_fields = ListPostView.filterset_fields
+    ordering_fields = ListPostView.ordering_fields
+    pagination_class = CustomPagination
+
+    async def get(self, request):
+        posts = Post.objects.filter(user=request.user)
+        # These filters only build the queryset, they do not query
+        for backend in list(self.filter_backends):
+            posts = backend().filter_queryset(request, posts, self)
+
+        fields = PostRowSerializer.requested_fields(request.query_params)
+        paginator = self.pagination_class()
+        page = await paginator.apaginate_queryset(PostRowSerializer.select(posts, fields), request)
+        etag = page_etag(request, paginator, page)
+        not_modified = not_modified_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+        data = paginator.get_paginated_response(PostRowSerializer(page, fields).data).data
+        return set_etag(self.render(data), etag)
+
+
+class AsyncViewAPostView(AsyncAPIView):
+
+    async def get(self, request, pk):
+        if is_conditional(request):
+            entry = await apeek_cached_post(pk)
+            if entry is not None:
+                validators = (entry['updated_at'], entry['post']['comment_count'])
+            else:
+                validators = await Post.objects.filter(id=pk).values_list('updated_at', 'comment_count').afirst()
+            if validators is not None:
+                not_modified = not_modified_response(request, post_etag(request, pk, *validators))
+                if not_modified is not None:
+                    return not_modified
+
+        try:
+            entry = await aget_cached_post(pk, lambda: self.serialize(pk))
+        except Post.DoesNotExist:
+            return self.render({"error": "Post not found"}, status.HTTP_404_NOT_FOUND)
+        response = self.render({
+            "post": entry['post'],
+            "message": "Post retrieved successfully",
+        })
+        return set_etag(response, post_etag(request, pk, entry['updated_at'], entry['post']['comment_count']))
+
+    async def serialize(self, pk):
+        post = await Post.objects.using(DEFAULT_DB_ALIAS).aget(id=pk)
+        return cache_entry(post)
+
+
+class AsyncListCommentView(AsyncAPIView):
+    filter_backends = ListCommentView.filter_backends
+    filterset_fields = ListCommentView.filterset_fields
+    ordering_fields = ListCommentView.ordering_fields
+    pagination_class = CustomPagination
+
+    async def get(self, request, pk):
+        if not await Post.objects.filter(id=pk).aexists():
+            raise Http404("No Post matches the given query.")
+        comments = Comment.objects.filter(post_id=pk)
+        # The ?user= filter validates the id against the database, so the
+        # backends run in a thread
+        comments = await sync_to_async(self.filter_queryset)(request, comments)
+
+        fields = CommentRowSerializer.requested_fields(request.query_params)
+        paginator = self.pagination_class()
+        if 'user' not in request.query_params:
+            paginator.count_key = comment_count_key(pk)
+        page = await paginator.apaginate_queryset(CommentRowSerializer.select(comments, fields), request)
+        etag = page_etag(request, paginator, page)
+        not_modified = not_modified_response(request, etag)
+        if not_modified is not None:
+            return not_modified
+        data = paginator.get_paginated_response(CommentRowSerializer(page, fields).data).data
+        return set_etag(self.render(data), etag)
+
+    def filter_queryset(self, request, queryset):
+        for backend in list(self.filter_backends):
+            queryset = backend().filter_queryset(request, queryset, self)
+        return queryset